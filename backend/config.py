@@ -8,3 +8,142 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 JWT_SECRET = os.getenv("JWT_SECRET", "supersecretkey")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 JWT_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "60"))
+
+# --- Outbound HTTP connection pools (backend/utils/http_pools.py) ---
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# --- /api/chat completion cache (backend/utils/completion_cache.py) ---
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1024"))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "600"))
+
+# --- /api/chat prompt context (backend/utils/context_builder.py) ---
+CHAT_TOKEN_BUDGET = int(os.getenv("CHAT_TOKEN_BUDGET", "3000"))
+CHAT_MAX_MESSAGE_TOKENS = int(os.getenv("CHAT_MAX_MESSAGE_TOKENS", "800"))
+
+# --- Server-side chat sessions (backend/services/conversation_store.py) ---
+CHAT_SESSION_MAX = int(os.getenv("CHAT_SESSION_MAX", "10000"))
+CHAT_SESSION_IDLE_TTL = float(os.getenv("CHAT_SESSION_IDLE_TTL", "3600"))
+CHAT_SESSION_MAX_MESSAGES = int(os.getenv("CHAT_SESSION_MAX_MESSAGES", "200"))
+CHAT_SESSION_PERSIST = os.getenv("CHAT_SESSION_PERSIST", "false").lower() in ("1", "true", "yes")
+
+# --- Chat providers and hedging (backend/services/llm_providers.py) ---
+CHAT_PROVIDERS = [p.strip() for p in os.getenv("CHAT_PROVIDERS", "groq,ollama").split(",") if p.strip()]
+CHAT_HEDGE_DELAY = float(os.getenv("CHAT_HEDGE_DELAY", "1.5"))  # Seconds without a first token before hedging
+CHAT_HEDGE_DELAY_COMPLETE = float(os.getenv("CHAT_HEDGE_DELAY_COMPLETE", "8"))  # Same, for whole non-stream replies
+OLLAMA_ENABLED = os.getenv("OLLAMA_ENABLED", "false").lower() in ("1", "true", "yes")
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+
+# --- Per-upstream circuit breakers (backend/utils/circuit_breaker.py) ---
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))  # Recent calls considered
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "10"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.8"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+ADAPTIVE_TIMEOUT_MIN = float(os.getenv("ADAPTIVE_TIMEOUT_MIN", "2"))
+ADAPTIVE_TIMEOUT_FACTOR = float(os.getenv("ADAPTIVE_TIMEOUT_FACTOR", "2"))  # Timeout = observed p99 x factor
+
+# --- Admission control for upstream LLM calls (backend/utils/admission.py) ---
+ADMISSION_CAPACITY = int(os.getenv("ADMISSION_CAPACITY", "32"))  # Concurrent LLM calls across all routes
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "256"))  # Waiters beyond this are refused (429)
+ADMISSION_CHAT_STREAM_LIMIT = int(os.getenv("ADMISSION_CHAT_STREAM_LIMIT", "32"))
+ADMISSION_CHAT_STREAM_MAX_WAIT = float(os.getenv("ADMISSION_CHAT_STREAM_MAX_WAIT", "5"))
+ADMISSION_CHAT_LIMIT = int(os.getenv("ADMISSION_CHAT_LIMIT", "24"))
+ADMISSION_CHAT_MAX_WAIT = float(os.getenv("ADMISSION_CHAT_MAX_WAIT", "10"))
+ADMISSION_BATCH_LIMIT = int(os.getenv("ADMISSION_BATCH_LIMIT", "8"))
+ADMISSION_BATCH_MAX_WAIT = float(os.getenv("ADMISSION_BATCH_MAX_WAIT", "30"))
+ADMISSION_TTS_LIMIT = int(os.getenv("ADMISSION_TTS_LIMIT", "8"))
+ADMISSION_TTS_MAX_WAIT = float(os.getenv("ADMISSION_TTS_MAX_WAIT", "10"))
+ADMISSION_ASR_LIMIT = int(os.getenv("ADMISSION_ASR_LIMIT", "8"))
+ADMISSION_ASR_MAX_WAIT = float(os.getenv("ADMISSION_ASR_MAX_WAIT", "5"))  # Past this, Hugging Face is tried instead
+
+# --- SSE frame coalescing (backend/utils/sse.py) ---
+SSE_COALESCE_WINDOW = float(os.getenv("SSE_COALESCE_WINDOW", "0.03"))  # Seconds to gather deltas into one frame
+SSE_MAX_FRAME_BYTES = int(os.getenv("SSE_MAX_FRAME_BYTES", "2048"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+# --- Shared thread pools (backend/utils/executors.py) ---
+# Sync-client chat streams hold an io thread each, so size io for peak concurrent streams
+EXECUTOR_IO_WORKERS = int(os.getenv("EXECUTOR_IO_WORKERS", os.getenv("STREAM_WORKERS", "64")))
+EXECUTOR_VISION_WORKERS = int(os.getenv("EXECUTOR_VISION_WORKERS", "2"))
+EXECUTOR_HASHING_WORKERS = int(os.getenv("EXECUTOR_HASHING_WORKERS", "4"))
+EXECUTOR_SHUTDOWN_TIMEOUT = float(os.getenv("EXECUTOR_SHUTDOWN_TIMEOUT", "10"))  # Seconds to drain on shutdown
+
+# --- Client disconnects on streamed chat (backend/utils/disconnect.py) ---
+CHAT_DISCONNECT_POLL_INTERVAL = float(os.getenv("CHAT_DISCONNECT_POLL_INTERVAL", "0.5"))
+# Seconds a stream with no listeners keeps running (resumable via Last-Event-ID) before its upstream is cancelled
+CHAT_ABANDON_GRACE = float(os.getenv("CHAT_ABANDON_GRACE", "5"))
+
+# --- Resumable chat streams (Last-Event-ID replay, backend/utils/singleflight.py) ---
+CHAT_RESUME_TTL = float(os.getenv("CHAT_RESUME_TTL", "120"))  # Seconds a finished stream stays resumable
+CHAT_RESUME_MAX_BYTES = int(os.getenv("CHAT_RESUME_MAX_BYTES", str(32 * 1024 * 1024)))  # All replay buffers
+CHAT_RESUME_MAX_STREAM_BYTES = int(os.getenv("CHAT_RESUME_MAX_STREAM_BYTES", str(1024 * 1024)))  # One generation
+
+# --- /api/chat/batch ---
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "500"))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))  # Upper bound; requests may ask for less
+CHAT_BATCH_ITEM_TIMEOUT = float(os.getenv("CHAT_BATCH_ITEM_TIMEOUT", "60"))
+
+# --- Multiplexed WebSocket transport (backend/routers/ws.py) ---
+WS_REQUIRE_AUTH = os.getenv("WS_REQUIRE_AUTH", "true").lower() in ("1", "true", "yes")
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "256"))  # Outgoing messages buffered per channel
+WS_MAX_VOICE_BYTES = int(os.getenv("WS_MAX_VOICE_BYTES", str(25 * 1024 * 1024)))
+WS_TTS_CHUNK_BYTES = int(os.getenv("WS_TTS_CHUNK_BYTES", "32768"))
+# Lifetime of the single-use tickets that stand in for the JWT in WebSocket/EventSource URLs
+AUTH_TICKET_SECONDS = int(os.getenv("AUTH_TICKET_SECONDS", "30"))
+
+# --- Per-user usage metering and quotas (backend/services/usage_meter.py) ---
+USAGE_QUOTA_ENABLED = os.getenv("USAGE_QUOTA_ENABLED", "true").lower() in ("1", "true", "yes")
+USAGE_BUCKET_TOKENS = int(os.getenv("USAGE_BUCKET_TOKENS", "60000"))  # Burst allowance per user
+USAGE_REFILL_TOKENS_PER_MINUTE = float(os.getenv("USAGE_REFILL_TOKENS_PER_MINUTE", "20000"))
+USAGE_MAX_TRACKED_USERS = int(os.getenv("USAGE_MAX_TRACKED_USERS", "10000"))
+USAGE_WINDOW_SECONDS = int(os.getenv("USAGE_WINDOW_SECONDS", "3600"))  # Granularity of stored counters
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "30"))  # Seconds between database writes
+USAGE_MAX_PENDING_ROWS = int(os.getenv("USAGE_MAX_PENDING_ROWS", "50000"))  # Kept across failed flushes
+
+# --- Webcam capture thread (backend/services/camera_capture.py) ---
+CAMERA_INDEX = int(os.getenv("CAMERA_INDEX", "0"))
+CAMERA_WIDTH = int(os.getenv("CAMERA_WIDTH", "640"))
+CAMERA_HEIGHT = int(os.getenv("CAMERA_HEIGHT", "480"))
+CAMERA_MAX_READ_FAILURES = int(os.getenv("CAMERA_MAX_READ_FAILURES", "50"))  # Consecutive failed reads before giving up
+
+# --- /api/video_feed fan-out (backend/services/frame_broadcaster.py) ---
+VIDEO_FEED_MAX_FPS = float(os.getenv("VIDEO_FEED_MAX_FPS", "30"))  # Upper bound for a viewer's ?fps=
+# JPEG qualities viewers step between; viewers on the same level share one encode per frame
+VIDEO_FEED_QUALITY_LEVELS = tuple(int(q) for q in os.getenv("VIDEO_FEED_QUALITY_LEVELS", "85,70,55,40").split(","))
+
+# --- Face tracking between cascade detections (backend/services/face_services.py) ---
+FACE_TRACKING_ENABLED = os.getenv("FACE_TRACKING_ENABLED", "true").lower() in ("1", "true", "yes")
+FACE_REDETECT_EVERY = int(os.getenv("FACE_REDETECT_EVERY", "10"))  # Frames tracked between detections
+FACE_TRACK_MIN_CONFIDENCE = float(os.getenv("FACE_TRACK_MIN_CONFIDENCE", "0.6"))  # Template match score
+FACE_ROI_PADDING = float(os.getenv("FACE_ROI_PADDING", "0.5"))  # Re-detection ROI padding, fraction of box size
+FACE_TRACK_SEARCH_MARGIN = float(os.getenv("FACE_TRACK_SEARCH_MARGIN", "0.25"))
+
+# --- Browser frame uploads (/api/emotion_face/frame[s]) ---
+EMOTION_FRAME_MAX_BYTES = int(os.getenv("EMOTION_FRAME_MAX_BYTES", str(5 * 1024 * 1024)))  # Per frame
+EMOTION_FRAME_MAX_BATCH = int(os.getenv("EMOTION_FRAME_MAX_BATCH", "32"))
+
+# --- Live emotion frames over WebSocket (routers/ws.py, services/emotion_stream.py) ---
+EMOTION_STREAM_MAX_CONNECTIONS = int(os.getenv("EMOTION_STREAM_MAX_CONNECTIONS", "200"))  # Per worker
+
+# --- Face analysis worker processes (backend/services/face_workers.py) ---
+FACE_ANALYSIS_BACKEND = os.getenv("FACE_ANALYSIS_BACKEND", "thread").lower()  # "thread" (vision pool) or "process"
+FACE_PROCESS_WORKERS = int(os.getenv("FACE_PROCESS_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+FACE_PROCESS_SLOTS = int(os.getenv("FACE_PROCESS_SLOTS", "0")) or 2 * FACE_PROCESS_WORKERS  # Shared-memory frame slots
+FACE_PROCESS_SLOT_BYTES = int(os.getenv("FACE_PROCESS_SLOT_BYTES", str(1280 * 720 * 3)))  # Largest frame passed by slot
+FACE_PROCESS_TASK_TIMEOUT = float(os.getenv("FACE_PROCESS_TASK_TIMEOUT", "5"))  # A worker stuck this long is restarted
+
+# --- Per-user emotion sessions (backend/services/emotion_sessions.py) ---
+EMOTION_SESSION_MAX = int(os.getenv("EMOTION_SESSION_MAX", "1000"))
+EMOTION_SESSION_IDLE_SECONDS = float(os.getenv("EMOTION_SESSION_IDLE_SECONDS", "900"))  # Unused this long -> evicted
+EMOTION_SESSION_SWEEP_INTERVAL = float(os.getenv("EMOTION_SESSION_SWEEP_INTERVAL", "60"))
+
+# --- /api/emotion/stream server push (backend/services/emotion_sessions.py) ---
+EMOTION_STREAM_SCORE_DELTA = float(os.getenv("EMOTION_STREAM_SCORE_DELTA", "0.1"))  # Smaller score moves are not pushed
+EMOTION_STREAM_KEEPALIVE = float(os.getenv("EMOTION_STREAM_KEEPALIVE", "15"))  # Seconds between keepalive comments
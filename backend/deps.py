@@ -1,10 +1,28 @@
 # backend/deps.py
-from fastapi import Depends, HTTPException, status, Header
+from fastapi import Depends, HTTPException, status, Header, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from backend.utils.database import get_db
-from backend.services.auth_service import create_access_token
+from backend.services.auth_service import decode_access_token, redeem_ticket
 from backend.models.user import User
 from sqlalchemy.future import select
+from typing import Optional
+
+
+async def _user_for(payload: Optional[dict], db: AsyncSession) -> Optional[User]:
+    if not payload or "sub" not in payload:
+        return None
+    q = await db.execute(select(User).filter_by(id=payload["sub"]))
+    return q.scalars().first()
+
+
+async def get_user_from_token(token: str, db: AsyncSession) -> Optional[User]:
+    """Resolves a bearer token to its User, or None."""
+    return await _user_for(decode_access_token(token), db)
+
+
+async def get_user_from_ticket(ticket: str, db: AsyncSession) -> Optional[User]:
+    """Redeems a single-use ticket (see auth_service.create_ticket) for its User, or None."""
+    return await _user_for(redeem_ticket(ticket), db)
 
 async def get_current_user(authorization: str = Header(None), db: AsyncSession = Depends(get_db)):
     """
@@ -17,13 +35,39 @@ async def get_current_user(authorization: str = Header(None), db: AsyncSession =
     if len(parts) != 2 or parts[0].lower() != "bearer":
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authorization header")
     token = parts[1]
-    payload = create_access_token(token)
+    payload = decode_access_token(token)
     if not payload or "sub" not in payload:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
-    user_id = payload["sub"]
-    # fetch user
-    q = await db.execute(select(User).filter_by(id=user_id))
-    user = q.scalars().first()
+    user = await get_user_from_token(token, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    return user
\ No newline at end of file
+    return user
+
+
+def usage_key(request: Request, authorization: str = Header(None)) -> str:
+    """
+    Who provider usage is billed to: "user:<id>" from a valid bearer token
+    (decoded only, no database lookup), else "ip:<client address>".
+    """
+    if authorization:
+        parts = authorization.split()
+        if len(parts) == 2 and parts[0].lower() == "bearer":
+            payload = decode_access_token(parts[1])
+            if payload and "sub" in payload:
+                return f"user:{payload['sub']}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def stream_key(request: Request, ticket: Optional[str] = None, authorization: str = Header(None)) -> str:
+    """
+    usage_key for EventSource clients, which cannot set headers: also accepts
+    ?ticket=<single-use ticket> from POST /api/auth/ticket. A ticket that does
+    not redeem is a 401, so the client fetches a new one rather than silently
+    falling back to its IP address.
+    """
+    if ticket and not authorization:
+        payload = redeem_ticket(ticket)
+        if not payload or "sub" not in payload:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid, expired or reused ticket")
+        return f"user:{payload['sub']}"
+    return usage_key(request, authorization)
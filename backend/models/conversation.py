@@ -0,0 +1,19 @@
+# backend/models/conversation.py
+import sqlalchemy as sa
+from backend.utils.database import Base
+
+class ChatMessage(Base):
+    __tablename__ = "chat_messages"
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    session_id = sa.Column(sa.String(64), nullable=False, index=True)
+    role = sa.Column(sa.String(16), nullable=False)
+    content = sa.Column(sa.Text, nullable=False)
+    created_at = sa.Column(sa.DateTime(timezone=True), server_default=sa.func.now())
+
+
+class ChatSession(Base):
+    """A server-side conversation and the caller that created it (deps.usage_key)."""
+    __tablename__ = "chat_sessions"
+    session_id = sa.Column(sa.String(64), primary_key=True)
+    owner = sa.Column(sa.String(128), nullable=False, index=True)
+    created_at = sa.Column(sa.DateTime(timezone=True), server_default=sa.func.now())
@@ -0,0 +1,17 @@
+# backend/models/usage.py
+import sqlalchemy as sa
+from backend.utils.database import Base
+
+class UsageRecord(Base):
+    """Token usage counted for one user and route during one time window (one row per flush)."""
+    __tablename__ = "usage_records"
+    id = sa.Column(sa.Integer, primary_key=True, autoincrement=True)
+    # "user:<id>" for authenticated requests, "ip:<address>" otherwise
+    user_key = sa.Column(sa.String(128), nullable=False, index=True)
+    route = sa.Column(sa.String(32), nullable=False)
+    window_start = sa.Column(sa.DateTime(timezone=True), nullable=False, index=True)
+    requests = sa.Column(sa.Integer, nullable=False, default=0)
+    prompt_tokens = sa.Column(sa.Integer, nullable=False, default=0)
+    completion_tokens = sa.Column(sa.Integer, nullable=False, default=0)
+    total_tokens = sa.Column(sa.Integer, nullable=False, default=0)
+    created_at = sa.Column(sa.DateTime(timezone=True), server_default=sa.func.now())
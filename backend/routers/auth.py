@@ -8,12 +8,15 @@ from backend.services.auth_service import (
     hash_password,
     verify_password,
     create_access_token,
+    create_ticket,
     hash_secret_key,
     verify_secret_key,
 )
 import logging
 import re
+from backend.config import AUTH_TICKET_SECONDS
 from backend.deps import get_current_user
+from backend.utils.executors import executors
 
 # ✅ DEFINE ROUTER HERE
 router = APIRouter(prefix="/api/auth", tags=["auth"])
@@ -71,11 +74,11 @@ async def register(payload: RegisterIn, db: AsyncSession = Depends(get_db)):
 
     secret_key_value = payload.secret_key or "default_secret"
 
-    # Create new user
+    # Create new user (bcrypt runs on the hashing pool, off the event loop)
     user = User(
         email=payload.email,
-        password_hash=hash_password(payload.password),
-        secret_key_hash=hash_secret_key(secret_key_value),
+        password_hash=await executors.run("hashing", hash_password, payload.password),
+        secret_key_hash=await executors.run("hashing", hash_secret_key, secret_key_value),
     )
 
     db.add(user)
@@ -108,11 +111,11 @@ async def login(payload: LoginIn, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=401, detail="Invalid credentials.")
 
     # Verify password
-    if not verify_password(payload.password, user.password_hash):
+    if not await executors.run("hashing", verify_password, payload.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials.")
 
     # Verify secret key
-    if not verify_secret_key(payload.secret_key, user.secret_key_hash):
+    if not await executors.run("hashing", verify_secret_key, payload.secret_key, user.secret_key_hash):
         raise HTTPException(status_code=401, detail="Invalid secret key.")
 
     token = create_access_token(user.id)
@@ -133,3 +136,9 @@ async def get_current_user_info(current_user=Depends(get_current_user)):
         "email": current_user.email,
         "created_at": str(current_user.created_at),
     }
+
+
+# Single-use ticket for the WebSocket and EventSource endpoints, which cannot send the JWT in a header
+@router.post("/ticket")
+async def issue_ticket(current_user=Depends(get_current_user)):
+    return {"ticket": create_ticket(current_user.id), "expires_in": AUTH_TICKET_SECONDS}
@@ -3,23 +3,30 @@ import asyncio
 import json
 import logging
 import time
-from fastapi import APIRouter, Depends, Request, Response, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Any
+from typing import Dict, List, Any, Optional
 
 # --- Imports ---
-from backend.deps import get_current_user  # re-enable later if needed
-from backend.utils.clients import get_groq_client
+from backend.deps import get_current_user, usage_key  # re-enable get_current_user later if needed
 from backend.utils.chat_helpers import (
     get_emotion_aware_system_prompt,
     enhance_response_with_emotion,
-    generate_groq_stream,
-    generate_fallback_stream,
-    MAX_HISTORY,
-    TIMEOUT_GROQ,
-    executor,
+    generate_provider_stream,
+    get_fallback_reply,
+    replay_cached_stream,
 )
+from backend.services.llm_providers import ChatProvider, provider_router
+from backend.utils.completion_cache import completion_cache, make_cache_key
+from backend.utils.singleflight import StreamFlight, chat_flights, chat_stream_flights
+from backend.utils.context_builder import ChatContext, build_chat_context, estimate_tokens
+from backend.config import CHAT_BATCH_MAX_ITEMS, CHAT_BATCH_CONCURRENCY, CHAT_BATCH_ITEM_TIMEOUT
+from backend.services.conversation_store import conversation_store
+from backend.services.usage_meter import usage_meter
+from backend.utils.admission import llm_admission
+from backend.utils.sse import SSE_HEADERS, coalesce_events, stamp_event_ids, parse_event_id
+from backend.utils.disconnect import DisconnectWatch
 
 logger = logging.getLogger("backend.chat")
 
@@ -29,6 +36,13 @@ class ChatRequest(BaseModel):
     emotion: str = "neutral"
     history: List[Any] = []
     stream: bool = False
+    # With a server-side session, `history` is ignored and only `message` needs to be sent
+    session_id: Optional[str] = None
+
+
+class ChatSessionRequest(BaseModel):
+    # Earlier messages to seed the session with, e.g. when replacing one the server evicted
+    history: List[Any] = []
 
 
 # --- Router Definition ---
@@ -42,120 +56,394 @@ async def options_chat():
     return Response(status_code=status.HTTP_200_OK)
 
 
-# --- Unified Chat Endpoint (Handles both streaming & non-streaming) ---
-@router.post("/chat")
-# async def chat_endpoint(data: ChatRequest, current_user: Any = Depends(get_current_user)):
-async def chat_endpoint(data: ChatRequest):
+def stream_flight_response(flight: StreamFlight, request: Request, start: int = 0, headers: Optional[dict] = None) -> StreamingResponse:
     """
-    Unified chat endpoint.
-    - If stream=True → returns SSE stream
-    - Else → returns full JSON reply
+    SSE response following `flight` from frame `start`. Frames carry
+    `<generation>:<index>` event ids for Last-Event-ID resume, and a closed
+    connection detaches this subscriber (see utils/disconnect.py).
     """
-    logger.info(f"POST /api/chat | Emotion: {data.emotion} | Stream: {data.stream}")
+    watch = DisconnectWatch(request, on_disconnect=flight.wake)
+    frames = flight.subscribe(start, stop=lambda: watch.disconnected)
+    return StreamingResponse(
+        watch.wrap(stamp_event_ids(frames, flight.generation, start)),
+        media_type="text/event-stream",
+        headers={**SSE_HEADERS, **(headers or {})},
+    )
 
-    # Prepare conversation context
-    history = [
-    {
-        "role": "assistant" if m.get("role") == "bot" else m.get("role"),
-        "content": m.get("content")
-    }
-    for m in data.history
-    if m.get("role") and m.get("content")
-][-MAX_HISTORY:]
-    system_prompt = get_emotion_aware_system_prompt(data.emotion)
-    messages = [{"role": "system", "content": system_prompt}] + history + [
-        {"role": "user", "content": data.message}
+
+def resume_stream(request: Request, last_event_id: Optional[str], user_key: str) -> Optional[StreamingResponse]:
+    """Resumes a buffered generation after `last_event_id`, or None if it is unknown, expired or not `user_key`'s."""
+    parsed = parse_event_id(last_event_id)
+    if parsed is None:
+        return None
+    generation, start = parsed
+    flight = chat_stream_flights.resume(generation, user_key)
+    if flight is None:
+        return None
+    logger.info(f"Resuming chat stream {generation} at frame {start}.")
+    return stream_flight_response(flight, request, start)
+
+
+# --- Shared turn handling (used by /chat and /chat/batch) ---
+class ChatTurn:
+    """Prompt context, cache identity and billed user for one chat request."""
+
+    def __init__(self, data: ChatRequest, context: ChatContext, cache_key: str, user_key: str = "anonymous"):
+        self.data = data
+        self.context = context
+        self.cache_key = cache_key
+        self.user_key = user_key
+        self.session_fields = {"session_id": data.session_id} if data.session_id else {}
+
+    def record_turn(self, reply: str) -> None:
+        if self.data.session_id:
+            conversation_store.append_turn(self.data.session_id, self.user_key, self.data.message, reply)
+
+    def store_completion(self, text: str, provider: ChatProvider) -> None:
+        # Only the primary provider's replies match the model in the cache key
+        if provider is provider_router.primary:
+            completion_cache.set(self.cache_key, text, provider.name)
+
+    def check_quota(self, charge: bool = True) -> None:
+        """
+        Charges the prompt to the user's quota before a provider call (429 when
+        exhausted). A request joining another's call (charge=False) costs
+        nothing, but a user already over quota is still refused.
+        """
+        usage_meter.check(self.user_key, "chat", self.context.prompt_tokens if charge else 0)
+
+    def refund_quota(self) -> None:
+        usage_meter.refund(self.user_key, self.context.prompt_tokens)
+
+    def record_usage(self, completion_tokens: int = 0, shared: bool = False) -> None:
+        """Counts the request; the upstream call's tokens are billed once, to the request that made it."""
+        if shared:
+            usage_meter.record(self.user_key, "chat")
+        else:
+            usage_meter.record(self.user_key, "chat", self.context.prompt_tokens, completion_tokens)
+
+
+def normalize_history(messages: List[Any]) -> List[Dict[str, str]]:
+    """Client history as {"role", "content"} messages; the frontend's "bot" role is the assistant."""
+    return [
+        {
+            "role": "assistant" if m.get("role") == "bot" else m.get("role"),
+            "content": m.get("content")
+        }
+        for m in messages
+        if isinstance(m, dict) and m.get("role") and m.get("content")
     ]
 
-    # ------------------------------------------------------------
-    # STREAMING MODE
-    # ------------------------------------------------------------
-    if data.stream:
-        logger.info("Streaming mode enabled for /api/chat.")
-        client = get_groq_client()
 
-        # --- Groq Streaming ---
-        if client:
-            try:
-                async def groq_event_stream():
-                    async for chunk in generate_groq_stream(client, messages, data.emotion):
-                        yield chunk
-                return StreamingResponse(groq_event_stream(), media_type="text/event-stream")
-            except Exception as e:
-                logger.error(f"Groq stream error: {e}", exc_info=True)
+async def prepare_turn(data: ChatRequest, user_key: str = "anonymous") -> ChatTurn:
+    """Builds the emotion-aware prompt within the token budget, from the session or the sent history."""
+    if data.session_id:
+        conversation = await conversation_store.get(data.session_id, user_key)
+        if conversation is None:
+            # Unknown, not the caller's, or evicted: the client re-creates it from its own history
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found.")
+        history = list(conversation.messages)
+    else:
+        history = normalize_history(data.history)
+    system_prompt = get_emotion_aware_system_prompt(data.emotion)
+    context = build_chat_context(system_prompt, history, data.message)
+    logger.info(
+        f"Prompt context: {context.prompt_tokens} tokens, {len(context.history)} history messages "
+        f"({context.dropped_messages} dropped, {context.truncated_messages} truncated)"
+    )
+    # Completion cache identity: model + prompt + history + message
+    primary = provider_router.primary
+    cache_key = make_cache_key(primary.model if primary else "", system_prompt, context.history, data.message)
+    return ChatTurn(data, context, cache_key, user_key)
+
 
-        # --- Fallback Streaming ---
-        async def fallback_stream():
-            async for chunk in generate_fallback_stream(data.message, data.emotion):
-                yield chunk
+async def complete_turn(turn: ChatTurn, admission_route: str = "chat") -> dict:
+    """
+    Full JSON reply for a turn: completion cache, else one provider call shared
+    by identical in-flight requests, else the canned fallback. Admission
+    refusals are raised as HTTPException (429/503 + Retry-After).
+    """
+    data, context = turn.data, turn.context
 
-        logger.info("Using fallback streaming (Groq unavailable or failed).")
-        return StreamingResponse(fallback_stream(), media_type="text/event-stream")
+    # ------------------------------------------------------------
+    # COMPLETION CACHE
+    # ------------------------------------------------------------
+    cached = completion_cache.get(turn.cache_key)
+    if cached is not None:
+        logger.info("Serving /api/chat from completion cache.")
+        turn.record_turn(cached.text)
+        return {
+            "reply": enhance_response_with_emotion(cached.text, data.emotion),
+            "emotion_used": data.emotion,
+            "provider": cached.provider,
+            "cached": True,
+            "prompt_tokens": context.prompt_tokens,
+            "user_id": "temp_debug_user",
+            **turn.session_fields,
+        }
 
     # ------------------------------------------------------------
     # NON-STREAMING MODE
     # ------------------------------------------------------------
+    # Identical in-flight requests await the same upstream call, billed to the one that started it
+    shared = chat_flights.running(turn.cache_key)
+    turn.check_quota(charge=not shared)
     start = time.time()
     try:
-        client = get_groq_client()
-        if client:
-            logger.info("Attempting Groq non-stream call...")
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                executor,
-                lambda: client.chat.completions.create(
-                    model="llama-3.1-8b-instant",
-                    messages=messages,
-                    temperature=0.7,
-                    timeout=TIMEOUT_GROQ,
-                ),
-            )
-            reply = response.choices[0].message.content
-            enhanced_reply = enhance_response_with_emotion(reply, data.emotion)
-            logger.info(f"Groq non-stream success in {round(time.time()-start, 2)}s")
-
-            return {
-                "reply": enhanced_reply,
-                "emotion_used": data.emotion,
-                "provider": "groq",
-                "user_id": "temp_debug_user",
-            }
-        else:
-            raise Exception("Groq client unavailable")
+        async def provider_completion():
+            slot = await llm_admission.acquire(admission_route)
+            try:
+                provider, completion = await provider_router.complete(context.messages, data.emotion)
+            finally:
+                slot.release()
+            if provider.cacheable:
+                turn.store_completion(completion, provider)
+            return provider, completion
 
+        (provider, reply), shared = await chat_flights.do(turn.cache_key, provider_completion)
+        if shared:
+            logger.info("Coalesced with in-flight identical chat request.")
+        turn.record_usage(estimate_tokens(reply), shared)
+        if provider.cacheable:
+            turn.record_turn(reply)
+        if provider.enhance:
+            reply = enhance_response_with_emotion(reply, data.emotion)
+        logger.info(f"Chat non-stream success via {provider.name} in {round(time.time()-start, 2)}s")
+
+        return {
+            "reply": reply,
+            "emotion_used": data.emotion,
+            "provider": provider.label(data.emotion),
+            "prompt_tokens": context.prompt_tokens,
+            "user_id": "temp_debug_user",
+            **turn.session_fields,
+        }
+
+    except HTTPException:
+        # Admission refusals (429/503 + Retry-After) go back to the client as-is
+        raise
     except Exception as e:
-        logger.error(f"Groq non-stream API Error: {e}", exc_info=True)
+        logger.error(f"Chat non-stream API Error: {e}", exc_info=True)
+        turn.record_usage(shared=shared)
 
     # ------------------------------------------------------------
     # FALLBACK NON-STREAMING
     # ------------------------------------------------------------
     logger.info("Using fallback non-stream response.")
-    emotion = (data.emotion or "neutral").lower()
-
-    if "stressed" in emotion or "anxious" in emotion or "fearful" in emotion:
-        reply = "I sense some stress... Let's take this step-by-step. What specific part are you working on right now? Remember to breathe!"
-        provider = "fallback-stressed"
-    elif "happy" in emotion or "surprised" in emotion:
-        reply = "Great! I love that positive energy. Tell me what you want to build next — let's channel that excitement! 🎉"
-        provider = "fallback-happy"
-    elif "confused" in emotion:
-        reply = "No worries... Let's break it down together. Where did you get stuck? 🤔"
-        provider = "fallback-confused"
-    elif "sad" in emotion:
-        reply = "Feeling down? Remember every developer faces challenges. Let's work through this together. What's troubling you? 💫"
-        provider = "fallback-sad"
-    elif "angry" in emotion or "disgusted" in emotion:
-        reply = "Frustrating! Let's approach this calmly. What specific issue is causing the most trouble?"
-        provider = "fallback-angry"
-    else:
-        reply = "Thanks for reaching out! I'm here to help with your coding questions. What would you like to work on today? 😊"
-        provider = "fallback-neutral"
-
+    reply, provider = get_fallback_reply(data.emotion)
     logger.info(f"Fallback non-stream success in {round(time.time()-start, 2)}s")
 
     return {
         "reply": reply,
         "emotion_used": data.emotion,
         "provider": provider,
+        "prompt_tokens": context.prompt_tokens,
         "user_id": "temp_debug_user",
+        **turn.session_fields,
     }
+
+
+async def open_chat_stream(turn: ChatTurn) -> StreamFlight:
+    """
+    Joins (or starts, under a "chat_stream" admission slot) the shared upstream
+    stream for a turn. Used by the SSE endpoint and the WebSocket transport.
+    """
+    data = turn.data
+    # Identical in-flight streams share one upstream call, whose events are
+    # coalesced and encoded once into frames for every subscriber. The footer
+    # and the done event depend on the raw emotion, so it is part of the key.
+    flight_key = f"{turn.cache_key}:{(data.emotion or 'neutral').lower()}"
+    running = chat_stream_flights.get(flight_key)
+    leading = running is None or not running.joinable
+    turn.check_quota(charge=leading)
+    slot = None
+    if leading:
+        # Only a request that will start an upstream call needs an admission slot
+        slot = await llm_admission.acquire("chat_stream")
+
+    def source(set_result):
+        def on_complete(text: str, provider: ChatProvider) -> None:
+            turn.store_completion(text, provider)
+            set_result(text)
+
+        return coalesce_events(generate_provider_stream(
+            provider_router, turn.context.messages, data.emotion,
+            on_complete=on_complete,
+            # Billed once, for the tokens actually streamed, even if the stream errors or is cancelled
+            on_finish=turn.record_usage,
+        ))
+
+    flight, leader = chat_stream_flights.join(flight_key, source, owner=turn.user_key)
+    if leader:
+        if slot is not None:
+            flight.task.add_done_callback(lambda _: slot.release())
+    else:
+        logger.info("Attaching to in-flight identical chat stream.")
+        turn.record_usage(shared=True)
+        if slot is not None:
+            # Another request started the same stream while this one waited for admission
+            slot.release()
+            turn.refund_quota()
+    # Each subscriber records its own session turn once the shared stream completes
+    flight.add_result_callback(turn.record_turn)
+    return flight
+
+
+# --- Unified Chat Endpoint (Handles both streaming & non-streaming) ---
+@router.post("/chat")
+# async def chat_endpoint(data: ChatRequest, current_user: Any = Depends(get_current_user)):
+async def chat_endpoint(data: ChatRequest, request: Request, user_key: str = Depends(usage_key)):
+    """
+    Unified chat endpoint.
+    - If stream=True → returns SSE stream
+    - Else → returns full JSON reply
+    """
+    logger.info(f"POST /api/chat | Emotion: {data.emotion} | Stream: {data.stream} | Session: {bool(data.session_id)}")
+
+    # A streaming retry that carries Last-Event-ID continues the original generation
+    if data.stream and request.headers.get("Last-Event-ID"):
+        resumed = resume_stream(request, request.headers.get("Last-Event-ID"), user_key)
+        if resumed is not None:
+            return resumed
+
+    turn = await prepare_turn(data, user_key)
+    if not data.stream:
+        return await complete_turn(turn)
+
+    # ------------------------------------------------------------
+    # STREAMING MODE
+    # ------------------------------------------------------------
+    logger.info("Streaming mode enabled for /api/chat.")
+    usage_headers = {"X-Prompt-Tokens": str(turn.context.prompt_tokens)}
+    cached = completion_cache.get(turn.cache_key)
+    if cached is not None:
+        logger.info("Serving /api/chat stream from completion cache.")
+        turn.record_turn(cached.text)
+        return StreamingResponse(
+            coalesce_events(replay_cached_stream(cached.text, data.emotion, cached.provider)),
+            media_type="text/event-stream",
+            headers={**SSE_HEADERS, **usage_headers},
+        )
+
+    flight = await open_chat_stream(turn)
+    return stream_flight_response(flight, request, headers=usage_headers)
+
+
+# --- Resume a dropped chat stream (Last-Event-ID) ---
+@router.options("/chat/resume")
+async def options_chat_resume():
+    logger.info("OPTIONS /api/chat/resume handled by chat router.")
+    return Response(status_code=status.HTTP_200_OK)
+
+
+@router.get("/chat/resume")
+async def resume_chat_stream(request: Request, last_event_id: Optional[str] = None, user_key: str = Depends(usage_key)):
+    """
+    Continues a streamed reply after the last event the client received, taken
+    from the Last-Event-ID header (EventSource reconnects) or `last_event_id`.
+    Only a caller that requested the generation can resume it. 404 means the
+    generation expired (or is someone else's) and the prompt must be sent again.
+    """
+    resumed = resume_stream(request, request.headers.get("Last-Event-ID") or last_event_id, user_key)
+    if resumed is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat stream not found or expired.")
+    return resumed
+
+
+# --- Batch chat (NDJSON, one line per item as it finishes) ---
+class ChatBatchRequest(BaseModel):
+    items: List[ChatRequest]
+    # Optional per-request limits; both are capped by the server settings
+    concurrency: Optional[int] = None
+    item_timeout: Optional[float] = None
+
+
+@router.options("/chat/batch")
+async def options_chat_batch():
+    logger.info("OPTIONS /api/chat/batch handled by chat router.")
+    return Response(status_code=status.HTTP_200_OK)
+
+
+@router.post("/chat/batch")
+async def chat_batch(batch: ChatBatchRequest, request: Request, user_key: str = Depends(usage_key)):
+    """
+    Runs many non-streaming chat turns concurrently (items' `stream` is ignored)
+    and streams back one NDJSON line per item as soon as it finishes:
+    {"index": i, "ok": true, "reply": ...} or {"index": i, "ok": false, "status": ..., "error": ...}.
+    Each item has its own deadline, so one slow item does not hold up the rest.
+    """
+    if not batch.items:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Batch has no items.")
+    if len(batch.items) > CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch has {len(batch.items)} items; the limit is {CHAT_BATCH_MAX_ITEMS}.",
+        )
+    concurrency = max(1, min(batch.concurrency or CHAT_BATCH_CONCURRENCY, CHAT_BATCH_CONCURRENCY))
+    item_timeout = min(batch.item_timeout or CHAT_BATCH_ITEM_TIMEOUT, CHAT_BATCH_ITEM_TIMEOUT)
+    logger.info(f"POST /api/chat/batch | {len(batch.items)} items | concurrency {concurrency} | deadline {item_timeout}s")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_item(index: int, item: ChatRequest) -> dict:
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                turn = await prepare_turn(item, user_key)
+                result = await asyncio.wait_for(complete_turn(turn, admission_route="batch"), item_timeout)
+                return {"index": index, "ok": True, **result, "latency": round(time.monotonic() - started, 3)}
+            except asyncio.TimeoutError:
+                return {"index": index, "ok": False, "status": status.HTTP_504_GATEWAY_TIMEOUT, "error": f"Item exceeded its {item_timeout}s deadline."}
+            except HTTPException as e:
+                return {"index": index, "ok": False, "status": e.status_code, "error": e.detail}
+            except Exception as e:
+                logger.error(f"Batch item {index} failed: {e}", exc_info=True)
+                return {"index": index, "ok": False, "status": status.HTTP_500_INTERNAL_SERVER_ERROR, "error": str(e)}
+
+    async def ndjson_lines():
+        tasks = [asyncio.ensure_future(run_item(i, item)) for i, item in enumerate(batch.items)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished, ensure_ascii=False) + "\n"
+        finally:
+            # Client gone or done: nothing left should keep running
+            for task in tasks:
+                task.cancel()
+
+    watch = DisconnectWatch(request)
+    return StreamingResponse(watch.wrap(ndjson_lines()), media_type="application/x-ndjson")
+
+
+# --- Server-side conversation sessions ---
+@router.options("/chat/sessions")
+async def options_chat_sessions():
+    logger.info("OPTIONS /api/chat/sessions handled by chat router.")
+    return Response(status_code=status.HTTP_200_OK)
+
+
+@router.post("/chat/sessions")
+async def create_chat_session(data: Optional[ChatSessionRequest] = None, user_key: str = Depends(usage_key)):
+    """
+    Creates a server-side conversation; pass its id as `session_id` to /api/chat.
+    Only the same caller (bearer token, else client address) can use it. An
+    optional `history` seeds it, which is how a client replaces a session
+    that answered 404 (expired or evicted) without losing context.
+    """
+    history = normalize_history(data.history) if data is not None else []
+    session_id = await conversation_store.create(user_key, history)
+    logger.info("Created chat session.")
+    return {"session_id": session_id}
+
+
+@router.get("/chat/sessions/{session_id}")
+async def get_chat_session(session_id: str, user_key: str = Depends(usage_key)):
+    conversation = await conversation_store.get(session_id, user_key)
+    if conversation is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found.")
+    return {"session_id": session_id, "messages": conversation.messages}
+
+
+@router.delete("/chat/sessions/{session_id}")
+async def delete_chat_session(session_id: str, user_key: str = Depends(usage_key)):
+    if not await conversation_store.delete(session_id, user_key):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat session not found.")
+    return {"message": "deleted"}
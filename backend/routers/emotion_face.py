@@ -1,159 +1,114 @@
 # ...existing code...
-from fastapi import APIRouter, Query, Response, status, Depends, HTTPException
+from fastapi import APIRouter, Query, Request, Response, status, Depends, HTTPException
 from fastapi.responses import StreamingResponse
+from starlette.formparsers import MultiPartException, MultiPartParser
 import cv2
-from backend.services.face_services import detect_emotions_from_array
-from typing import Optional, List, Dict, Any
+from backend.services.face_workers import detect_emotions, detect_batch, track_emotions
+from backend.services.emotion_sessions import EmotionSession, emotion_sessions
+from typing import Optional, List, Dict, Any, AsyncIterator
 import logging
 import time
-import asyncio  # Import asyncio for background task management
+import base64
+import binascii
+import json
 
 # --- Import Authentication Dependency ---
-from backend.deps import get_current_user
+from backend.deps import get_current_user, usage_key, stream_key
+from backend.services.camera_capture import camera
+from backend.services.frame_broadcaster import FrameBroadcaster
+from backend.utils.metrics import register_collector
+from backend.utils.sse import SSE_HEADERS, HEARTBEAT_FRAME, encode_event
+from backend.config import EMOTION_FRAME_MAX_BYTES, EMOTION_FRAME_MAX_BATCH, EMOTION_STREAM_KEEPALIVE
 
 logger = logging.getLogger("backend.emotion_face")
 
 # ✅ ADDED prefix="/api" here
 router = APIRouter(prefix="/api", tags=["emotion_face"])
 
-# --- In-memory cache for latest emotion data ---
-# NOTE: Simple cache, consider Redis for production
-latest_emotion_cache: Dict[str, Any] = {
-    "dominant_emotion": "neutral",
-    "score": 0.0,
-    "timestamp": 0.0,
-    "active": False  # Track if the stream is supposed to be active
-}
-CACHE_TIMEOUT = 10  # Seconds before cache is considered stale
-
-# Initialize webcam as None. Will open only when requested.
-cap: Optional[cv2.VideoCapture] = None
-# --- Background Task Management ---
-background_task = None
-stop_event = asyncio.Event()
-
-
-async def capture_and_detect_emotions(gamma: float = 1.2, skip_frames: int = 2):
-    """Background task to capture frames and detect emotions."""
-    global cap, latest_emotion_cache
-    logger.info("Starting emotion detection background task...")
-
-    if not cap or not cap.isOpened():
-        try:
-            cap = cv2.VideoCapture(0)  # Use default camera
-            cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)  # Optional: Set resolution
-            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-            if not cap.isOpened():
-                raise RuntimeError("Webcam not accessible")
-            logger.info("Webcam opened successfully by background task.")
-        except Exception as e:
-            logger.error(f"⚠️ Failed to open webcam in background task: {e}")
-            latest_emotion_cache["active"] = False
-            return  # Stop task if camera fails
-
-    frame_count = 0
-    latest_emotion_cache["active"] = True
-    latest_emotion_cache["timestamp"] = time.time()  # Update timestamp on start
+# --- Per-user emotion state ---
+# Each user (or anonymous client, keyed like usage metering: deps.usage_key) has its
+# own EmotionSession: latest reading, smoothing window, tracker and detection task.
+# The webcam itself is read on its own thread (services/camera_capture.py).
+
+
+async def capture_and_detect_emotions(session: EmotionSession, gamma: float = 1.2, skip_frames: int = 2):
+    """Background task: detects emotions on the newest webcam frames for one session."""
+    logger.info(f"Starting emotion detection background task for {session.key}...")
+
+    if not await camera.acquire():
+        logger.error("⚠️ Failed to open webcam in background task.")
+        session.active = False
+        return  # Stop task if camera fails
+
+    last_seq = 0
+    last_detected_seq = 0
+    # Full cascade scans only every few frames; faces are tracked in between
+    tracker = session.new_tracker()
+    session.active = True
+    session.timestamp = time.time()  # Update timestamp on start
 
     try:
-        while not stop_event.is_set() and cap and cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                logger.warning("Failed to read frame from webcam in background task.")
-                await asyncio.sleep(0.1)  # Avoid busy-looping
+        while not session.stop_event.is_set():
+            frame = await camera.next_frame(last_seq)
+            if frame is None:
+                if not camera.running:
+                    logger.warning("Webcam capture stopped; ending background task.")
+                    break
+                logger.warning("No new webcam frame for background task.")
                 continue
+            last_seq = frame.seq
 
-            # Run detection only every `skip_frames` frames
-            if frame_count % skip_frames == 0:
-                try:
-                    # Run CPU-bound detection in executor to avoid blocking asyncio loop
-                    loop = asyncio.get_event_loop()
-                    # Convert frame to RGB before emotion detection
-                    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    detected_faces = await loop.run_in_executor(
-                        None,  # Use default executor
-                        detect_emotions_from_array,  # The function to run
-                        rgb_frame,  # Pass RGB frame instead of BGR
-                        gamma
-                    )
-
-                    if detected_faces:
-                        best_face = max(detected_faces, key=lambda f: f.get("score", 0))
-                        current_time = time.time()
-                        # Update cache only if detection is confident enough (already handled in service)
-                        latest_emotion_cache.update({
-                            "dominant_emotion": best_face.get("dominant_emotion", "neutral"),
-                            "score": best_face.get("score", 0.0),
-                            "timestamp": current_time
-                        })
-                        # logger.debug(f"Detected: {best_face['dominant_emotion']} ({best_face['score']:.2f})")
-                    else:
-                        # No face detected, update timestamp
-                        latest_emotion_cache["timestamp"] = time.time()
-
-                except Exception as detect_error:
-                    logger.error(f"Error during emotion detection call: {detect_error}", exc_info=True)
-                    latest_emotion_cache.update({
-                        "dominant_emotion": "neutral",
-                        "score": 0.0,
-                        "timestamp": time.time()
-                    })
-
-            frame_count += 1
-            # Adjust sleep: smaller value = higher CPU, potentially faster updates
-            # Larger value = lower CPU, slower updates
-            await asyncio.sleep(1 / 15)  # Aim for ~15 FPS processing cycle
+            # Run detection only every `skip_frames` frames; frames captured while
+            # a detection runs are simply never seen (the buffer keeps only the newest)
+            if last_detected_seq and frame.seq - last_detected_seq < skip_frames:
+                continue
+            last_detected_seq = frame.seq
+            try:
+                # Vision pool or worker processes, per FACE_ANALYSIS_BACKEND
+                if tracker is not None:
+                    detected_faces = await track_emotions(tracker, frame.image, gamma, to_rgb=True)
+                else:
+                    detected_faces = await detect_emotions(frame.image, gamma, session.smoothing, to_rgb=True)
+                # No face detected only refreshes the timestamp
+                session.record(detected_faces)
+
+            except Exception as detect_error:
+                logger.error(f"Error during emotion detection call: {detect_error}", exc_info=True)
+                session.reset_reading()
 
     except Exception as e:
         logger.error(f"Exception in background task loop: {e}", exc_info=True)
     finally:
-        logger.info("Emotion detection background task stopping...")
-        if cap and cap.isOpened():
-            cap.release()
-            cap = None
-            logger.info("Webcam released by background task.")
-        latest_emotion_cache["active"] = False
-        latest_emotion_cache["timestamp"] = time.time()
-        stop_event.clear()
-
-
-def stop_background_task():
-    """Signals the background task to stop."""
-    global background_task
-    logger.info("Signaling background task to stop.")
-    stop_event.set()
-    # Wait briefly for task to potentially finish cleanup
-    # asyncio.create_task(asyncio.sleep(0.5)) # Optional small delay
-    # Check if task exists and cancel it if it hasn't stopped
-    # if background_task and not background_task.done():
-    #     background_task.cancel() # Force cancellation if needed
-    background_task = None
-    # Ensure cache reflects inactive state immediately
-    latest_emotion_cache["active"] = False
+        logger.info(f"Emotion detection background task for {session.key} stopping...")
+        camera.release()
+        session.active = False
+        session.timestamp = time.time()
+        session.tracker = None
+        session.stop_event.clear()
 
 
 # --- Endpoint to Start/Stop the Background Detection ---
 @router.post("/emotion/control")
 # async def control_emotion_detection(active: bool, gamma: float = 1.2, current_user: Any = Depends(get_current_user)): # Re-enable auth later
-async def control_emotion_detection(active: bool, gamma: float = 1.2):  # Keep auth disabled for debug
-    global background_task
+async def control_emotion_detection(active: bool, gamma: float = 1.2, user_key: str = Depends(usage_key)):  # Keep auth disabled for debug
+    session = emotion_sessions.get(user_key)
     if active:
-        if background_task and not background_task.done():
+        if session.running:
             logger.info("Emotion detection task already running.")
             return {"message": "Emotion detection already active."}
         else:
-            stop_event.clear()
             # Create and run the task
-            background_task = asyncio.create_task(capture_and_detect_emotions(gamma=gamma))
+            session.start(capture_and_detect_emotions(session, gamma=gamma))
             logger.info("Emotion detection background task initiated.")
             return {"message": "Emotion detection starting."}
     else:
-        if background_task and not background_task.done():
-            stop_background_task()
+        if session.running:
+            logger.info("Signaling background task to stop.")
+            session.stop()
             return {"message": "Emotion detection stopping."}
         else:
             # Ensure inactive state if task wasn't running or already stopped
-            stop_background_task()  # Call to ensure cleanup/reset
+            session.stop()
             logger.info("Emotion detection task was not running or already stopped.")
             return {"message": "Emotion detection already inactive."}
 
@@ -168,26 +123,9 @@ async def options_emotion_control():
 # --- Endpoint to Get Latest Emotion Data ---
 @router.get("/emotion/latest")
 # async def get_latest_emotion_data(current_user: Any = Depends(get_current_user)): # Re-enable auth later
-async def get_latest_emotion_data():  # Keep auth disabled for debug
-    """Returns the latest detected emotion from the cache."""
-    is_active = latest_emotion_cache.get("active", False)
-    timestamp = latest_emotion_cache.get("timestamp", 0.0)
-    is_stale = (time.time() - timestamp) > CACHE_TIMEOUT
-
-    # Log cache state for debugging
-    # logger.debug(f"Latest emotion cache state: Active={is_active}, Stale={is_stale}, Emotion={latest_emotion_cache.get('dominant_emotion')}")
-
-    # Return neutral if inactive or stale
-    if not is_active or is_stale:
-        return {"dominant_emotion": "neutral", "score": 0.0, "active": is_active, "stale": is_stale}
-
-    # Return cached data if active and not stale
-    return {
-        "dominant_emotion": latest_emotion_cache.get("dominant_emotion", "neutral"),
-        "score": latest_emotion_cache.get("score", 0.0),
-        "active": is_active,
-        "stale": is_stale
-    }
+async def get_latest_emotion_data(user_key: str = Depends(usage_key)):  # Keep auth disabled for debug
+    """Returns the caller's latest detected emotion (neutral if inactive or stale)."""
+    return emotion_sessions.latest(user_key)
 
 
 # --- Explicit OPTIONS handler for latest emotion ---
@@ -197,78 +135,82 @@ async def options_emotion_latest():
     return Response(status_code=status.HTTP_200_OK)
 
 
-# --- Video Feed (Optional - for visual confirmation) ---
-async def generate_feed_frames(gamma: float = 1.2):  # Made async
-    """Yields frames from webcam with overlay based on cache."""
-    global cap, latest_emotion_cache
-
-    # Ensure camera is open for the feed if needed
-    local_cap = cap  # Use global cap if available
-    opened_locally = False
-    if not local_cap or not local_cap.isOpened():
-        logger.info("Feed opening webcam as background task hasn't.")
-        try:
-            local_cap = cv2.VideoCapture(0)
-            local_cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            local_cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-            if not local_cap.isOpened():
-                raise RuntimeError("Webcam not accessible for video feed")
-            opened_locally = True
-        except Exception as e:
-            logger.error(f"⚠️ Failed to open webcam for video feed: {e}")
-            # Yield a single error frame? For now, just stop.
-            return
-
+# --- Server push of the caller's emotion (replaces polling /api/emotion/latest) ---
+async def emotion_events(user_key: str) -> AsyncIterator[str]:
+    """SSE frames: the current reading, then one per significant change, with keepalive comments."""
+    updates = emotion_sessions.updates(user_key, EMOTION_STREAM_KEEPALIVE)
     try:
-        while local_cap and local_cap.isOpened():
-            ret, frame = local_cap.read()
-            if not ret:
-                logger.warning("Failed to read frame for video feed.")
-                break
+        async for reading in updates:
+            yield HEARTBEAT_FRAME if reading is None else encode_event(reading)
+    finally:
+        await updates.aclose()
+
 
-            # --- Read from Cache for Overlay ---
-            cache_copy = latest_emotion_cache.copy()  # Read cache atomically
-            current_emotion = cache_copy.get("dominant_emotion", "neutral")
-            current_score = cache_copy.get("score", 0.0)
-            is_active = cache_copy.get("active", False)
-            timestamp = cache_copy.get("timestamp", 0.0)
-            is_stale = (time.time() - timestamp) > CACHE_TIMEOUT
-
-            # Draw status indicator
-            status_text = "ACTIVE" if is_active and not is_stale else ("INACTIVE" if not is_active else "STALE")
-            status_color = (0, 255, 0) if is_active and not is_stale else ((0, 0, 255) if not is_active else (0, 165, 255))  # Orange for stale
-            cv2.putText(frame, f"Status: {status_text}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, status_color, 2)
-
-            # Draw emotion label if active and not stale and score > 0
-            if is_active and not is_stale and current_score > 0:
-                label_text = f"{current_emotion.upper()} ({current_score:.2f})"
-                (text_width, text_height), _ = cv2.getTextSize(label_text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                rect_x = 10
-                rect_y = frame.shape[0] - 40
-                cv2.rectangle(frame, (rect_x, rect_y), (rect_x + text_width + 10, rect_y + text_height + 10), status_color, -1)
-                cv2.putText(frame, label_text, (rect_x + 5, rect_y + text_height + 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
-
-            _, buffer = cv2.imencode('.jpg', frame)
-            frame_bytes = buffer.tobytes()
+@router.options("/emotion/stream")
+async def options_emotion_stream():
+    logger.info("OPTIONS /api/emotion/stream handled explicitly.")
+    return Response(status_code=status.HTTP_200_OK)
+
+
+@router.get("/emotion/stream")
+async def emotion_stream(user_key: str = Depends(stream_key)):
+    """
+    Server-sent events with the same payload as /api/emotion/latest, sent
+    when the dominant emotion changes or the score moves by at least
+    EMOTION_STREAM_SCORE_DELTA. EventSource cannot set headers, so
+    authenticate with `?ticket=<ticket>` from POST /api/auth/ticket.
+    """
+    return StreamingResponse(emotion_events(user_key), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+# --- Video Feed (Optional - for visual confirmation) ---
+def draw_overlay(image):
+    """
+    Returns a copy of `image` with the status overlay. One encoded frame is
+    shared by every viewer of the camera, so the overlay carries only camera
+    state (whether any session is analyzing it), never a user's own reading;
+    clients get their emotion from /api/emotion/latest or /api/emotion/stream.
+    """
+    frame = image.copy()  # Frames are shared with other consumers
+    is_active = emotion_sessions.any_active()
+
+    # Draw status indicator
+    status_text = "ACTIVE" if is_active else "INACTIVE"
+    status_color = (0, 255, 0) if is_active else (0, 0, 255)
+    cv2.putText(frame, f"Status: {status_text}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, status_color, 2)
+    return frame
+
+
+feed_broadcaster = FrameBroadcaster(camera, draw_overlay)
+register_collector("video_feed", feed_broadcaster.snapshot)
+
+
+async def generate_feed_frames(
+    fps: Optional[float] = None, quality: Optional[int] = None, session: Optional[EmotionSession] = None
+):  # Made async
+    """
+    Yields multipart JPEG frames with the emotion overlay, from the shared
+    broadcaster. Ends when the viewer's own session is told to stop.
+    """
+    frames = feed_broadcaster.subscribe(max_fps=fps, quality=quality)
+    sent = False
+    try:
+        async for frame_bytes in frames:
+            sent = True
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
 
-            # Allow other tasks to run
-            await asyncio.sleep(1 / 30)  # Aim for ~30 FPS feed rate
-
-            # Check if global stop event was set (e.g., by control endpoint)
-            if stop_event.is_set():
+            # Check if the viewer's session was told to stop (e.g., by control endpoint)
+            if session is not None and session.stop_event.is_set():
                 logger.info("Stop event detected in video feed generator.")
                 break
-
+        if not sent:
+            logger.error("⚠️ No frames for video feed (webcam not accessible?).")
     except Exception as e:
         logger.error(f"Error in video feed generation: {e}", exc_info=True)
     finally:
+        await frames.aclose()
         logger.info("Video feed generator stopping.")
-        if opened_locally and local_cap and local_cap.isOpened():
-            local_cap.release()
-            logger.info("Webcam opened by feed generator released.")
-        # Do not release global cap here
 
 
 @router.options("/video_feed")
@@ -278,11 +220,178 @@ async def options_video_feed():
 
 
 @router.get("/video_feed")
-# async def video_feed_endpoint(gamma: float = Query(1.2), current_user: Any = Depends(get_current_user)): # Re-enable auth later
-async def video_feed_endpoint(gamma: float = Query(1.2)):  # Keep auth disabled for debug
-    """Streams webcam feed with emotion overlay read from cache."""
+# async def video_feed_endpoint(current_user: Any = Depends(get_current_user)): # Re-enable auth later
+async def video_feed_endpoint(
+    fps: Optional[float] = Query(None, gt=0),  # Per-viewer frame-rate cap (bounded by VIDEO_FEED_MAX_FPS)
+    quality: Optional[int] = Query(None, ge=1, le=100),  # Starting JPEG quality; lowered while the viewer falls behind
+    user_key: str = Depends(usage_key),
+):  # Keep auth disabled for debug
+    """Streams the webcam feed with the detection status overlay (see draw_overlay)."""
     logger.info("GET /api/video_feed requested.")
     # This just starts the *display* stream, not the background detection task.
-    return StreamingResponse(generate_feed_frames(gamma=gamma),
+    return StreamingResponse(generate_feed_frames(fps=fps, quality=quality, session=emotion_sessions.find(user_key)),
                              media_type="multipart/x-mixed-replace; boundary=frame")
-# ...existing code...
\ No newline at end of file
+
+# --- Frame uploads from browser-captured video ---
+IMAGE_CONTENT_TYPES = ("image/jpeg", "image/webp", "image/png", "application/octet-stream")
+# Whole-body limits: one frame for a raw image, a full batch for forms, plus base64 growth for JSON
+_FORM_OVERHEAD = 64 * 1024
+MAX_IMAGE_BODY = EMOTION_FRAME_MAX_BYTES
+MAX_FORM_BODY = EMOTION_FRAME_MAX_BYTES * EMOTION_FRAME_MAX_BATCH + _FORM_OVERHEAD
+MAX_JSON_BODY = EMOTION_FRAME_MAX_BYTES * EMOTION_FRAME_MAX_BATCH * 4 // 3 + _FORM_OVERHEAD
+
+
+def _body_too_large(limit: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Request body exceeds {limit} bytes.",
+    )
+
+
+async def _capped_body(request: Request, limit: int) -> AsyncIterator[bytes]:
+    """
+    The request body as it arrives, refused with 413 as soon as it passes
+    `limit` bytes: up front from Content-Length, else while streaming.
+    """
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise _body_too_large(limit)
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise _body_too_large(limit)
+        yield chunk
+
+
+async def _read_capped(request: Request, limit: int) -> bytes:
+    return b"".join([chunk async for chunk in _capped_body(request, limit)])
+
+
+def _decode_base64_image(value: Any) -> bytes:
+    if not isinstance(value, str):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Images must be base64 strings.")
+    # Accept data URLs ("data:image/jpeg;base64,...") as sent by canvas.toDataURL()
+    _, _, encoded = value.rpartition(",")
+    try:
+        return base64.b64decode(encoded, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid base64 image data.")
+
+
+async def read_frames(request: Request) -> List[bytes]:
+    """
+    Encoded frames from a raw image body (image/jpeg, image/webp, image/png),
+    a multipart form (every file part, in order), or JSON with base64
+    "image" / "images" (data URLs accepted). Bodies are read with a running
+    size cap, so an oversized upload is refused before it is held in memory.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in IMAGE_CONTENT_TYPES:
+        frames = [await _read_capped(request, MAX_IMAGE_BODY)]
+    elif content_type == "multipart/form-data":
+        parser = MultiPartParser(request.headers, _capped_body(request, MAX_FORM_BODY))
+        try:
+            form = await parser.parse()
+        except MultiPartException as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.message)
+        try:
+            frames = [await value.read() for _, value in form.multi_items() if hasattr(value, "read")]
+        finally:
+            await form.close()
+    elif content_type == "application/json":
+        try:
+            payload = json.loads(await _read_capped(request, MAX_JSON_BODY))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON body.")
+        if not isinstance(payload, dict):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a JSON object.")
+        images = payload.get("images")
+        if images is None:
+            images = [payload["image"]] if "image" in payload else []
+        if not isinstance(images, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'images' must be a list.")
+        frames = [_decode_base64_image(image) for image in images]
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send an image body, multipart files, or JSON with base64 'image'/'images'.",
+        )
+
+    if not frames or not all(frames):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No image data received.")
+    if len(frames) > EMOTION_FRAME_MAX_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"{len(frames)} frames sent; the limit is {EMOTION_FRAME_MAX_BATCH} per request.",
+        )
+    if any(len(frame) > EMOTION_FRAME_MAX_BYTES for frame in frames):
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Frames are limited to {EMOTION_FRAME_MAX_BYTES} bytes.",
+        )
+    return frames
+
+
+def _frame_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Adds the dominant emotion (best-scoring face, as in the webcam loop) to a frame's result."""
+    faces = result.get("faces") or []
+    best_face = max(faces, key=lambda f: f.get("score", 0)) if faces else {}
+    return {
+        **result,
+        "dominant_emotion": best_face.get("dominant_emotion", "neutral"),
+        "score": best_face.get("score", 0.0),
+    }
+
+
+@router.options("/emotion_face/frame")
+async def options_emotion_frame():
+    logger.info("OPTIONS /api/emotion_face/frame handled explicitly.")
+    return Response(status_code=status.HTTP_200_OK)
+
+
+@router.post("/emotion_face/frame")
+async def analyze_frame(request: Request, gamma: float = Query(1.2), user_key: str = Depends(usage_key)):
+    """
+    Analyzes one uploaded frame (raw image body, multipart file, or base64 JSON
+    "image"). The reading also updates the caller's emotion session.
+    """
+    frames = await read_frames(request)
+    if len(frames) > 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Send batches to /api/emotion_face/frames.")
+    # Decoding and detection run on the vision pool (or worker processes), never on the event loop
+    result = (await detect_batch(frames, gamma))[0]
+    if "error" in result:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=result["error"])
+    emotion_sessions.get(user_key).record_frame(result["faces"])
+    return _frame_result(result)
+
+
+@router.options("/emotion_face/frames")
+async def options_emotion_frames():
+    logger.info("OPTIONS /api/emotion_face/frames handled explicitly.")
+    return Response(status_code=status.HTTP_200_OK)
+
+
+@router.post("/emotion_face/frames")
+async def analyze_frames(request: Request, gamma: float = Query(1.2), user_key: str = Depends(usage_key)):
+    """
+    Analyzes a batch of frames from one camera (multipart files or base64 JSON
+    "images", in capture order) on the configured FACE_ANALYSIS_BACKEND. Results are per
+    frame and in order; a frame that fails to decode gets {"error": ...}. The
+    newest decodable frame's reading updates the caller's emotion session.
+    """
+    frames = await read_frames(request)
+    logger.info(f"POST /api/emotion_face/frames | {len(frames)} frames")
+    results = await detect_batch(frames, gamma)
+    latest = next((r for r in reversed(results) if "error" not in r), None)
+    if latest is not None:
+        emotion_sessions.get(user_key).record_frame(latest["faces"])
+    return {
+        "count": len(results),
+        "results": [
+            {"index": i, **(result if "error" in result else _frame_result(result))}
+            for i, result in enumerate(results)
+        ],
+    }
+# ...existing code...
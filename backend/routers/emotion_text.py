@@ -7,6 +7,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
 from backend.services.nlp_services import map_emotion
 from backend.deps import get_current_user
+from backend.utils.http_pools import provider_http_client
 
 router = APIRouter(tags=["emotion"], prefix="/api")
 logger = logging.getLogger("emotion_text_router")
@@ -25,7 +26,8 @@ class TextEmotionRequest(BaseModel):
 @router.post("/emotion/text")
 async def detect_text_emotion(
     payload: TextEmotionRequest, 
-    current_user: str = Depends(get_current_user)
+    current_user: str = Depends(get_current_user),
+    hf_client: httpx.AsyncClient = Depends(provider_http_client("huggingface")),
 ):
     """
     Detects emotion from text using the Hugging Face Inference API.
@@ -47,28 +49,28 @@ async def detect_text_emotion(
     hf_payload = json.dumps({"inputs": payload.text})
     
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            response = await client.post(HF_MODEL_URL, headers=headers, content=hf_payload)
-            response.raise_for_status()
-            
-            # Expected response format: [[{'label': 'joy', 'score': 0.99}, ...]]
-            results = response.json()
-            
-            if not results or not results[0]:
-                raise ValueError("HF model returned no results.")
-            
-            # Find the highest scoring emotion
-            top_result = max(results[0], key=lambda x: x['score'])
-            
-            detected_emotion = map_emotion(top_result['label'])
-            
-            return {
-                "emotion": detected_emotion,
-                "raw_emotion": top_result['label'],
-                "raw_score": top_result['score'],
-                "provider": "huggingface"
-            }
-            
+        # Shared keep-alive pool (created in the app lifespan) avoids a TCP+TLS handshake per call
+        response = await hf_client.post(HF_MODEL_URL, headers=headers, content=hf_payload, timeout=15)
+        response.raise_for_status()
+        
+        # Expected response format: [[{'label': 'joy', 'score': 0.99}, ...]]
+        results = response.json()
+        
+        if not results or not results[0]:
+            raise ValueError("HF model returned no results.")
+        
+        # Find the highest scoring emotion
+        top_result = max(results[0], key=lambda x: x['score'])
+        
+        detected_emotion = map_emotion(top_result['label'])
+        
+        return {
+            "emotion": detected_emotion,
+            "raw_emotion": top_result['label'],
+            "raw_score": top_result['score'],
+            "provider": "huggingface"
+        }
+        
     except httpx.HTTPStatusError as e:
         logger.error(f"HF API Error ({e.response.status_code}): {e.response.text}")
         raise HTTPException(status_code=e.response.status_code, detail=f"Hugging Face API Error: {e.response.text}")
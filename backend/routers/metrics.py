@@ -0,0 +1,35 @@
+# backend/routers/metrics.py
+import logging
+from fastapi import APIRouter, Response, status
+
+from backend.utils.circuit_breaker import breakers
+from backend.utils.metrics import collect_metrics
+
+router = APIRouter(prefix="/api", tags=["metrics"])
+logger = logging.getLogger("backend.metrics")
+
+
+@router.options("/metrics")
+async def options_metrics():
+    logger.info("OPTIONS /api/metrics handled explicitly.")
+    return Response(status_code=status.HTTP_200_OK)
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Returns in-process runtime metrics (connection pools, caches, queues...)."""
+    return collect_metrics()
+
+
+@router.options("/status")
+async def options_status():
+    logger.info("OPTIONS /api/status handled explicitly.")
+    return Response(status_code=status.HTTP_200_OK)
+
+
+@router.get("/status")
+async def get_status():
+    """Upstream health: circuit breaker state and current adaptive timeout per provider endpoint."""
+    snapshot = breakers.snapshot()
+    degraded = sorted(name for name, b in snapshot.items() if b["state"] != "closed")
+    return {"status": "degraded" if degraded else "ok", "degraded": degraded, "breakers": snapshot}
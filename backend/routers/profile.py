@@ -7,6 +7,7 @@ from backend.utils.database import get_db
 from backend.models.user import User
 from backend.services.auth_service import hash_password, hash_secret_key
 from sqlalchemy.future import select
+from backend.utils.executors import executors
 
 router = APIRouter(prefix="/api/auth", tags=["profile"])
 
@@ -27,10 +28,10 @@ async def update_profile(payload: UpdateProfile, db: AsyncSession = Depends(get_
         current_user.email = payload.email
         updated = True
     if payload.password:
-        current_user.password_hash = hash_password(payload.password)
+        current_user.password_hash = await executors.run("hashing", hash_password, payload.password)
         updated = True
     if payload.secret_key:
-        current_user.secret_key_hash = hash_secret_key(payload.secret_key)
+        current_user.secret_key_hash = await executors.run("hashing", hash_secret_key, payload.secret_key)
         updated = True
     if updated:
         db.add(current_user)
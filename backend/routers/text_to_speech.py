@@ -3,21 +3,28 @@ from fastapi import APIRouter, HTTPException, Response, status, Depends
 from pydantic import BaseModel
 import asyncio
 import logging
+import os
+import time
 from io import BytesIO
 
 # Import client getter from the NEW utility file
 from backend.utils.clients import get_groq_client
+from backend.utils.admission import llm_admission
+from backend.utils.circuit_breaker import breakers
+from backend.utils.executors import executors
+from backend.utils.context_builder import estimate_tokens
+from backend.services.usage_meter import usage_meter
+from backend.deps import usage_key
 # Import authentication dependency (we will comment it out temporarily)
 # from backend.deps import get_current_user
 from typing import Any
 
-# Import ThreadPoolExecutor
-from concurrent.futures import ThreadPoolExecutor
 
 router = APIRouter(prefix="/api", tags=["tts"])
 logger = logging.getLogger("backend.tts")
-# Ensure an executor is available
-executor = ThreadPoolExecutor()
+# Blocking Groq SDK calls run on the shared io pool
+executor = executors.get("io")
+TIMEOUT_TTS = int(os.getenv("TIMEOUT_TTS", 20))
 
 class TTSRequest(BaseModel):
     text: str
@@ -35,7 +42,7 @@ async def options_tts():
 # --- TEMPORARILY REMOVED AUTH DEPENDENCY FOR DEBUGGING ---
 @router.post("/tts", response_class=Response)
 # async def text_to_speech(payload: TTSRequest, current_user: Any = Depends(get_current_user)):
-async def text_to_speech(payload: TTSRequest): # REMOVED current_user dependency
+async def text_to_speech(payload: TTSRequest, user_key: str = Depends(usage_key)): # REMOVED current_user dependency
     """
     Generates speech audio from text using Groq TTS (if available).
     Returns audio/mpeg content.
@@ -43,7 +50,16 @@ async def text_to_speech(payload: TTSRequest): # REMOVED current_user dependency
     """
     # Log entry into the POST endpoint
     logger.info("POST /api/tts endpoint called.")
+    audio_bytes = await synthesize_speech(payload, user_key)
+    return Response(content=audio_bytes, media_type="audio/mpeg")
 
+
+async def synthesize_speech(payload: TTSRequest, user_key: str = "anonymous") -> bytes:
+    """
+    MP3 bytes for `payload` via Groq TTS. Shared by POST /api/tts and the
+    WebSocket tts channel; failures are raised as HTTPException. The input
+    text is billed to `user_key` (see services/usage_meter.py).
+    """
     client = get_groq_client()
     if not client:
         logger.warning("Groq client not available for TTS.")
@@ -52,6 +68,32 @@ async def text_to_speech(payload: TTSRequest): # REMOVED current_user dependency
             detail="TTS service requires a configured Groq client (check API key)."
         )
 
+    # Quota first: a 429 must not take (and then hold) an admission slot or the breaker's half-open trial slot
+    input_tokens = estimate_tokens(payload.text)
+    usage_meter.check(user_key, "tts", input_tokens)
+
+    # TTS shares the upstream concurrency budget with chat, under its own route limit
+    slot = await llm_admission.acquire("tts")
+    try:
+        audio_bytes = await _groq_tts(client, payload)
+    finally:
+        slot.release()
+    usage_meter.record(user_key, "tts", prompt_tokens=input_tokens)
+    return audio_bytes
+
+
+async def _groq_tts(client: Any, payload: TTSRequest) -> bytes:
+    # Fail fast while Groq TTS is known to be unhealthy instead of waiting out the timeout
+    breaker = breakers.get("groq.tts", timeout_max=TIMEOUT_TTS)
+    if not breaker.allow():
+        retry_after = breaker.retry_after()
+        logger.warning(f"Groq TTS circuit open; rejecting request (retry in {retry_after:.0f}s).")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="TTS provider is temporarily unavailable.",
+            headers={"Retry-After": str(int(retry_after))},
+        )
+
     # --- Actual Groq TTS Call (using executor for sync library) ---
     def sync_tts_call():
         try:
@@ -60,7 +102,8 @@ async def text_to_speech(payload: TTSRequest): # REMOVED current_user dependency
                 model=payload.model,
                 voice=payload.voice,
                 input=payload.text,
-                response_format="mp3"
+                response_format="mp3",
+                timeout=breaker.timeout(),
             )
             audio_stream = BytesIO()
             response.stream_to_file(audio_stream) # ASSUMPTION based on OpenAI
@@ -81,10 +124,19 @@ async def text_to_speech(payload: TTSRequest): # REMOVED current_user dependency
         # logger.info(f"Generating TTS for text: '{payload.text[:30]}...' by user {current_user.id}") # Cannot log user ID temporarily
         logger.info(f"Generating TTS for text: '{payload.text[:30]}...'")
         loop = asyncio.get_event_loop()
-        audio_bytes = await loop.run_in_executor(executor, sync_tts_call)
+        started = time.monotonic()
+        try:
+            audio_bytes = await loop.run_in_executor(executor, sync_tts_call)
+        except NotImplementedError:
+            breaker.release()  # Our SDK setup is broken, not Groq: free the trial slot, record nothing
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success(time.monotonic() - started)
 
         logger.info("TTS generation successful.")
-        return Response(content=audio_bytes, media_type="audio/mpeg")
+        return audio_bytes
 
     except NotImplementedError as nie:
          raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(nie))
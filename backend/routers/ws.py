@@ -0,0 +1,454 @@
+# backend/routers/ws.py
+import asyncio
+import base64
+import json
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, WebSocket, status
+from pydantic import ValidationError
+
+from backend.config import (
+    WS_REQUIRE_AUTH,
+    WS_QUEUE_SIZE,
+    WS_MAX_VOICE_BYTES,
+    WS_TTS_CHUNK_BYTES,
+    EMOTION_STREAM_KEEPALIVE,
+    EMOTION_FRAME_MAX_BYTES,
+    EMOTION_STREAM_MAX_CONNECTIONS,
+)
+from backend.deps import get_user_from_ticket
+from backend.routers.chat import ChatRequest, prepare_turn, complete_turn, open_chat_stream
+from backend.routers.text_to_speech import TTSRequest, synthesize_speech
+from backend.services.asr_service import transcribe_audio
+from backend.services.emotion_sessions import emotion_sessions
+from backend.services.emotion_stream import EmotionStream, stream_stats
+from backend.utils.chat_helpers import replay_cached_stream
+from backend.utils.completion_cache import completion_cache
+from backend.utils.database import AsyncSessionLocal
+from backend.utils.http_pools import http_pools
+from backend.utils.metrics import register_collector
+from backend.utils.sse import coalesce_events
+
+logger = logging.getLogger("backend.ws")
+
+router = APIRouter(prefix="/api", tags=["websocket"])
+
+CHANNELS = ("chat", "emotion", "tts", "voice")
+# Application close code for a missing or invalid ticket (4000-4999 are free for apps)
+WS_CLOSE_UNAUTHORIZED = 4401
+
+
+class _WSStats:
+    def __init__(self):
+        self.connections = 0
+        self.open = 0
+        self.auth_failures = 0
+        self.messages_in = 0
+        self.messages_out = 0
+        self.backpressure_waits = 0
+        self.errors_dropped = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "connections": self.connections,
+            "open": self.open,
+            "auth_failures": self.auth_failures,
+            "messages_in": self.messages_in,
+            "messages_out": self.messages_out,
+            "backpressure_waits": self.backpressure_waits,
+            "errors_dropped": self.errors_dropped,
+        }
+
+
+ws_stats = _WSStats()
+register_collector("websocket", ws_stats.snapshot)
+
+
+class ChannelSender:
+    """
+    Outgoing queue for one channel. `put` blocks while the queue is full, so a
+    slow consumer throttles that channel's producer without stalling the
+    others. With flow control on (`credit` not None) the writer sends only
+    while the client has credit left.
+    """
+
+    def __init__(self, name: str, wakeup: asyncio.Event, size: int = WS_QUEUE_SIZE):
+        self.name = name
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(size)
+        self.credit: Optional[int] = None
+        self._wakeup = wakeup
+
+    async def put(self, text: str) -> None:
+        if self.queue.full():
+            ws_stats.backpressure_waits += 1
+        await self.queue.put(text)
+        self._wakeup.set()
+
+    def put_nowait(self, text: str) -> bool:
+        """Queues without waiting; False (message dropped) when the queue is full."""
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            return False
+        self._wakeup.set()
+        return True
+
+    def ready(self) -> bool:
+        return not self.queue.empty() and (self.credit is None or self.credit > 0)
+
+    def take(self) -> str:
+        if self.credit is not None:
+            self.credit -= 1
+        return self.queue.get_nowait()
+
+    def set_window(self, window: Optional[int]) -> None:
+        self.credit = window
+        self._wakeup.set()
+
+    def grant(self, n: int) -> None:
+        self.credit = (self.credit or 0) + max(0, n)
+        self._wakeup.set()
+
+
+def _count(value: Any) -> int:
+    """A non-negative integer from a client message field; ValueError otherwise."""
+    # bool is an int subclass; floats must be whole (json.loads also accepts Infinity and NaN)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not (0 <= value < float("inf")):
+        raise ValueError(f"invalid count {value!r}")
+    if value != int(value):
+        raise ValueError(f"invalid count {value!r}")
+    return int(value)
+
+
+def _envelope(channel: str, msg_id: Any, msg_type: str, **fields: Any) -> str:
+    return json.dumps({"channel": channel, "id": msg_id, "type": msg_type, **fields}, ensure_ascii=False)
+
+
+class Connection:
+    """
+    One multiplexed socket. Client messages are JSON
+    {"channel", "id", "type", ...}; replies carry the same channel and id.
+    Each request runs as its own task, and a single writer drains the
+    channel queues round-robin so one busy channel cannot starve the rest.
+    """
+
+    def __init__(self, websocket: WebSocket, user: Any = None):
+        self.websocket = websocket
+        self.user = user
+        self.user_key = _user_key(websocket, user)
+        self._wakeup = asyncio.Event()
+        self.channels = {name: ChannelSender(name, self._wakeup) for name in CHANNELS}
+        self.tasks: Dict[Tuple[str, Any], asyncio.Task] = {}
+        self._voice: Optional[Dict[str, Any]] = None
+
+    # ---------------------- OUTGOING ----------------------
+    async def send(self, channel: str, msg_id: Any, msg_type: str, **fields: Any) -> None:
+        await self.channels[channel].put(_envelope(channel, msg_id, msg_type, **fields))
+
+    def reply_error(self, channel: str, msg_id: Any, status_code: int, detail: Any) -> None:
+        """
+        Error reply from the receive loop. Never waits: blocking there on a
+        full or credit-starved queue would stop the loop from reading the
+        client's next credit message, so a reply that does not fit is dropped.
+        """
+        if not self.channels[channel].put_nowait(_envelope(channel, msg_id, "error", status=status_code, detail=detail)):
+            ws_stats.errors_dropped += 1
+
+    async def writer(self) -> None:
+        senders = list(self.channels.values())
+        while True:
+            sent = False
+            for sender in senders:
+                if sender.ready():
+                    await self.websocket.send_text(sender.take())
+                    ws_stats.messages_out += 1
+                    sent = True
+            if not sent:
+                self._wakeup.clear()
+                if not any(sender.ready() for sender in senders):
+                    await self._wakeup.wait()
+
+    # ---------------------- TASKS ----------------------
+    def start(self, channel: str, msg_id: Any, coro) -> None:
+        key = (channel, msg_id)
+        previous = self.tasks.pop(key, None)
+        if previous is not None:
+            previous.cancel()
+        task = asyncio.ensure_future(self._run(channel, msg_id, coro))
+        self.tasks[key] = task
+        task.add_done_callback(lambda t: self.tasks.pop(key, None) if self.tasks.get(key) is t else None)
+
+    def cancel(self, channel: str, msg_id: Any) -> bool:
+        task = self.tasks.pop((channel, msg_id), None)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    async def _run(self, channel: str, msg_id: Any, coro) -> None:
+        try:
+            await coro
+        except HTTPException as e:
+            await self.send(channel, msg_id, "error", status=e.status_code, detail=e.detail)
+        except ValidationError as e:
+            await self.send(channel, msg_id, "error", status=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.errors())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"WebSocket {channel} request {msg_id} failed: {e}", exc_info=True)
+            await self.send(channel, msg_id, "error", status=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+    async def close(self) -> None:
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks.clear()
+
+    # ---------------------- INCOMING ----------------------
+    async def handle_text(self, raw: str) -> None:
+        try:
+            message = json.loads(raw)
+            if not isinstance(message, dict):
+                raise ValueError("expected an object")
+        except ValueError as e:
+            self.reply_error("chat", None, status.HTTP_400_BAD_REQUEST, f"Invalid message: {e}")
+            return
+        channel = message.get("channel")
+        msg_id = message.get("id")
+        msg_type = message.get("type", "request")
+
+        # Flow control: {"type": "flow", "channel", "window": N} turns credits on (null turns them off),
+        # {"type": "credit", "channel", "n": k} lets k more messages through
+        if msg_type in ("flow", "credit") and channel in self.channels:
+            sender = self.channels[channel]
+            field = "window" if msg_type == "flow" else "n"
+            value = message.get(field, None if msg_type == "flow" else 1)
+            try:
+                count = _count(value) if value is not None else None
+            except ValueError:
+                self.reply_error(channel, msg_id, status.HTTP_400_BAD_REQUEST,
+                                 f"'{field}' must be a non-negative integer.")
+                return
+            if msg_type == "flow":
+                sender.set_window(count)
+            else:
+                sender.grant(count or 0)
+            return
+        if msg_type == "cancel" and channel in self.channels:
+            if channel == "voice" and self._voice is not None and self._voice["id"] == msg_id:
+                self._voice = None
+            self.cancel(channel, msg_id)
+            return
+
+        if channel == "chat" and msg_type == "request":
+            self.start("chat", msg_id, self.chat(msg_id, message))
+        elif channel == "emotion" and msg_type == "subscribe":
+            self.start("emotion", msg_id, self.emotion_updates(msg_id))
+        elif channel == "emotion" and msg_type == "unsubscribe":
+            self.cancel("emotion", msg_id)
+        elif channel == "tts" and msg_type == "request":
+            self.start("tts", msg_id, self.tts(msg_id, message))
+        elif channel == "voice" and msg_type == "start":
+            self._voice = {"id": msg_id, "filename": message.get("filename") or "audio.webm", "data": bytearray()}
+        elif channel == "voice" and msg_type == "end":
+            self.finish_voice(msg_id)
+        else:
+            target = channel if channel in self.channels else "chat"
+            self.reply_error(target, msg_id, status.HTTP_400_BAD_REQUEST,
+                             f"Unsupported message type '{msg_type}' on channel '{channel}'.")
+
+    async def handle_bytes(self, data: bytes) -> None:
+        """Binary frames are chunks of the voice upload opened by the last voice "start"."""
+        upload = self._voice
+        if upload is None:
+            self.reply_error("voice", None, status.HTTP_400_BAD_REQUEST, "No voice upload in progress.")
+            return
+        upload["data"].extend(data)
+        if len(upload["data"]) > WS_MAX_VOICE_BYTES:
+            self._voice = None
+            self.reply_error("voice", upload["id"], status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                             f"Voice upload exceeds {WS_MAX_VOICE_BYTES} bytes.")
+
+    # ---------------------- CHANNELS ----------------------
+    async def chat(self, msg_id: Any, message: Dict[str, Any]) -> None:
+        """Same turn handling as POST /api/chat; streamed replies reuse the shared, pre-encoded frames."""
+        data = ChatRequest(**message)
+        turn = await prepare_turn(data, self.user_key)
+        if not data.stream:
+            await self.send("chat", msg_id, "reply", **await complete_turn(turn))
+            return
+
+        cached = completion_cache.get(turn.cache_key)
+        if cached is not None:
+            turn.record_turn(cached.text)
+            frames = coalesce_events(replay_cached_stream(cached.text, data.emotion, cached.provider))
+            await self.send("chat", msg_id, "start", prompt_tokens=turn.context.prompt_tokens, cached=True)
+        else:
+            flight = await open_chat_stream(turn)
+            frames = flight.subscribe()
+            await self.send("chat", msg_id, "start", prompt_tokens=turn.context.prompt_tokens, generation=flight.generation)
+
+        # Frames are "data: <json>\n\n"; splice the JSON in as-is instead of decoding it again
+        prefix = _envelope("chat", msg_id, "event", event=None)[:-len("null}")]
+        sender = self.channels["chat"]
+        try:
+            async for frame in frames:
+                if frame.startswith("data: "):
+                    await sender.put(prefix + frame[6:-2] + "}")
+        finally:
+            await frames.aclose()
+
+    async def emotion_updates(self, msg_id: Any) -> None:
+        """Pushes this user's latest detected emotion on each significant change (no polling)."""
+        updates = emotion_sessions.updates(self.user_key, EMOTION_STREAM_KEEPALIVE)
+        try:
+            async for current in updates:
+                if current is not None:  # Keepalives are not needed on a WebSocket
+                    await self.send("emotion", msg_id, "emotion", **current)
+        finally:
+            await updates.aclose()
+
+    async def tts(self, msg_id: Any, message: Dict[str, Any]) -> None:
+        audio = await synthesize_speech(TTSRequest(**message), self.user_key)
+        chunks = 0
+        for offset in range(0, len(audio), WS_TTS_CHUNK_BYTES):
+            chunk = base64.b64encode(audio[offset:offset + WS_TTS_CHUNK_BYTES]).decode("ascii")
+            await self.send("tts", msg_id, "audio", seq=chunks, data=chunk)
+            chunks += 1
+        await self.send("tts", msg_id, "end", media_type="audio/mpeg", bytes=len(audio), chunks=chunks)
+
+    def finish_voice(self, msg_id: Any) -> None:
+        upload = self._voice
+        if upload is None or upload["id"] != msg_id:
+            self.start("voice", msg_id, self._raise(HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="No matching voice upload in progress.")))
+            return
+        self._voice = None
+        self.start("voice", msg_id, self.transcribe(msg_id, bytes(upload["data"]), upload["filename"]))
+
+    async def transcribe(self, msg_id: Any, audio: bytes, filename: str) -> None:
+        result = await transcribe_audio(audio, filename, http_pools.get("huggingface"), self.user_key)
+        await self.send("voice", msg_id, "transcript", **result)
+
+    @staticmethod
+    async def _raise(error: Exception) -> None:
+        raise error
+
+
+def _user_key(websocket: WebSocket, user: Any) -> str:
+    """Who a socket's usage and emotion session belong to, keyed like the HTTP routes (deps.usage_key)."""
+    client = websocket.client.host if websocket.client else "unknown"
+    return f"user:{user.id}" if user is not None else f"ip:{client}"
+
+
+async def _authenticate(ticket: Optional[str]) -> Any:
+    if not ticket:
+        return None
+    async with AsyncSessionLocal() as db:
+        return await get_user_from_ticket(ticket, db)
+
+
+def _refused(user: Any, ticket: Optional[str]) -> bool:
+    # A ticket that does not redeem is refused even where anonymous sockets are allowed,
+    # so the client fetches a fresh one instead of silently running unauthenticated
+    return user is None and (WS_REQUIRE_AUTH or bool(ticket))
+
+
+@router.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket, ticket: Optional[str] = None):
+    """
+    One connection for chat streaming, emotion updates, TTS audio and voice
+    upload. Authenticate with `?ticket=<ticket>` from POST /api/auth/ticket
+    (browsers cannot set headers on WebSocket requests, and the JWT itself
+    must not end up in URLs). See Connection for the message format.
+    """
+    await websocket.accept()
+    user = await _authenticate(ticket)
+    if _refused(user, ticket):
+        ws_stats.auth_failures += 1
+        logger.info("WebSocket rejected: missing, expired or reused ticket.")
+        await websocket.close(code=WS_CLOSE_UNAUTHORIZED)
+        return
+
+    ws_stats.connections += 1
+    ws_stats.open += 1
+    connection = Connection(websocket, user)
+    writer = asyncio.ensure_future(connection.writer())
+    logger.info("WebSocket connected.")
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            ws_stats.messages_in += 1
+            if message.get("text") is not None:
+                await connection.handle_text(message["text"])
+            elif message.get("bytes") is not None:
+                await connection.handle_bytes(message["bytes"])
+    except Exception as e:
+        logger.warning(f"WebSocket receive loop ended: {e}")
+    finally:
+        writer.cancel()
+        await connection.close()
+        await asyncio.gather(writer, return_exceptions=True)
+        ws_stats.open -= 1
+        logger.info("WebSocket disconnected.")
+
+
+@router.websocket("/ws/emotion")
+async def emotion_frames_endpoint(websocket: WebSocket, ticket: Optional[str] = None, gamma: float = Query(1.2)):
+    """
+    Live emotion detection on the client's own camera. Send each frame as a
+    binary message (JPEG/WebP); results come back as JSON text
+    {"type": "emotion", "seq", "faces", "dominant_emotion", "score",
+    "latency_ms", "dropped"}, where `seq` counts frames sent on this socket.
+    Frames the server cannot keep up with are dropped, never queued; see
+    services.emotion_stream.EmotionStream. Readings also update the user's
+    emotion session (/api/emotion/latest, /api/emotion/stream). Authenticates
+    like /api/ws, with `?ticket=`.
+    """
+    await websocket.accept()
+    user = await _authenticate(ticket)
+    if _refused(user, ticket):
+        ws_stats.auth_failures += 1
+        await websocket.close(code=WS_CLOSE_UNAUTHORIZED)
+        return
+    if stream_stats.open >= EMOTION_STREAM_MAX_CONNECTIONS:
+        logger.warning("Emotion stream rejected: connection limit reached.")
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+
+    send_lock = asyncio.Lock()
+
+    async def send(result: Dict[str, Any]) -> None:
+        # Results (pipeline task) and input errors (receive loop) share the socket
+        async with send_lock:
+            await websocket.send_text(json.dumps(result))
+
+    stream = EmotionStream(send, gamma, session_key=_user_key(websocket, user))
+    worker = asyncio.ensure_future(stream.run())
+    logger.info("Emotion stream connected.")
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            data = message.get("bytes")
+            if data is None:
+                await send({"type": "error", "seq": None, "detail": "Send frames as binary messages."})
+            elif len(data) > EMOTION_FRAME_MAX_BYTES:
+                await send({"type": "error", "seq": None, "detail": f"Frames are limited to {EMOTION_FRAME_MAX_BYTES} bytes."})
+            else:
+                stream.submit(data)
+            if worker.done():
+                if worker.exception() is not None:
+                    logger.warning(f"Emotion stream pipeline failed: {worker.exception()}")
+                break
+    except Exception as e:
+        logger.warning(f"Emotion stream receive loop ended: {e}")
+    finally:
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+        logger.info(f"Emotion stream disconnected ({stream.received} frames, {stream.dropped} dropped).")
@@ -0,0 +1,83 @@
+# backend/services/asr_service.py
+import asyncio
+import logging
+import os
+import time
+from io import BytesIO
+from typing import Any, Dict
+
+import httpx
+from fastapi import HTTPException, status
+
+from backend.utils.admission import llm_admission
+from backend.utils.circuit_breaker import breakers
+from backend.utils.clients import get_groq_client
+from backend.utils.executors import executors
+from backend.utils.context_builder import estimate_tokens
+from backend.services.usage_meter import usage_meter
+
+logger = logging.getLogger("backend.asr")
+
+HUGGINGFACE_API_KEY = os.getenv("HUGGINGFACE_API_KEY")
+TIMEOUT_GROQ = int(os.getenv("TIMEOUT_GROQ", 20))
+HF_WHISPER_URL = "https://api-inference.huggingface.co/models/openai/whisper-large"
+
+
+async def transcribe_audio(
+    audio_content: bytes, filename: str, hf_client: httpx.AsyncClient, user_key: str = "anonymous"
+) -> Dict[str, Any]:
+    """
+    Speech to text: Groq Whisper first, Hugging Face as backup, each skipped
+    while its circuit is open. Groq calls take an "asr" slot from the shared
+    upstream admission budget; when none is free in time, Hugging Face is tried. Shared by POST /api/voice and the WebSocket
+    voice channel. Raises 503 if every provider fails, 429 if `user_key` is
+    over quota; the transcript's tokens are billed to `user_key`.
+    """
+    usage_meter.check(user_key, "voice")
+    result = await _transcribe(audio_content, filename, hf_client)
+    usage_meter.record(user_key, "voice", completion_tokens=estimate_tokens(result["text"]))
+    return result
+
+
+async def _transcribe(audio_content: bytes, filename: str, hf_client: httpx.AsyncClient) -> Dict[str, Any]:
+    groq_breaker = breakers.get("groq.asr", timeout_max=TIMEOUT_GROQ)
+    hf_breaker = breakers.get("huggingface.asr", timeout_max=60)
+    try: # Try Groq ASR (skipped while its circuit is open)
+        client = get_groq_client()
+        if client:
+            # Admitted before the breaker check, so a queued or refused call never holds its trial slot
+            slot = await llm_admission.acquire("asr")
+            try:
+                if groq_breaker.allow():
+                    loop = asyncio.get_event_loop()
+                    started = time.monotonic()
+                    try:
+                        transcription = await loop.run_in_executor(executors.get("io"), lambda: client.audio.transcriptions.create(
+                            file=BytesIO(audio_content), model="whisper-large-v3", timeout=groq_breaker.timeout()))
+                    except Exception:
+                        groq_breaker.record_failure()
+                        raise
+                    groq_breaker.record_success(time.monotonic() - started)
+                    return {"text": transcription.text, "provider": "groq"}
+            finally:
+                slot.release()
+    except Exception as e:
+        logger.error(f"Groq ASR error: {e}")
+    try: # Try Hugging Face ASR
+        if HUGGINGFACE_API_KEY and hf_breaker.allow():
+            headers = {"Authorization": f"Bearer {HUGGINGFACE_API_KEY}"}
+            files = {"file": (filename, audio_content)}
+            started = time.monotonic()
+            try:
+                response = await hf_client.post(HF_WHISPER_URL, headers=headers, files=files, timeout=hf_breaker.timeout())
+                response.raise_for_status()
+            except Exception:
+                hf_breaker.record_failure()
+                raise
+            hf_breaker.record_success(time.monotonic() - started)
+            output = response.json()
+            text = output.get("text", "")
+            return {"text": text, "provider": "huggingface"}
+    except Exception as e:
+        logger.error(f"Hugging Face ASR error: {e}")
+    raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="All ASR providers failed.")
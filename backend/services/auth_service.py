@@ -2,7 +2,12 @@ import bcrypt
 import passlib.hash
 import jwt
 import os
+import time
+import uuid
 from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from backend.config import AUTH_TICKET_SECONDS
 
 JWT_SECRET = os.getenv("JWT_SECRET", "supersecretkey")
 JWT_ALGORITHM = "HS256"
@@ -45,3 +50,51 @@ def create_access_token(user_id: str) -> str:
     expire = datetime.utcnow() + timedelta(days=1)
     payload = {"sub": str(user_id), "exp": expire}
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+
+def decode_access_token(token: str) -> Optional[dict]:
+    """Return the JWT payload, or None if the token is invalid or expired (or is a ticket)."""
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except Exception:
+        return None
+    return None if payload.get("typ") == "ticket" else payload
+
+
+# ---------------- SINGLE-USE TICKETS ----------------
+# Browsers cannot set headers on WebSocket or EventSource requests, so those
+# URLs carry a ticket instead of the JWT: it expires within seconds and is
+# accepted once, so one leaked through an access log or proxy is worthless.
+
+_redeemed_tickets: Dict[str, float] = {}  # jti -> expiry (epoch seconds), kept until it expires
+
+
+def create_ticket(user_id: str) -> str:
+    """A signed ticket for `user_id`, valid for one connection within AUTH_TICKET_SECONDS."""
+    payload = {
+        "sub": str(user_id),
+        "typ": "ticket",
+        "jti": uuid.uuid4().hex,
+        "exp": datetime.utcnow() + timedelta(seconds=AUTH_TICKET_SECONDS),
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+
+def redeem_ticket(ticket: str) -> Optional[dict]:
+    """
+    Return the ticket's payload and mark it used, or None if it is invalid,
+    expired or already used. Used tickets are remembered per process.
+    """
+    try:
+        payload = jwt.decode(ticket, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except Exception:
+        return None
+    if payload.get("typ") != "ticket" or "jti" not in payload:
+        return None
+    now = time.time()
+    for jti in [jti for jti, expires in _redeemed_tickets.items() if expires < now]:
+        del _redeemed_tickets[jti]
+    if payload["jti"] in _redeemed_tickets:
+        return None
+    _redeemed_tickets[payload["jti"]] = payload["exp"]
+    return payload
@@ -0,0 +1,189 @@
+# backend/services/camera_capture.py
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+from backend.config import CAMERA_INDEX, CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_MAX_READ_FAILURES
+from backend.utils.executors import executors
+from backend.utils.metrics import register_collector
+
+logger = logging.getLogger("backend.camera_capture")
+
+
+class Frame(NamedTuple):
+    seq: int                 # Increases by one per captured frame
+    image: np.ndarray        # BGR, shared by all consumers: copy before drawing on it
+    captured_at: float
+
+
+class LatestFrame:
+    """
+    Single-slot buffer holding only the newest frame. The capture thread
+    publishes by replacing one reference and readers take whatever is there,
+    both atomic under the GIL, so neither side ever takes a lock or waits.
+    """
+
+    __slots__ = ("_frame",)
+
+    def __init__(self):
+        self._frame: Optional[Frame] = None
+
+    def publish(self, frame: Frame) -> None:
+        self._frame = frame
+
+    def get(self) -> Optional[Frame]:
+        return self._frame
+
+
+class CaptureDevice:
+    """
+    Reads a cv2.VideoCapture on a dedicated thread, so the blocking
+    `cap.read()` (up to one frame period) never runs on the event loop.
+    Shared by every consumer: the camera opens on the first acquire() and is
+    released after the last release(). Consumers await next_frame(), which
+    returns the newest frame and silently skips any they were too slow for.
+    """
+
+    def __init__(self, index: int = CAMERA_INDEX, width: int = CAMERA_WIDTH, height: int = CAMERA_HEIGHT):
+        self.index = index
+        self.width = width
+        self.height = height
+        self.latest = LatestFrame()
+        self.users = 0
+        self.seq = 0
+        self.read_failures = 0
+        self._captured_at: Deque[float] = deque(maxlen=30)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._opened: Optional[asyncio.Future] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed = asyncio.Event()
+        # Serializes start/restart: two acquires during a shutdown must not both start a thread
+        self._start_lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    # ---------------------- LIFECYCLE ----------------------
+    async def acquire(self) -> bool:
+        """Registers a consumer, opening the camera if needed. False if it cannot be opened."""
+        self.users += 1
+        async with self._start_lock:
+            if not self.running:
+                if self._thread is not None and self._thread.is_alive():
+                    # The previous capture is still shutting down; the device is busy until it has
+                    await executors.run("io", self._thread.join)
+                self._start()
+            starting = self._opened
+        opened = await asyncio.shield(starting)
+        if not opened:
+            self.release()
+        return opened
+
+    def release(self) -> None:
+        self.users = max(0, self.users - 1)
+        if self.users == 0 and self._thread is not None:
+            # The thread notices within one frame and releases the camera itself
+            self._stop.set()
+
+    def _start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stop = threading.Event()
+        self._opened = self._loop.create_future()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._stop, self._opened), name="camera-capture", daemon=True
+        )
+        self._thread.start()
+
+    # ---------------------- CAPTURE THREAD ----------------------
+    def _resolve(self, future: asyncio.Future, opened: bool) -> None:
+        self._loop.call_soon_threadsafe(lambda: future.done() or future.set_result(opened))
+
+    def _notify(self) -> None:
+        # Swap in a fresh event so waiters wake once per frame
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _run(self, stop: threading.Event, opened: asyncio.Future) -> None:
+        cap = None
+        try:
+            cap = cv2.VideoCapture(self.index)
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+            if not cap.isOpened():
+                logger.error(f"⚠️ Webcam {self.index} not accessible.")
+                self._resolve(opened, False)
+                return
+            logger.info("Webcam opened by capture thread.")
+            self._resolve(opened, True)
+            failures = 0
+            while not stop.is_set():
+                ret, image = cap.read()
+                if not ret:
+                    self.read_failures += 1
+                    failures += 1
+                    if failures >= CAMERA_MAX_READ_FAILURES:
+                        logger.error(f"Webcam returned no frame {failures} times in a row; stopping capture.")
+                        break
+                    stop.wait(0.1)  # Avoid busy-looping
+                    continue
+                failures = 0
+                now = time.time()
+                self.seq += 1
+                self.latest.publish(Frame(self.seq, image, now))
+                self._captured_at.append(now)
+                self._loop.call_soon_threadsafe(self._notify)
+        except Exception as e:
+            logger.error(f"Exception in webcam capture thread: {e}", exc_info=True)
+            self._resolve(opened, False)
+        finally:
+            stop.set()
+            if cap is not None:
+                cap.release()
+                logger.info("Webcam released by capture thread.")
+            # Wake consumers so they see the capture has stopped
+            try:
+                self._loop.call_soon_threadsafe(self._notify)
+            except RuntimeError:
+                pass  # Event loop already closed (shutdown)
+
+    # ---------------------- CONSUMERS ----------------------
+    async def next_frame(self, after_seq: int = 0, timeout: float = 1.0) -> Optional[Frame]:
+        """
+        The newest frame with seq > `after_seq`, waiting up to `timeout` seconds
+        for one. None on timeout or when capture has stopped.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            frame = self.latest.get()
+            if frame is not None and frame.seq > after_seq:
+                return frame
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.running:
+                return None
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        times = list(self._captured_at)
+        fps = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+        return {
+            "running": self.running,
+            "users": self.users,
+            "frames_captured": self.seq,
+            "read_failures": self.read_failures,
+            "fps": round(fps, 1),
+        }
+
+
+camera = CaptureDevice()
+register_collector("camera", camera.snapshot)
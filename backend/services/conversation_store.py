@@ -0,0 +1,181 @@
+# backend/services/conversation_store.py
+import asyncio
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy.future import select
+
+from backend.config import (
+    CHAT_SESSION_MAX,
+    CHAT_SESSION_IDLE_TTL,
+    CHAT_SESSION_MAX_MESSAGES,
+    CHAT_SESSION_PERSIST,
+)
+from backend.models.conversation import ChatMessage, ChatSession
+from backend.utils.database import AsyncSessionLocal
+from backend.utils.metrics import register_collector
+
+logger = logging.getLogger("backend.conversation_store")
+
+
+class Conversation:
+    __slots__ = ("session_id", "owner", "messages", "last_used")
+
+    def __init__(self, session_id: str, owner: str, messages: Optional[List[Dict[str, str]]] = None):
+        self.session_id = session_id
+        self.owner = owner  # usage key of the creator; nobody else may read or use the session
+        self.messages: List[Dict[str, str]] = messages or []
+        self.last_used = time.monotonic()
+
+
+class ConversationStore:
+    """
+    Server-side chat history keyed by session id, so clients send only the new
+    message each turn. Sessions live in an LRU with idle expiry; with
+    persistence enabled, sessions and turns are also written to the database
+    and evicted sessions are reloaded from it on their next use. Without
+    persistence an evicted session is gone: requests for it get a 404 and the
+    client creates a new one seeded with its own copy of the history.
+
+    Each session belongs to the caller that created it: lookups with another
+    owner key behave as if the session did not exist.
+    """
+
+    def __init__(self, max_sessions: int, idle_ttl: float, max_messages: int, persist: bool):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_messages = max_messages
+        self.persist = persist
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._pending_writes: Set[asyncio.Task] = set()
+        self.evictions = 0
+        self.lost_turns = 0
+        self.db_loads = 0
+        self.db_write_errors = 0
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        # Oldest entries are at the front; stop at the first one still fresh
+        while self._sessions:
+            session_id, conversation = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - conversation.last_used < self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def _touch(self, conversation: Conversation) -> None:
+        conversation.last_used = time.monotonic()
+        self._sessions.move_to_end(conversation.session_id)
+
+    async def create(self, owner: str, messages: Optional[List[Dict[str, str]]] = None) -> str:
+        """A new session for `owner`, optionally seeded with earlier messages (e.g. to replace an evicted one)."""
+        session_id = secrets.token_urlsafe(16)
+        messages = list(messages or [])[-self.max_messages:]
+        if self.persist:
+            # Written before the id is handed out, so it survives eviction before the first turn
+            async with AsyncSessionLocal() as db:
+                db.add(ChatSession(session_id=session_id, owner=owner))
+                db.add_all([ChatMessage(session_id=session_id, **m) for m in messages])
+                await db.commit()
+        self._sessions[session_id] = Conversation(session_id, owner, messages)
+        self._evict()
+        return session_id
+
+    async def get(self, session_id: str, owner: str) -> Optional[Conversation]:
+        conversation = self._sessions.get(session_id)
+        if conversation is None and self.persist:
+            conversation = await self._load(session_id)
+        if conversation is None or conversation.owner != owner:
+            return None
+        self._touch(conversation)
+        self._evict()
+        return conversation
+
+    def append_turn(self, session_id: str, owner: str, user_message: str, reply: str) -> None:
+        """
+        Records a completed exchange. Safe to call from a stream's completion
+        callback. If the session was evicted meanwhile it is not recreated:
+        with persistence the turn is still written (the next use reloads it),
+        without it the turn is dropped and the session stays gone, so the
+        client's next request gets a 404 instead of a session missing its
+        earlier history.
+        """
+        turn = [{"role": "user", "content": user_message}, {"role": "assistant", "content": reply}]
+        conversation = self._sessions.get(session_id)
+        if conversation is not None:
+            conversation.messages.extend(turn)
+            if len(conversation.messages) > self.max_messages:
+                del conversation.messages[:len(conversation.messages) - self.max_messages]
+            self._touch(conversation)
+        elif not self.persist:
+            self.lost_turns += 1
+            logger.info(f"Chat session {session_id[:8]} was evicted before its turn completed; turn dropped.")
+            return
+        if self.persist:
+            task = asyncio.ensure_future(self._save(session_id, turn))
+            self._pending_writes.add(task)
+            task.add_done_callback(self._pending_writes.discard)
+
+    async def delete(self, session_id: str, owner: str) -> bool:
+        if await self.get(session_id, owner) is None:
+            return False
+        self._sessions.pop(session_id, None)
+        if self.persist:
+            async with AsyncSessionLocal() as db:
+                await db.execute(ChatMessage.__table__.delete().where(ChatMessage.session_id == session_id))
+                await db.execute(ChatSession.__table__.delete().where(ChatSession.session_id == session_id))
+                await db.commit()
+        return True
+
+    async def _load(self, session_id: str) -> Optional[Conversation]:
+        async with AsyncSessionLocal() as db:
+            session = await db.get(ChatSession, session_id)
+            if session is None:
+                return None
+            q = await db.execute(
+                select(ChatMessage)
+                .filter_by(session_id=session_id)
+                .order_by(ChatMessage.id.desc())
+                .limit(self.max_messages)
+            )
+            rows = list(reversed(q.scalars().all()))
+        self.db_loads += 1
+        conversation = Conversation(session_id, session.owner, [{"role": r.role, "content": r.content} for r in rows])
+        self._sessions[session_id] = conversation
+        return conversation
+
+    async def _save(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                db.add_all([ChatMessage(session_id=session_id, **m) for m in messages])
+                await db.commit()
+        except Exception as e:
+            self.db_write_errors += 1
+            logger.error(f"Failed to persist chat turn for session {session_id[:8]}: {e}")
+
+    async def flush(self) -> None:
+        """Waits for pending database writes (called on shutdown)."""
+        if self._pending_writes:
+            await asyncio.gather(*list(self._pending_writes), return_exceptions=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "messages": sum(len(c.messages) for c in self._sessions.values()),
+            "evictions": self.evictions,
+            "lost_turns": self.lost_turns,
+            "persist": self.persist,
+            "db_loads": self.db_loads,
+            "pending_writes": len(self._pending_writes),
+            "db_write_errors": self.db_write_errors,
+        }
+
+
+conversation_store = ConversationStore(
+    CHAT_SESSION_MAX, CHAT_SESSION_IDLE_TTL, CHAT_SESSION_MAX_MESSAGES, CHAT_SESSION_PERSIST
+)
+register_collector("chat_sessions", conversation_store.snapshot)
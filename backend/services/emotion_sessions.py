@@ -0,0 +1,300 @@
+# backend/services/emotion_sessions.py
+import asyncio
+import logging
+import sys
+import time
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Callable, Coroutine, Dict, List, Optional
+
+import numpy as np
+
+from backend.config import (
+    EMOTION_SESSION_MAX,
+    EMOTION_SESSION_IDLE_SECONDS,
+    EMOTION_SESSION_SWEEP_INTERVAL,
+    EMOTION_STREAM_SCORE_DELTA,
+    FACE_TRACKING_ENABLED,
+)
+from backend.services.face_services import FaceTracker
+from backend.utils.metrics import register_collector
+
+logger = logging.getLogger("backend.emotion_sessions")
+
+CACHE_TIMEOUT = 10  # Seconds before a reading is considered stale
+SMOOTHING_WINDOW = 5
+
+
+def _sizeof(obj: Any) -> int:
+    """Approximate bytes owned by `obj`: containers recursively, numpy arrays by their buffer."""
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj) + (obj.nbytes if obj.base is None else 0)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_sizeof(k) + _sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, deque, set)):
+        size += sum(_sizeof(item) for item in obj)
+    return size
+
+
+class EmotionSession:
+    """
+    Emotion state for one user (or anonymous client): the latest reading, its
+    own smoothing window and face tracker, and the handle of its detection
+    task. Nothing here is shared between sessions.
+    """
+
+    def __init__(self, key: str, on_change: Optional[Callable[[str], None]] = None):
+        self.key = key
+        self.dominant_emotion = "neutral"
+        self.score = 0.0
+        self.timestamp = 0.0   # Wall time of the last reading
+        self.frames_at = 0.0   # Wall time of the last reading from a frame the client captured
+        self._active = False   # Whether webcam detection is supposed to be running
+        # Called with the key when the reading changes enough to push to subscribers
+        self.on_change = on_change
+        self._pushed_score = 0.0
+        self.smoothing: deque = deque(maxlen=SMOOTHING_WINDOW)
+        self.tracker: Optional[FaceTracker] = None
+        self.task: Optional[asyncio.Task] = None
+        self.stop_event = asyncio.Event()
+        self.last_seen = time.monotonic()
+
+    @property
+    def active(self) -> bool:
+        return self._active
+
+    @active.setter
+    def active(self, value: bool) -> None:
+        if value != self._active:
+            self._active = value
+            self._changed()
+
+    @property
+    def receiving_frames(self) -> bool:
+        """Whether the client's own camera frames (uploads, /api/ws/emotion) are producing readings."""
+        return time.time() - self.frames_at <= CACHE_TIMEOUT
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def touch(self) -> None:
+        self.last_seen = time.monotonic()
+
+    def new_tracker(self) -> Optional[FaceTracker]:
+        """A fresh tracker for a new detection run (None when tracking is disabled)."""
+        self.smoothing.clear()
+        self.tracker = FaceTracker(smoothing=self.smoothing) if FACE_TRACKING_ENABLED else None
+        return self.tracker
+
+    # ---------------------- READINGS ----------------------
+    def _changed(self) -> None:
+        self._pushed_score = self.score
+        if self.on_change is not None:
+            self.on_change(self.key)
+
+    def _set_reading(self, emotion: str, score: float) -> None:
+        # Push only a new dominant emotion or a score move past the threshold, not every frame's jitter
+        significant = emotion != self.dominant_emotion or abs(score - self._pushed_score) >= EMOTION_STREAM_SCORE_DELTA
+        self.dominant_emotion, self.score = emotion, score
+        if significant:
+            self._changed()
+
+    def record(self, faces: List[Dict[str, Any]]) -> None:
+        """Stores the best face of a detection (faces already smoothed with self.smoothing)."""
+        self.timestamp = time.time()
+        if faces:
+            best_face = max(faces, key=lambda f: f.get("score", 0))
+            self._set_reading(best_face.get("dominant_emotion", "neutral"), best_face.get("score", 0.0))
+
+    def record_frame(self, faces: List[Dict[str, Any]]) -> None:
+        """Stores the reading of a frame captured by the client; it stays live while frames keep coming."""
+        was_receiving = self.receiving_frames
+        self.frames_at = time.time()
+        self.record(faces)
+        if not was_receiving:
+            self._changed()  # latest() turns active even if the reading itself did not move
+
+    def reset_reading(self) -> None:
+        self.timestamp = time.time()
+        self._set_reading("neutral", 0.0)
+
+    def latest(self) -> Dict[str, Any]:
+        """The reading as served by /api/emotion/latest: neutral while inactive or stale."""
+        is_stale = (time.time() - self.timestamp) > CACHE_TIMEOUT
+        active = self.active or self.receiving_frames
+        if not active or is_stale:
+            return {"dominant_emotion": "neutral", "score": 0.0, "active": active, "stale": is_stale}
+        return {"dominant_emotion": self.dominant_emotion, "score": self.score, "active": True, "stale": False}
+
+    # ---------------------- DETECTION TASK ----------------------
+    def start(self, coro: Coroutine) -> None:
+        self.stop_event.clear()
+        self.task = asyncio.create_task(coro)
+
+    def stop(self) -> None:
+        """Signals the detection task to stop; it releases the camera itself."""
+        self.stop_event.set()
+        self.active = False
+
+    def nbytes(self) -> int:
+        """Measured memory held by this session's own state."""
+        size = _sizeof(self) + _sizeof(self.__dict__) - _sizeof(self.key)
+        if self.tracker is not None:
+            # The tracker smooths into self.smoothing, already counted above
+            size += _sizeof({k: v for k, v in self.tracker.__dict__.items() if v is not self.smoothing})
+        return size
+
+
+class EmotionSessionRegistry:
+    """
+    Bounded map of key -> EmotionSession in least-recently-used order. A
+    session unused by its client for `idle_seconds` is evicted, stopping its
+    detection task, so a client that disappears without calling stop does
+    not hold the camera forever. Past `max_sessions` the least recently used
+    session goes first.
+
+    Also an in-process pub/sub for /api/emotion/stream: sessions report
+    significant changes to `publish`, which wakes that key's subscribers
+    through one shared asyncio.Event. An idle subscriber is just a suspended
+    coroutine, so thousands of them cost no CPU between changes.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = EMOTION_SESSION_MAX,
+        idle_seconds: float = EMOTION_SESSION_IDLE_SECONDS,
+        sweep_interval: float = EMOTION_SESSION_SWEEP_INTERVAL,
+    ):
+        self.max_sessions = max(1, max_sessions)
+        self.idle_seconds = idle_seconds
+        self.sweep_interval = sweep_interval
+        self._sessions: "OrderedDict[str, EmotionSession]" = OrderedDict()
+        self._sweeper: Optional[asyncio.Task] = None
+        # key -> Event set on the next change, only for keys someone subscribes to
+        self._changed: Dict[str, asyncio.Event] = {}
+        self._subscribers: Dict[str, int] = {}
+        self.created = 0
+        self.evicted = 0
+        self.published = 0
+
+    def get(self, key: str) -> EmotionSession:
+        """The session for `key`, created if needed. Counts as client activity."""
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = EmotionSession(key, on_change=self.publish)
+            self.created += 1
+        self._sessions.move_to_end(key)
+        session.touch()
+        self.sweep()
+        return session
+
+    def find(self, key: str) -> Optional[EmotionSession]:
+        session = self._sessions.get(key)
+        if session is not None:
+            self._sessions.move_to_end(key)
+            session.touch()
+        return session
+
+    def latest(self, key: str) -> Dict[str, Any]:
+        session = self.find(key)
+        if session is None:
+            return {"dominant_emotion": "neutral", "score": 0.0, "active": False, "stale": True}
+        return session.latest()
+
+    def any_active(self) -> bool:
+        """Whether any session is running webcam detection (camera-level state, safe to show everyone)."""
+        return any(s.active for s in self._sessions.values())
+
+    # ---------------------- PUB/SUB ----------------------
+    def publish(self, key: str) -> None:
+        changed = self._changed.pop(key, None)
+        if changed is not None:
+            self.published += 1
+            changed.set()
+
+    async def updates(self, key: str, keepalive: float) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        The reading for `key` now and after every significant change. Yields
+        None after `keepalive` quiet seconds (the caller sends a keepalive);
+        that is also when a reading going stale is noticed. Subscribing
+        counts as client activity, so the session is not evicted as idle.
+        """
+        self._subscribers[key] = self._subscribers.get(key, 0) + 1
+        last = None
+        try:
+            while True:
+                changed = self._changed.setdefault(key, asyncio.Event())
+                current = self.latest(key)
+                if current != last:
+                    last = current
+                    yield current
+                    continue  # Re-check: the reading may have moved while this one was being sent
+                try:
+                    await asyncio.wait_for(changed.wait(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._subscribers[key] -= 1
+            if not self._subscribers[key]:
+                del self._subscribers[key]
+                self._changed.pop(key, None)
+
+    # ---------------------- EVICTION ----------------------
+    def _evict(self, key: str) -> None:
+        session = self._sessions.pop(key)
+        session.stop()
+        self.evicted += 1
+
+    def sweep(self) -> None:
+        # Oldest first: the first session that is not idle ends the scan
+        now = time.monotonic()
+        idle = []
+        for key, session in self._sessions.items():
+            if now - session.last_seen < self.idle_seconds:
+                break
+            idle.append(key)
+        for key in idle:
+            logger.info(f"Evicting idle emotion session {key}.")
+            self._evict(key)
+        while len(self._sessions) > self.max_sessions:
+            self._evict(next(iter(self._sessions)))
+
+    def start(self) -> None:
+        if self._sweeper is None:
+            self._sweeper = asyncio.ensure_future(self._sweep_loop())
+
+    async def stop(self) -> None:
+        """Stops the sweeper and every session's detection task (called on shutdown)."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        tasks = [s.task for s in self._sessions.values() if s.running]
+        for session in self._sessions.values():
+            session.stop()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.sweep()
+
+    def snapshot(self) -> Dict[str, Any]:
+        sizes = [s.nbytes() for s in self._sessions.values()]
+        return {
+            "sessions": len(sizes),
+            "running": sum(s.running for s in self._sessions.values()),
+            "created": self.created,
+            "evicted": self.evicted,
+            "max_sessions": self.max_sessions,
+            "subscribers": sum(self._subscribers.values()),
+            "published": self.published,
+            "bytes_total": sum(sizes),
+            "bytes_per_session_avg": round(sum(sizes) / len(sizes)) if sizes else 0,
+            "bytes_per_session_max": max(sizes, default=0),
+        }
+
+
+emotion_sessions = EmotionSessionRegistry()
+register_collector("emotion_sessions", emotion_sessions.snapshot)
@@ -0,0 +1,138 @@
+# backend/services/emotion_stream.py
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from backend.config import FACE_TRACKING_ENABLED
+from backend.services.emotion_sessions import emotion_sessions
+from backend.services.face_services import FaceTracker, FrameDecoder, scale_boxes
+from backend.services.face_workers import detect_emotions, track_emotions
+from backend.utils.executors import executors
+from backend.utils.metrics import register_collector
+
+logger = logging.getLogger("backend.emotion_stream")
+
+
+class _StreamStats:
+    def __init__(self):
+        self.streams = 0
+        self.open = 0
+        self.frames_in = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.decode_errors = 0
+        self.processing_seconds = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        processed = self.frames_processed
+        return {
+            "streams": self.streams,
+            "open": self.open,
+            "frames_in": self.frames_in,
+            "frames_processed": processed,
+            "frames_dropped": self.frames_dropped,
+            "decode_errors": self.decode_errors,
+            "avg_processing_ms": round(1000 * self.processing_seconds / processed, 1) if processed else 0.0,
+        }
+
+
+stream_stats = _StreamStats()
+register_collector("emotion_stream", stream_stats.snapshot)
+
+
+class EmotionStream:
+    """
+    Per-connection pipeline for a browser camera: decode -> detect -> smooth
+    on the shared vision pool (detection on worker processes with the
+    "process" FACE_ANALYSIS_BACKEND), with results handed to `send`.
+
+    Only one frame is processed at a time and only one waits behind it: a
+    frame that arrives while another is waiting replaces it (counted as
+    dropped), so a connection never holds more than two frames and results
+    always describe the newest frame the server could get to. A slow client
+    stalls its own `send`, which only makes more of its frames get dropped.
+
+    With a `session_key`, every reading is also stored in that user's
+    EmotionSession, so /api/emotion/latest and /api/emotion/stream follow it.
+    """
+
+    def __init__(self, send: Callable[[Dict[str, Any]], Awaitable[None]], gamma: float = 1.2, session_key: Optional[str] = None):
+        self.send = send
+        self.gamma = gamma
+        self.session_key = session_key
+        self.decoder = FrameDecoder()
+        # Both hold per-stream state and are only touched by the one in-flight task
+        self.tracker = FaceTracker() if FACE_TRACKING_ENABLED else None
+        self.smoothing: deque = deque(maxlen=5)
+        self.received = 0
+        self.dropped = 0
+        self._pending: Optional[Tuple[int, bytes, float]] = None
+        self._ready = asyncio.Event()
+
+    def submit(self, data: bytes) -> int:
+        """Queues a frame for analysis, replacing any still waiting. Returns its sequence number."""
+        self.received += 1
+        stream_stats.frames_in += 1
+        if self._pending is not None:
+            self.dropped += 1
+            stream_stats.frames_dropped += 1
+        self._pending = (self.received, data, time.monotonic())
+        self._ready.set()
+        return self.received
+
+    async def _analyze(self, data: bytes) -> Optional[Dict[str, Any]]:
+        image, factor = await executors.run("vision", self.decoder.decode, data)
+        if image is None:
+            return None
+        # Vision pool or worker processes, per FACE_ANALYSIS_BACKEND
+        if self.tracker is not None:
+            faces = await track_emotions(self.tracker, image, self.gamma)
+        else:
+            faces = await detect_emotions(image, self.gamma, self.smoothing)
+        return {"faces": scale_boxes(faces, factor)}
+
+    async def run(self) -> None:
+        """Processes frames until cancelled."""
+        stream_stats.streams += 1
+        stream_stats.open += 1
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                seq, data, received_at = self._pending
+                self._pending = None
+
+                started = time.monotonic()
+                try:
+                    result = await self._analyze(data)
+                except Exception as e:
+                    # e.g. a face worker crashed on this frame; the stream carries on with the next
+                    logger.warning(f"Emotion stream frame {seq} failed: {e}")
+                    await self.send({"type": "error", "seq": seq, "detail": "Frame analysis failed."})
+                    continue
+                finally:
+                    stream_stats.processing_seconds += time.monotonic() - started
+                if result is None:
+                    stream_stats.decode_errors += 1
+                    await self.send({"type": "error", "seq": seq, "detail": "Could not decode image."})
+                    continue
+                stream_stats.frames_processed += 1
+
+                faces = result["faces"]
+                if self.session_key is not None:
+                    # Looked up per frame: counts as activity, and survives the session being evicted
+                    emotion_sessions.get(self.session_key).record_frame(faces)
+                best_face = max(faces, key=lambda f: f.get("score", 0)) if faces else {}
+                await self.send({
+                    "type": "emotion",
+                    "seq": seq,
+                    "faces": faces,
+                    "dominant_emotion": best_face.get("dominant_emotion", "neutral"),
+                    "score": best_face.get("score", 0.0),
+                    "latency_ms": round(1000 * (time.monotonic() - received_at), 1),
+                    "dropped": self.dropped,
+                })
+        finally:
+            stream_stats.open -= 1
@@ -2,10 +2,18 @@
 import logging
 import cv2
 import numpy as np
-from typing import Any, List, Dict
+from typing import Any, List, Dict, Optional, Tuple
 from collections import deque
+from functools import lru_cache
 import os
 
+from backend.config import (
+    FACE_REDETECT_EVERY,
+    FACE_TRACK_MIN_CONFIDENCE,
+    FACE_ROI_PADDING,
+    FACE_TRACK_SEARCH_MARGIN,
+)
+
 logging.getLogger("moviepy").setLevel(logging.ERROR)
 
 # Paths to cascades (assumes OpenCV/ folder at repo root)
@@ -22,8 +30,8 @@ eye_cascade = cv2.CascadeClassifier(EYE_CASCADE_PATH)
 FRAME_WIDTH = 320
 FRAME_HEIGHT = 240
 
-# Maintain short-term emotion smoothing
-emotion_buffer = deque(maxlen=5)
+# (x, y, w, h)
+Box = Tuple[int, int, int, int]
 
 def enhance_image(frame: np.ndarray[Any, Any], gamma: float = 1.2) -> np.ndarray[Any, Any]:
     """Enhance brightness and contrast for better detection."""
@@ -40,104 +48,300 @@ def enhance_image(frame: np.ndarray[Any, Any], gamma: float = 1.2) -> np.ndarray
     frame = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
     frame = cv2.bilateralFilter(frame, d=5, sigmaColor=75, sigmaSpace=75)
 
-    inv_gamma = 1.0 / gamma
-    table = np.array([((i / 255.0) ** inv_gamma) * 255
-                      for i in np.arange(256)]).astype("uint8")
-    return cv2.LUT(frame, table)
+    return cv2.LUT(frame, _gamma_table(gamma))
 
 
-def detect_emotions_from_array(
-    frame: np.ndarray[Any, Any],
-    gamma: float = 1.2,
-    skip_frames: int = 2
-) -> List[Dict[str, Any]]:
-    """
-    Lightweight heuristic emotion detection using Haar cascades:
-    - detects faces and eyes
-    - heuristics: eyes present -> neutral/alert; no eyes/closed -> tired; large mouth opening could map to surprised (optional)
-    """
-    if frame is None or frame.size == 0:
-        return []
+@lru_cache(maxsize=32)
+def _gamma_table(gamma: float) -> np.ndarray[Any, Any]:
+    # Built once per gamma value instead of once per frame
+    inv_gamma = 1.0 / gamma
+    return np.array([((i / 255.0) ** inv_gamma) * 255
+                     for i in np.arange(256)]).astype("uint8")
 
-    # Resize and convert
+
+def _prepare(frame: np.ndarray[Any, Any], gamma: float) -> np.ndarray[Any, Any]:
+    """Resizes to the working size, enhances, and returns the grayscale image."""
     small = cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT))
     if small.dtype != np.uint8:
         small = (small * 255).astype(np.uint8) if small.max() <= 1.0 else small.astype(np.uint8)
 
     enhanced = enhance_image(small, gamma=gamma)
-    gray = cv2.cvtColor(enhanced, cv2.COLOR_BGR2GRAY)
+    return cv2.cvtColor(enhanced, cv2.COLOR_BGR2GRAY)
+
 
-    faces_rects = face_cascade.detectMultiScale(gray, scaleFactor=1.08, minNeighbors=5, minSize=(40, 40))
+def _detect_faces(gray: np.ndarray[Any, Any]) -> List[Box]:
+    return [tuple(int(v) for v in r) for r in face_cascade.detectMultiScale(gray, scaleFactor=1.08, minNeighbors=5, minSize=(40, 40))]
 
-    faces = []
-    detected_emotions_this_frame = []
 
-    for (x, y, w, h) in faces_rects:
-        roi_gray = gray[y:y+h, x:x+w]
-        roi_color = enhanced[y:y+h, x:x+w]
+def _analyze_face(gray: np.ndarray[Any, Any], frame_shape: Tuple[int, ...], box: Box) -> Dict[str, Any]:
+    """Eye/mouth heuristics for one face box (working-size coords); the result box is in frame coords."""
+    x, y, w, h = box
+    roi_gray = gray[y:y+h, x:x+w]
 
-        # detect eyes inside face roi
-        eyes = eye_cascade.detectMultiScale(roi_gray, scaleFactor=1.1, minNeighbors=3, minSize=(8,8))
-        eyes_count = len(eyes)
+    # detect eyes inside face roi
+    eyes = eye_cascade.detectMultiScale(roi_gray, scaleFactor=1.1, minNeighbors=3, minSize=(8,8))
+    eyes_count = len(eyes)
 
-        # Basic mouth openness heuristic (optional): use simple contour area on lower half
+    # Basic mouth openness heuristic (optional): use simple contour area on lower half
+    mouth_score = 0.0
+    try:
+        lower_half = roi_gray[int(h*0.5):h, :]
+        _, thresh = cv2.threshold(lower_half, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if contours:
+            max_area = max((cv2.contourArea(c) for c in contours), default=0)
+            mouth_score = float(max_area) / (w * h + 1e-6)
+    except Exception:
         mouth_score = 0.0
-        try:
-            lower_half = roi_gray[int(h*0.5):h, :]
-            _, thresh = cv2.threshold(lower_half, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            if contours:
-                max_area = max((cv2.contourArea(c) for c in contours), default=0)
-                mouth_score = float(max_area) / (w * h + 1e-6)
-        except Exception:
-            mouth_score = 0.0
-
-        # Heuristic to map to emotion
-        if eyes_count == 0:
-            dominant = "tired_or_eyes_closed"
-            score = 0.6
+
+    # Heuristic to map to emotion
+    if eyes_count == 0:
+        dominant = "tired_or_eyes_closed"
+        score = 0.6
+    else:
+        # if mouth large -> surprised
+        if mouth_score > 0.03:
+            dominant = "surprised"
+            score = min(0.9, 0.5 + mouth_score)
         else:
-            # if mouth large -> surprised
-            if mouth_score > 0.03:
-                dominant = "surprised"
-                score = min(0.9, 0.5 + mouth_score)
-            else:
-                dominant = "neutral"
-                score = 0.7 if eyes_count >= 2 else 0.6
-
-        # scale bbox back to original frame size
-        orig_w = frame.shape[1]
-        orig_h = frame.shape[0]
-        sx = int(x * orig_w / FRAME_WIDTH)
-        sy = int(y * orig_h / FRAME_HEIGHT)
-        sw = int(w * orig_w / FRAME_WIDTH)
-        sh = int(h * orig_h / FRAME_HEIGHT)
-
-        detected_emotions_this_frame.append(dominant)
-        faces.append({
-            "box": (sx, sy, sw, sh),
-            "dominant_emotion": dominant,
-            "score": round(float(score), 2),
-            "eyes_detected": int(eyes_count),
-            "mouth_score": round(float(mouth_score), 4)
-        })
+            dominant = "neutral"
+            score = 0.7 if eyes_count >= 2 else 0.6
 
-    # smoothing
-    if detected_emotions_this_frame:
-        primary = faces[0]["dominant_emotion"] if faces else "neutral"
-        emotion_buffer.append(primary)
-        if len(emotion_buffer) >= 3:
+    # scale bbox back to original frame size
+    orig_w = frame_shape[1]
+    orig_h = frame_shape[0]
+    sx = int(x * orig_w / FRAME_WIDTH)
+    sy = int(y * orig_h / FRAME_HEIGHT)
+    sw = int(w * orig_w / FRAME_WIDTH)
+    sh = int(h * orig_h / FRAME_HEIGHT)
+
+    return {
+        "box": (sx, sy, sw, sh),
+        "dominant_emotion": dominant,
+        "score": round(float(score), 2),
+        "eyes_detected": int(eyes_count),
+        "mouth_score": round(float(mouth_score), 4)
+    }
+
+
+def smooth_faces(faces: List[Dict[str, Any]], buffer: deque) -> None:
+    """Relabels faces with the most common recent emotion in `buffer` (updated in place)."""
+    if faces:
+        primary = faces[0]["dominant_emotion"]
+        buffer.append(primary)
+        if len(buffer) >= 3:
             try:
-                most_common = max(set(emotion_buffer), key=list(emotion_buffer).count)
+                most_common = max(set(buffer), key=list(buffer).count)
                 for face in faces:
                     face["dominant_emotion"] = most_common
             except Exception:
                 pass
 
+
+def detect_emotions_from_array(
+    frame: np.ndarray[Any, Any],
+    gamma: float = 1.2,
+    skip_frames: int = 2,
+    smoothing: Optional[deque] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Lightweight heuristic emotion detection using Haar cascades:
+    - detects faces and eyes
+    - heuristics: eyes present -> neutral/alert; no eyes/closed -> tired; large mouth opening could map to surprised (optional)
+    `smoothing` is the caller's recent-emotion buffer (one per stream or session); None skips smoothing.
+    """
+    faces = analyze_faces(frame, gamma)
+
+    # smoothing
+    if smoothing is not None:
+        smooth_faces(faces, smoothing)
     return faces
 
 
+def analyze_faces(frame: np.ndarray[Any, Any], gamma: float = 1.2) -> List[Dict[str, Any]]:
+    """detect_emotions_from_array without smoothing: depends on this frame only."""
+    if frame is None or frame.size == 0:
+        return []
+    gray = _prepare(frame, gamma)
+    return analyze_boxes(gray, frame.shape, _detect_faces(gray))
+
+
+def analyze_boxes(gray: np.ndarray[Any, Any], frame_shape: Tuple[int, ...], boxes: List[Box]) -> List[Dict[str, Any]]:
+    """Per-face analysis of boxes already found on the prepared (working-size, grayscale) frame."""
+    return [_analyze_face(gray, frame_shape, box) for box in boxes]
+
+
+def _pad_box(box: Box, padding: float, limit_w: int = FRAME_WIDTH, limit_h: int = FRAME_HEIGHT) -> Box:
+    x, y, w, h = box
+    px, py = int(w * padding), int(h * padding)
+    x0, y0 = max(0, x - px), max(0, y - py)
+    x1, y1 = min(limit_w, x + w + px), min(limit_h, y + h + py)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+class FaceTracker:
+    """
+    Detect-then-track for one video stream. The full Haar scan runs every
+    `redetect_every` frames, or as soon as tracking confidence drops; frames
+    in between follow each face by template matching in a small window
+    around its last box. Re-detection first searches a padded ROI around the
+    previous boxes and only scans the whole frame if the face is not there.
+    Not thread-safe: use one tracker per stream, called from one thread at a time.
+    """
+
+    def __init__(
+        self,
+        redetect_every: int = FACE_REDETECT_EVERY,
+        min_confidence: float = FACE_TRACK_MIN_CONFIDENCE,
+        roi_padding: float = FACE_ROI_PADDING,
+        search_margin: float = FACE_TRACK_SEARCH_MARGIN,
+        smoothing: Optional[deque] = None,
+    ):
+        self.redetect_every = max(1, redetect_every)
+        self.min_confidence = min_confidence
+        self.roi_padding = roi_padding
+        self.search_margin = search_margin
+        self.boxes: List[Box] = []
+        self.templates: List[np.ndarray[Any, Any]] = []
+        self.frames_since_detect = 0
+        self.emotion_buffer: deque = smoothing if smoothing is not None else deque(maxlen=5)
+        self.stats = {"full_detections": 0, "roi_detections": 0, "tracked_frames": 0, "track_losses": 0}
+
+    def reset(self) -> None:
+        self.boxes, self.templates = [], []
+
+    def _detect(self, gray: np.ndarray[Any, Any]) -> List[Box]:
+        if self.boxes:
+            # Search around where the faces were before paying for a full-frame scan
+            xs = [b[0] for b in self.boxes]
+            ys = [b[1] for b in self.boxes]
+            x1s = [b[0] + b[2] for b in self.boxes]
+            y1s = [b[1] + b[3] for b in self.boxes]
+            union = (min(xs), min(ys), max(x1s) - min(xs), max(y1s) - min(ys))
+            rx, ry, rw, rh = _pad_box(union, self.roi_padding)
+            found = _detect_faces(gray[ry:ry+rh, rx:rx+rw])
+            if found:
+                self.stats["roi_detections"] += 1
+                return [(x + rx, y + ry, w, h) for (x, y, w, h) in found]
+        self.stats["full_detections"] += 1
+        return _detect_faces(gray)
+
+    def _track(self, gray: np.ndarray[Any, Any]) -> Optional[List[Box]]:
+        """New boxes from template matching, or None if any face was lost."""
+        tracked = []
+        for box, template in zip(self.boxes, self.templates):
+            sx, sy, sw, sh = _pad_box(box, self.search_margin)
+            window = gray[sy:sy+sh, sx:sx+sw]
+            th, tw = template.shape[:2]
+            if window.shape[0] < th or window.shape[1] < tw:
+                return None
+            result = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, confidence, _, (mx, my) = cv2.minMaxLoc(result)
+            if confidence < self.min_confidence:
+                return None
+            tracked.append((sx + mx, sy + my, tw, th))
+        return tracked
+
+    def locate(self, frame: np.ndarray[Any, Any], gamma: float = 1.2) -> Tuple[Optional[np.ndarray[Any, Any]], List[Box]]:
+        """
+        The prepared grayscale frame and the face boxes on it, tracked or
+        re-detected: the stateful half of `process`, without the per-face analysis.
+        """
+        if frame is None or frame.size == 0:
+            return None, []
+        gray = _prepare(frame, gamma)
+
+        boxes = None
+        if self.boxes and self.frames_since_detect < self.redetect_every:
+            boxes = self._track(gray)
+            if boxes is None:
+                self.stats["track_losses"] += 1
+            else:
+                self.stats["tracked_frames"] += 1
+                self.frames_since_detect += 1
+        if boxes is None:
+            boxes = self._detect(gray)
+            self.frames_since_detect = 0
+            # Templates come from detections only, so tracking cannot drift onto the background
+            self.templates = [gray[y:y+h, x:x+w].copy() for (x, y, w, h) in boxes]
+        self.boxes = boxes
+        return gray, boxes
+
+    def process(self, frame: np.ndarray[Any, Any], gamma: float = 1.2) -> List[Dict[str, Any]]:
+        """Same output as detect_emotions_from_array, for the next frame of this stream."""
+        gray, boxes = self.locate(frame, gamma)
+        if gray is None:
+            return []
+        faces = analyze_boxes(gray, frame.shape, boxes)
+        smooth_faces(faces, self.emotion_buffer)
+        return faces
+
+
 def detect_emotions_from_bytes(frame_bytes: bytes, gamma: float = 1.2, skip_frames: int = 2) -> List[Dict[str, Any]]:
     nparr = np.frombuffer(frame_bytes, np.uint8)
     frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     return detect_emotions_from_array(frame, gamma=gamma, skip_frames=skip_frames)
+
+
+# Decoder-side downscaling (exact for JPEG, where it skips most of the IDCT work)
+_REDUCED_DECODE = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def _reduction_for(width: int, height: int) -> Tuple[int, int]:
+    """(factor, imread flag) for the largest reduction that stays at or above the working size."""
+    for factor, flag in _REDUCED_DECODE:
+        if width // factor >= FRAME_WIDTH and height // factor >= FRAME_HEIGHT:
+            return factor, flag
+    return 1, cv2.IMREAD_COLOR
+
+
+class FrameDecoder:
+    """
+    Decodes the encoded frames (JPEG/WebP/PNG) of one stream. The first frame
+    is decoded at full size to learn the stream's resolution; later frames are
+    decoded already downscaled towards the working size.
+    """
+
+    def __init__(self):
+        self.factor, self.flag = 1, cv2.IMREAD_COLOR
+        self.probed = False
+
+    def decode(self, data: bytes) -> Tuple[Optional[np.ndarray[Any, Any]], int]:
+        """The image (None if undecodable) and the factor it was reduced by."""
+        factor = self.factor
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), self.flag)
+        if image is None or image.size == 0:
+            return None, factor
+        if not self.probed:
+            self.probed = True
+            self.factor, self.flag = _reduction_for(image.shape[1], image.shape[0])
+        return image, factor
+
+
+def scale_boxes(faces: List[Dict[str, Any]], factor: int) -> List[Dict[str, Any]]:
+    """Maps boxes found on a reduced decode back to original pixel coordinates."""
+    if factor > 1:
+        for face in faces:
+            face["box"] = tuple(v * factor for v in face["box"])
+    return faces
+
+
+def detect_emotions_batch(frames: List[bytes], gamma: float = 1.2) -> List[Dict[str, Any]]:
+    """
+    Decodes and analyzes many encoded frames in one call, meant to run as a
+    single worker-pool task. Frames are assumed to come from one camera: they
+    share a FrameDecoder and smoothing runs across the batch. Boxes are in
+    each frame's original pixel coordinates. Each result is {"faces": [...]}
+    or {"error": ...}.
+    """
+    results: List[Dict[str, Any]] = []
+    smoothing: deque = deque(maxlen=5)
+    decoder = FrameDecoder()
+    for data in frames:
+        image, factor = decoder.decode(data)
+        if image is None:
+            results.append({"error": "Could not decode image."})
+            continue
+        faces = detect_emotions_from_array(image, gamma=gamma, smoothing=smoothing)
+        results.append({"faces": scale_boxes(faces, factor)})
+    return results
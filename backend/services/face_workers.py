@@ -0,0 +1,427 @@
+# backend/services/face_workers.py
+import asyncio
+import itertools
+import logging
+import multiprocessing as mp
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Connection, wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from backend.config import (
+    FACE_ANALYSIS_BACKEND,
+    FACE_PROCESS_WORKERS,
+    FACE_PROCESS_SLOTS,
+    FACE_PROCESS_SLOT_BYTES,
+    FACE_PROCESS_TASK_TIMEOUT,
+)
+from backend.services.face_services import (
+    Box,
+    FaceTracker,
+    FrameDecoder,
+    analyze_boxes,
+    analyze_faces,
+    detect_emotions_batch,
+    scale_boxes,
+    smooth_faces,
+)
+from backend.utils.executors import executors
+from backend.utils.metrics import register_collector
+
+logger = logging.getLogger("backend.face_workers")
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker process analyzing a frame died (or was killed after a timeout)."""
+
+
+def _analyze(image: np.ndarray, gamma: float, to_rgb: bool) -> List[Dict[str, Any]]:
+    if to_rgb:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return analyze_faces(image, gamma)
+
+
+def _run_job(image: np.ndarray, job: Tuple[float, bool, Optional[Tuple[int, ...]], Optional[List[Box]]]) -> List[Dict[str, Any]]:
+    """
+    One task: (gamma, to_rgb, None, None) analyzes a whole frame;
+    (_, _, frame_shape, boxes) analyzes tracked boxes on a prepared grayscale frame.
+    """
+    gamma, to_rgb, frame_shape, boxes = job
+    if boxes is None:
+        return _analyze(image, gamma, to_rgb)
+    return analyze_boxes(image, frame_shape, boxes)
+
+
+def _worker_main(conn: Connection, shm_name: str, slot_bytes: int) -> None:
+    """Worker process: analyzes frames found in shared-memory slots until told to stop."""
+    shm = SharedMemory(name=shm_name)
+    try:
+        while True:
+            task = conn.recv()
+            if task is None:
+                break
+            task_id, slot, shape, dtype, job = task
+            # A view into the slot, not a copy; the parent does not reuse the slot until we reply
+            image = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=slot * slot_bytes)
+            try:
+                conn.send((task_id, _run_job(image, job), None))
+            except Exception as e:
+                conn.send((task_id, None, f"{type(e).__name__}: {e}"))
+            finally:
+                del image  # Views must be gone before shm.close()
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        shm.close()
+
+
+class _Worker:
+    def __init__(self, index: int, process: mp.Process, conn: Connection):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.dead = False
+        self.task: Optional[Tuple[int, asyncio.Future, int]] = None  # (task id, future, slot)
+
+
+class FaceProcessPool:
+    """
+    Runs the per-frame face analysis (analyze_faces, or analyze_boxes for
+    boxes found by a FaceTracker) in worker processes, so its Python-level
+    work does not hold the GIL the event loop needs.
+
+    Frames are copied into fixed slots of one shared-memory block; a worker
+    reads its slot in place and only the small list of faces is pickled
+    back. A slot is reused only after its result (or the worker's death) is
+    seen, so a caller giving up early never lets a frame be overwritten
+    mid-read. Each worker handles one frame at a time.
+
+    A supervisor thread waits on every worker's pipe and process sentinel.
+    A worker that dies is restarted at once and the frame it held fails with
+    WorkerCrashed; one that takes longer than `task_timeout` is killed,
+    which turns a hang into the same crash path.
+    """
+
+    def __init__(
+        self,
+        workers: int = FACE_PROCESS_WORKERS,
+        slots: int = FACE_PROCESS_SLOTS,
+        slot_bytes: int = FACE_PROCESS_SLOT_BYTES,
+        task_timeout: float = FACE_PROCESS_TASK_TIMEOUT,
+    ):
+        self.size = max(1, workers)
+        self.slot_count = max(slots, self.size)
+        self.slot_bytes = slot_bytes
+        self.task_timeout = task_timeout
+        self._ctx = mp.get_context("spawn")  # Forking a process with live threads and an event loop is unsafe
+        self._shm: Optional[SharedMemory] = None
+        self._workers: List[_Worker] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._free_slots: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._supervisor: Optional[threading.Thread] = None
+        self._closing = False
+        self._task_ids = itertools.count(1)
+        self._runs: Deque[float] = deque(maxlen=500)
+        self.tasks = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self.restarts = 0
+        self.timeouts = 0
+
+    @property
+    def running(self) -> bool:
+        return self._supervisor is not None and not self._closing
+
+    # ---------------------- LIFECYCLE ----------------------
+    def _spawn(self, index: int) -> _Worker:
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main, args=(child_conn, self._shm.name, self.slot_bytes),
+            name=f"face-worker-{index}", daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        return _Worker(index, process, parent_conn)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._closing = False
+        self._shm = SharedMemory(create=True, size=self.slot_count * self.slot_bytes)
+        self._free_slots = asyncio.Queue()
+        for slot in range(self.slot_count):
+            self._free_slots.put_nowait(slot)
+        self._idle = asyncio.Queue()
+        # Spawning re-imports the app in each child: keep it off the event loop
+        self._workers = await executors.run("io", lambda: [self._spawn(i) for i in range(self.size)])
+        for worker in self._workers:
+            self._idle.put_nowait(worker)
+        self._supervisor = threading.Thread(target=self._supervise, name="face-workers-supervisor", daemon=True)
+        self._supervisor.start()
+        logger.info(f"Face analysis workers started: {self.size} processes, {self.slot_count} slots of {self.slot_bytes} bytes.")
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        if self._supervisor is None:
+            return
+        self._closing = True
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+
+        def join_all():
+            deadline = time.monotonic() + timeout
+            for worker in self._workers:
+                worker.process.join(max(0.0, deadline - time.monotonic()))
+                if worker.process.is_alive():
+                    worker.process.kill()
+                    worker.process.join()
+            self._supervisor.join()
+
+        await executors.run("io", join_all)
+        for worker in self._workers:
+            self._fail(worker, WorkerCrashed("Face worker pool stopped."))
+            worker.conn.close()
+            # Wakes callers still waiting for a worker; they see the pool stopped
+            worker.dead = True
+            self._idle.put_nowait(worker)
+        self._supervisor = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+        logger.info("Face analysis workers stopped.")
+
+    # ---------------------- SUPERVISOR THREAD ----------------------
+    def _supervise(self) -> None:
+        while not self._closing:
+            workers = {w.conn: w for w in self._workers}
+            sentinels = {w.process.sentinel: w for w in self._workers}
+            ready = wait(list(workers) + list(sentinels), timeout=0.5)
+            # Results first, so a reply sent just before exiting is not reported as a crash
+            for conn in ready:
+                if conn in workers:
+                    self._receive(workers[conn])
+            for sentinel in ready:
+                if sentinel in sentinels and not self._closing:
+                    self._restart(sentinels[sentinel])
+
+    def _receive(self, worker: _Worker) -> bool:
+        try:
+            message = worker.conn.recv()
+        except (EOFError, OSError):
+            return False  # The worker died; its sentinel reports it
+        self._loop.call_soon_threadsafe(self._on_result, worker, message)
+        return True
+
+    def _restart(self, worker: _Worker) -> None:
+        # Deliver anything it sent before dying (poll() is also true at EOF, hence the check)
+        while worker.conn.poll() and self._receive(worker):
+            pass
+        worker.process.join()
+        logger.error(f"Face worker {worker.index} exited (code {worker.process.exitcode}); restarting it.")
+        replacement = self._spawn(worker.index)
+        self._workers[worker.index] = replacement
+        self._loop.call_soon_threadsafe(self._on_crash, worker, replacement)
+
+    # ---------------------- EVENT LOOP SIDE ----------------------
+    def _finish(self, worker: _Worker) -> None:
+        _, _, slot = worker.task
+        worker.task = None
+        self._free_slots.put_nowait(slot)
+
+    def _fail(self, worker: _Worker, error: Exception) -> None:
+        if worker.task is not None:
+            future = worker.task[1]
+            self._finish(worker)
+            if not future.done():
+                future.set_exception(error)
+
+    def _on_result(self, worker: _Worker, message: Tuple[int, Any, Optional[str]]) -> None:
+        task_id, faces, error = message
+        if worker.task is None or worker.task[0] != task_id:
+            return  # Already failed (crash or shutdown)
+        future = worker.task[1]
+        self._finish(worker)
+        if not future.done():
+            if error is None:
+                future.set_result(faces)
+            else:
+                future.set_exception(RuntimeError(f"Face worker error: {error}"))
+        if not worker.dead:
+            self._idle.put_nowait(worker)
+
+    def _on_crash(self, worker: _Worker, replacement: _Worker) -> None:
+        worker.dead = True
+        self.restarts += 1
+        self._fail(worker, WorkerCrashed(f"Face worker {worker.index} exited with code {worker.process.exitcode}."))
+        if not self._closing:
+            self._idle.put_nowait(replacement)
+
+    def _use_threads(self, image: np.ndarray) -> bool:
+        if not self.running or image.nbytes > self.slot_bytes:
+            self.fallbacks += 1
+            return True
+        return False
+
+    async def analyze(self, image: np.ndarray, gamma: float = 1.2, to_rgb: bool = False) -> List[Dict[str, Any]]:
+        """
+        analyze_faces(image, gamma) on a worker process (optionally after a
+        BGR->RGB swap). Frames larger than a slot, or any frame while the pool
+        is not running, are analyzed on the vision thread pool instead.
+        """
+        if self._use_threads(image):
+            return await executors.run("vision", _analyze, image, gamma, to_rgb)
+        return await self._submit(image, (gamma, to_rgb, None, None))
+
+    async def analyze_boxes(self, gray: np.ndarray, frame_shape: Tuple[int, ...], boxes: List[Box]) -> List[Dict[str, Any]]:
+        """analyze_boxes on a worker process, for boxes a FaceTracker found on its prepared frame `gray`."""
+        if self._use_threads(gray):
+            return await executors.run("vision", analyze_boxes, gray, frame_shape, boxes)
+        return await self._submit(gray, (0.0, False, tuple(frame_shape), list(boxes)))
+
+    async def _submit(self, image: np.ndarray, job: Tuple[Any, ...]) -> List[Dict[str, Any]]:
+        slot = await self._free_slots.get()
+        try:
+            offset = slot * self.slot_bytes
+            np.ndarray(image.shape, dtype=image.dtype, buffer=self._shm.buf, offset=offset)[...] = image
+            worker = await self._idle.get()
+            while worker.dead:
+                if not self.running:
+                    self._idle.put_nowait(worker)  # Wake the next waiter too
+                    raise WorkerCrashed("Face worker pool stopped.")
+                worker = await self._idle.get()
+        except BaseException:
+            self._free_slots.put_nowait(slot)
+            raise
+
+        task_id = next(self._task_ids)
+        future = self._loop.create_future()
+        # Mark the outcome as retrieved even if the caller timed out or left
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        worker.task = (task_id, future, slot)
+        self.tasks += 1
+        started = time.monotonic()
+        try:
+            worker.conn.send((task_id, slot, image.shape, image.dtype.str, job))
+        except OSError:
+            pass  # Dead worker: the supervisor fails this task when it restarts it
+        try:
+            # Shielded: the slot stays reserved until the worker is done with it, even if the caller leaves
+            faces = await asyncio.wait_for(asyncio.shield(future), self.task_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.error(f"Face worker {worker.index} took over {self.task_timeout}s; killing it.")
+            worker.process.kill()
+            raise
+        except Exception:
+            self.failures += 1
+            raise
+        self._runs.append(time.monotonic() - started)
+        return faces
+
+    def snapshot(self) -> Dict[str, Any]:
+        runs = sorted(self._runs)
+        return {
+            "backend": FACE_ANALYSIS_BACKEND,
+            "running": self.running,
+            "workers": self.size,
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "free_slots": self._free_slots.qsize() if self._free_slots is not None else 0,
+            "tasks": self.tasks,
+            "fallbacks": self.fallbacks,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "restarts": self.restarts,
+            "run_p50": round(runs[len(runs) // 2], 4) if runs else 0.0,
+        }
+
+
+face_workers = FaceProcessPool()
+register_collector("face_workers", face_workers.snapshot)
+
+
+async def detect_emotions(
+    image: np.ndarray,
+    gamma: float = 1.2,
+    smoothing: Optional[deque] = None,
+    to_rgb: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    detect_emotions_from_array on the configured backend (FACE_ANALYSIS_BACKEND),
+    awaitable from the event loop. Smoothing (if a buffer is given) always
+    runs here, in this process.
+    """
+    if FACE_ANALYSIS_BACKEND == "process":
+        faces = await face_workers.analyze(image, gamma, to_rgb)
+    else:
+        faces = await executors.run("vision", _analyze, image, gamma, to_rgb)
+    if smoothing is not None:
+        smooth_faces(faces, smoothing)
+    return faces
+
+
+def _track(tracker: FaceTracker, image: np.ndarray, gamma: float, to_rgb: bool) -> List[Dict[str, Any]]:
+    if to_rgb:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return tracker.process(image, gamma)
+
+
+def _locate(tracker: FaceTracker, image: np.ndarray, gamma: float, to_rgb: bool) -> Tuple[Optional[np.ndarray], List[Box]]:
+    if to_rgb:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return tracker.locate(image, gamma)
+
+
+async def track_emotions(
+    tracker: FaceTracker,
+    image: np.ndarray,
+    gamma: float = 1.2,
+    to_rgb: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    tracker.process(image, gamma) on the configured backend. Tracking keeps
+    per-stream state, so it always runs on the vision pool; with the
+    "process" backend only the per-face analysis of its boxes goes to the
+    worker processes, and smoothing runs here.
+    """
+    if FACE_ANALYSIS_BACKEND != "process":
+        return await executors.run("vision", _track, tracker, image, gamma, to_rgb)
+    gray, boxes = await executors.run("vision", _locate, tracker, image, gamma, to_rgb)
+    if gray is None:
+        return []
+    faces = await face_workers.analyze_boxes(gray, image.shape, boxes) if boxes else []
+    smooth_faces(faces, tracker.emotion_buffer)
+    return faces
+
+
+async def detect_batch(frames: List[bytes], gamma: float = 1.2) -> List[Dict[str, Any]]:
+    """
+    detect_emotions_batch on the configured backend. With worker processes
+    the frames are decoded on the vision pool, analyzed concurrently on the
+    workers, and smoothed here in their original order.
+    """
+    if FACE_ANALYSIS_BACKEND != "process":
+        return await executors.run("vision", detect_emotions_batch, frames, gamma)
+    decoder = FrameDecoder()  # One camera: later frames decode reduced, as in detect_emotions_batch
+    decoded = await executors.run("vision", lambda: [decoder.decode(data) for data in frames])
+    analyses = iter(await asyncio.gather(*[
+        face_workers.analyze(image, gamma) for image, _ in decoded if image is not None
+    ]))
+    results: List[Dict[str, Any]] = []
+    smoothing: deque = deque(maxlen=5)
+    for image, factor in decoded:
+        if image is None:
+            results.append({"error": "Could not decode image."})
+            continue
+        faces = next(analyses)
+        smooth_faces(faces, smoothing)
+        results.append({"faces": scale_boxes(faces, factor)})
+    return results
@@ -0,0 +1,171 @@
+# backend/services/frame_broadcaster.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from backend.config import VIDEO_FEED_MAX_FPS, VIDEO_FEED_QUALITY_LEVELS
+from backend.services.camera_capture import CaptureDevice, Frame
+from backend.utils.executors import executors
+
+logger = logging.getLogger("backend.frame_broadcaster")
+
+# Consecutive fast sends before a viewer is moved back up one quality level
+UPGRADE_AFTER_FRAMES = 30
+
+
+def encode_jpeg(image: np.ndarray, quality: int) -> bytes:
+    _, buffer = cv2.imencode(".jpg", image, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    return buffer.tobytes()
+
+
+class _Viewer:
+    """Per-subscriber pacing and quality state."""
+
+    def __init__(self, max_fps: float, top_level: int):
+        self.interval = 1.0 / max_fps
+        self.top_level = top_level   # Best quality this viewer asked for (index into the levels)
+        self.level = top_level
+        self.fast_sends = 0
+
+    def adapt(self, send_time: float, max_level: int) -> None:
+        # A send that takes longer than the frame budget means the client or its
+        # network is behind: drop a quality level. Recover slowly once it keeps up.
+        if send_time > self.interval:
+            self.level = min(self.level + 1, max_level)
+            self.fast_sends = 0
+        elif send_time < self.interval / 4:
+            self.fast_sends += 1
+            if self.fast_sends >= UPGRADE_AFTER_FRAMES and self.level > self.top_level:
+                self.level -= 1
+                self.fast_sends = 0
+
+
+class FrameBroadcaster:
+    """
+    Fans one camera out to any number of viewers. Per captured frame, the
+    overlay is drawn at most once and the JPEG encoded at most once per
+    quality level, however many viewers receive it. Work is done lazily, only
+    for frames some viewer actually takes.
+
+    Each viewer is paced by its own fps cap and always takes the newest frame,
+    so a slow one skips frames instead of queueing them. Its JPEG quality
+    steps down while sends take longer than its frame interval and back up
+    once it keeps up.
+    """
+
+    def __init__(
+        self,
+        device: CaptureDevice,
+        annotate: Callable[[np.ndarray], np.ndarray],
+        encode: Callable[[np.ndarray, int], bytes] = encode_jpeg,
+        quality_levels: Tuple[int, ...] = VIDEO_FEED_QUALITY_LEVELS,
+        max_fps: float = VIDEO_FEED_MAX_FPS,
+        pool: str = "vision",  # Drawing and encoding are CPU work; keep them off the provider-call pool
+    ):
+        self.device = device
+        self.annotate = annotate
+        self.encode = encode
+        self.quality_levels = tuple(sorted(quality_levels, reverse=True))
+        self.max_fps = max_fps
+        self.pool = pool
+        # Only the last couple of frames are worth keeping work for
+        self._annotated: "OrderedDict[int, asyncio.Future]" = OrderedDict()
+        self._jpegs: "OrderedDict[Tuple[int, int], asyncio.Future]" = OrderedDict()
+        self.viewers = 0
+        self.annotations = 0
+        self.encodes = 0
+        self.shared_encodes = 0
+        self.frames_sent = 0
+        self.frames_skipped = 0
+
+    # ---------------------- SHARED WORK ----------------------
+    def _cached(self, cache: "OrderedDict[Any, asyncio.Future]", key: Any, make: Callable[[], Any], keep: int) -> Tuple[asyncio.Future, bool]:
+        future = cache.get(key)
+        if future is not None:
+            return future, True
+        future = cache[key] = asyncio.ensure_future(make())
+        while len(cache) > keep:
+            cache.popitem(last=False)
+        return future, False
+
+    async def _annotate(self, frame: Frame) -> np.ndarray:
+        self.annotations += 1
+        return await executors.run(self.pool, self.annotate, frame.image)
+
+    async def _encode(self, frame: Frame, quality: int) -> bytes:
+        future, _ = self._cached(self._annotated, frame.seq, lambda: self._annotate(frame), keep=2)
+        annotated = await asyncio.shield(future)
+        return await executors.run(self.pool, self.encode, annotated, quality)
+
+    async def jpeg(self, frame: Frame, quality: int) -> bytes:
+        """`frame` annotated and encoded at `quality`, computed once for all viewers."""
+        future, shared = self._cached(
+            self._jpegs, (frame.seq, quality), lambda: self._encode(frame, quality), keep=2 * len(self.quality_levels)
+        )
+        if shared:
+            self.shared_encodes += 1
+        else:
+            self.encodes += 1
+        # Shielded: one viewer leaving must not cancel work other viewers wait on
+        return await asyncio.shield(future)
+
+    # ---------------------- VIEWERS ----------------------
+    def level_for(self, quality: Optional[int]) -> int:
+        """Index of the highest level not above the requested quality (best level if None)."""
+        if quality is None:
+            return 0
+        for i, level in enumerate(self.quality_levels):
+            if level <= quality:
+                return i
+        return len(self.quality_levels) - 1
+
+    async def subscribe(self, max_fps: Optional[float] = None, quality: Optional[int] = None) -> AsyncIterator[bytes]:
+        """JPEG bytes for one viewer until capture stops. Yields nothing if the camera cannot open."""
+        if not await self.device.acquire():
+            return
+        fps = min(max_fps or self.max_fps, self.max_fps)
+        viewer = _Viewer(max(fps, 0.1), self.level_for(quality))
+        self.viewers += 1
+        last_seq = 0
+        next_due = 0.0
+        try:
+            while True:
+                wait = next_due - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                frame = await self.device.next_frame(last_seq)
+                if frame is None:
+                    if not self.device.running:
+                        return
+                    continue
+                if last_seq:
+                    self.frames_skipped += frame.seq - last_seq - 1
+                last_seq = frame.seq
+                data = await self.jpeg(frame, self.quality_levels[viewer.level])
+
+                sent_at = time.monotonic()
+                yield data
+                # The consumer resumes us once the bytes were handed to the transport,
+                # so this is how long the send took (grows under network backpressure)
+                viewer.adapt(time.monotonic() - sent_at, len(self.quality_levels) - 1)
+                self.frames_sent += 1
+                next_due = sent_at + viewer.interval
+        finally:
+            self.viewers -= 1
+            self.device.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "viewers": self.viewers,
+            "annotations": self.annotations,
+            "encodes": self.encodes,
+            "shared_encodes": self.shared_encodes,
+            "frames_sent": self.frames_sent,
+            "frames_skipped": self.frames_skipped,
+            "quality_levels": list(self.quality_levels),
+        }
@@ -0,0 +1,388 @@
+# backend/services/llm_providers.py
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from backend.config import (
+    CHAT_PROVIDERS,
+    CHAT_HEDGE_DELAY,
+    CHAT_HEDGE_DELAY_COMPLETE,
+    OLLAMA_ENABLED,
+    OLLAMA_HOST,
+    OLLAMA_MODEL,
+)
+from backend.utils.clients import get_groq_client, get_async_groq_client
+from backend.utils.chat_helpers import (
+    get_fallback_parts,
+    get_fallback_reply,
+    GROQ_CHAT_MODEL,
+    TIMEOUT_GROQ,
+    executor,
+)
+from backend.utils.metrics import register_collector
+from backend.utils.circuit_breaker import CircuitBreaker, breakers, OPEN
+from backend.utils.streaming import stream_completion, is_async_client
+
+logger = logging.getLogger("backend.llm_providers")
+
+Messages = List[Dict[str, str]]
+
+
+class AllProvidersFailed(Exception):
+    pass
+
+
+# ---------------------- PROVIDERS ----------------------
+class ChatProvider:
+    """
+    Base class for chat backends. `stream` yields content deltas; `complete`
+    returns the whole reply. Replies from providers with `enhance` get the
+    emotion footer, and `cacheable` ones may be stored in the completion cache.
+    Providers with a breaker are skipped while it is open. Streams and whole
+    completions have separate breakers: a stream's latency is its time to
+    first token, a completion's the whole reply, and each call's adaptive
+    timeout must come from the matching series.
+    """
+    name = "provider"
+    model = ""
+    enhance = True
+    cacheable = True
+    breaker: Optional[CircuitBreaker] = None            # stream(): time to first token
+    complete_breaker: Optional[CircuitBreaker] = None   # complete(): whole reply
+
+    def available(self) -> bool:
+        return True
+
+    def breaker_for(self, streaming: bool) -> Optional[CircuitBreaker]:
+        return self.breaker if streaming else self.complete_breaker
+
+    def label(self, emotion: str) -> str:
+        """Provider name reported to the client."""
+        return self.name
+
+    def stream(self, messages: Messages, emotion: str) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def complete(self, messages: Messages, emotion: str) -> str:
+        parts = [part async for part in self.stream(messages, emotion)]
+        return "".join(parts)
+
+
+class GroqProvider(ChatProvider):
+    name = "groq"
+    model = GROQ_CHAT_MODEL
+
+    def __init__(self):
+        self.breaker = breakers.get("groq.chat", timeout_max=TIMEOUT_GROQ)
+        self.complete_breaker = breakers.get("groq.complete", timeout_max=TIMEOUT_GROQ)
+
+    def available(self) -> bool:
+        return get_groq_client() is not None
+
+    async def stream(self, messages: Messages, emotion: str) -> AsyncIterator[str]:
+        # Prefer the async client so the stream is awaited on the loop, not pumped on a thread
+        client = get_async_groq_client() or get_groq_client()
+        async for content in stream_completion(
+            client, executor,
+            model=self.model, messages=messages, temperature=0.7, timeout=self.breaker.timeout(),
+        ):
+            yield content
+
+    async def complete(self, messages: Messages, emotion: str) -> str:
+        client = get_async_groq_client() or get_groq_client()
+        kwargs = dict(model=self.model, messages=messages, temperature=0.7, timeout=self.complete_breaker.timeout())
+        if is_async_client(client):
+            response = await client.chat.completions.create(**kwargs)
+        else:
+            loop = asyncio.get_event_loop()
+            response = await loop.run_in_executor(executor, lambda: client.chat.completions.create(**kwargs))
+        return response.choices[0].message.content
+
+
+class OllamaProvider(ChatProvider):
+    """Local model served by Ollama (https://ollama.com)."""
+    name = "ollama"
+
+    def __init__(self, host: str = OLLAMA_HOST, model: str = OLLAMA_MODEL):
+        self.host = host
+        self.model = model
+        self._client = None
+        self.breaker = breakers.get("ollama.chat", timeout_max=60.0)
+        self.complete_breaker = breakers.get("ollama.complete", timeout_max=60.0)
+
+    def _get_client(self):
+        if self._client is None:
+            import ollama
+            self._client = ollama.AsyncClient(host=self.host)
+        return self._client
+
+    def available(self) -> bool:
+        if not OLLAMA_ENABLED:
+            return False
+        try:
+            self._get_client()
+            return True
+        except ImportError:
+            return False
+
+    async def stream(self, messages: Messages, emotion: str) -> AsyncIterator[str]:
+        response = await self._get_client().chat(model=self.model, messages=messages, stream=True)
+        async for part in response:
+            content = part["message"]["content"]
+            if content:
+                yield content
+
+
+class FallbackProvider(ChatProvider):
+    """Canned emotion-aware replies, used when every real provider fails."""
+    name = "fallback"
+    enhance = False
+    cacheable = False
+
+    def label(self, emotion: str) -> str:
+        return get_fallback_parts(emotion)[1]
+
+    async def stream(self, messages: Messages, emotion: str) -> AsyncIterator[str]:
+        parts, _ = get_fallback_parts(emotion)
+        for part in parts:
+            yield part
+            await asyncio.sleep(0.05) # Small delay for natural typing effect
+
+    async def complete(self, messages: Messages, emotion: str) -> str:
+        return get_fallback_reply(emotion)[0]
+
+
+# ---------------------- ROUTING ----------------------
+class ProviderStats:
+    """EWMA latency (time to first token for streams) and error rate for one provider."""
+    ALPHA = 0.2
+
+    def __init__(self, prior_latency: float):
+        self.latency = prior_latency
+        self.error_rate = 0.0
+        self.samples = 0
+        self.successes = 0
+        self.failures = 0
+        self.hedges_started = 0
+        self.hedge_wins = 0
+
+    def record_success(self, latency: float) -> None:
+        self.latency = latency if self.samples == 0 else (1 - self.ALPHA) * self.latency + self.ALPHA * latency
+        self.error_rate *= (1 - self.ALPHA)
+        self.samples += 1
+        self.successes += 1
+
+    def record_lower_bound(self, elapsed: float) -> None:
+        """A cancelled hedge loser took at least `elapsed`; never lowers the estimate."""
+        if elapsed > self.latency:
+            self.latency = (1 - self.ALPHA) * self.latency + self.ALPHA * elapsed
+
+    def record_failure(self) -> None:
+        self.error_rate = (1 - self.ALPHA) * self.error_rate + self.ALPHA
+        self.failures += 1
+
+    def score(self) -> float:
+        # Lower is better; recent errors make a fast provider look slow
+        return self.latency * (1 + 10 * self.error_rate)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "latency_ewma": round(self.latency, 3),
+            "error_rate": round(self.error_rate, 3),
+            "score": round(self.score(), 3),
+            "successes": self.successes,
+            "failures": self.failures,
+            "hedges_started": self.hedges_started,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+class _Attempt:
+    __slots__ = ("provider", "task", "started", "stream", "hedge")
+
+    def __init__(self, provider: ChatProvider, task: asyncio.Future, started: float, stream: Any, hedge: bool):
+        self.provider, self.task, self.started, self.stream, self.hedge = provider, task, started, stream, hedge
+
+
+class ProviderRouter:
+    """
+    Orders providers by live latency/error stats and hedges: if the current
+    attempt has produced nothing within `hedge_delay`, the next provider is
+    started too and whichever answers first wins. The fallback provider is
+    used only after every real provider has failed.
+    """
+
+    def __init__(
+        self,
+        providers: List[ChatProvider],
+        fallback: Optional[ChatProvider] = None,
+        hedge_delay: float = CHAT_HEDGE_DELAY,
+        complete_hedge_delay: float = CHAT_HEDGE_DELAY_COMPLETE,
+    ):
+        self.providers = providers
+        self.fallback = fallback
+        self.hedge_delay = hedge_delay
+        self.complete_hedge_delay = complete_hedge_delay
+        # Unmeasured providers start with a pessimistic prior that respects the configured order
+        self.stats: Dict[str, ProviderStats] = {
+            p.name: ProviderStats(prior_latency=hedge_delay * (i + 1)) for i, p in enumerate(providers)
+        }
+
+    @property
+    def primary(self) -> Optional[ChatProvider]:
+        """The first configured provider; the completion cache only holds its replies, keyed by its model."""
+        return self.providers[0] if self.providers else None
+
+    def ordered(self, streaming: bool = True) -> List[ChatProvider]:
+        candidates = []
+        for p in self.providers:
+            breaker = p.breaker_for(streaming)
+            if p.available() and (breaker is None or breaker.state != OPEN):
+                candidates.append(p)
+        return sorted(candidates, key=lambda p: self.stats[p.name].score())
+
+    def _record_success(self, provider: ChatProvider, latency: float, streaming: bool) -> None:
+        self.stats[provider.name].record_success(latency)
+        breaker = provider.breaker_for(streaming)
+        if breaker is not None:
+            breaker.record_success(latency)
+
+    def _record_failure(self, provider: ChatProvider, streaming: bool) -> None:
+        self.stats[provider.name].record_failure()
+        breaker = provider.breaker_for(streaming)
+        if breaker is not None:
+            breaker.record_failure()
+
+    async def _race(
+        self,
+        start: Callable[[ChatProvider], Tuple[Awaitable[Any], Any]],
+        hedge_delay: float,
+        streaming: bool,
+    ) -> Tuple[ChatProvider, Any, float, Any]:
+        """
+        Runs `start(provider)` -> (awaitable, stream_handle) on providers in
+        order, hedging after `hedge_delay`. Returns (provider, result, started, stream_handle).
+        """
+        candidates = self.ordered(streaming)
+        pending: Dict[asyncio.Future, _Attempt] = {}
+        errors: List[str] = []
+
+        def launch(provider: ChatProvider, hedge: bool) -> None:
+            breaker = provider.breaker_for(streaming)
+            if breaker is not None and not breaker.allow():
+                errors.append(f"{provider.name}: circuit open")
+                return
+            awaitable, handle = start(provider)
+            task = asyncio.ensure_future(awaitable)
+            pending[task] = _Attempt(provider, task, time.monotonic(), handle, hedge)
+            if hedge:
+                self.stats[provider.name].hedges_started += 1
+                logger.info(f"Hedging chat request with provider '{provider.name}'.")
+
+        next_index = 0
+        try:
+            while pending or next_index < len(candidates):
+                if not pending:
+                    launch(candidates[next_index], hedge=False)
+                    next_index += 1
+                    if not pending:  # Refused by its circuit breaker
+                        continue
+                timeout = hedge_delay if next_index < len(candidates) else None
+                done, _ = await asyncio.wait(list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch(candidates[next_index], hedge=True)
+                    next_index += 1
+                    continue
+                for task in done:
+                    attempt = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except StopAsyncIteration:
+                        errors.append(f"{attempt.provider.name}: empty response")
+                        self._record_failure(attempt.provider, streaming)
+                        continue
+                    except Exception as e:
+                        errors.append(f"{attempt.provider.name}: {e}")
+                        logger.warning(f"Chat provider '{attempt.provider.name}' failed: {e}")
+                        self._record_failure(attempt.provider, streaming)
+                        continue
+                    if attempt.hedge:
+                        self.stats[attempt.provider.name].hedge_wins += 1
+                    return attempt.provider, result, attempt.started, attempt.stream
+        finally:
+            # Losers of the race are cancelled and their upstream streams closed
+            for task, attempt in pending.items():
+                task.cancel()
+                self.stats[attempt.provider.name].record_lower_bound(time.monotonic() - attempt.started)
+                if attempt.stream is not None:
+                    asyncio.ensure_future(_aclose_quietly(attempt.stream))
+        raise AllProvidersFailed("; ".join(errors) or "No chat provider available")
+
+    async def open_stream(self, messages: Messages, emotion: str) -> Tuple[ChatProvider, AsyncIterator[str]]:
+        """
+        Waits for the first token (hedging as needed) and returns the winning
+        provider with an iterator over its whole reply, first token included.
+        """
+        def start(provider: ChatProvider):
+            stream = provider.stream(messages, emotion)
+            return stream.__anext__(), stream
+
+        try:
+            provider, first, started, stream = await self._race(start, self.hedge_delay, streaming=True)
+        except AllProvidersFailed as e:
+            if self.fallback is None:
+                raise
+            logger.warning(f"All chat providers failed ({e}); using fallback.")
+            return self.fallback, self.fallback.stream(messages, emotion)
+        self._record_success(provider, time.monotonic() - started, streaming=True)
+        return provider, self._prepend(provider, first, stream)
+
+    async def complete(self, messages: Messages, emotion: str) -> Tuple[ChatProvider, str]:
+        def start(provider: ChatProvider):
+            return provider.complete(messages, emotion), None
+
+        try:
+            provider, reply, started, _ = await self._race(start, self.complete_hedge_delay, streaming=False)
+        except AllProvidersFailed as e:
+            if self.fallback is None:
+                raise
+            logger.warning(f"All chat providers failed ({e}); using fallback.")
+            return self.fallback, await self.fallback.complete(messages, emotion)
+        self._record_success(provider, time.monotonic() - started, streaming=False)
+        return provider, reply
+
+    async def _prepend(self, provider: ChatProvider, first: str, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+        try:
+            yield first
+            async for content in stream:
+                yield content
+        except Exception:
+            # A stream that dies after its first token still counts against the provider
+            self._record_failure(provider, streaming=True)
+            raise
+        finally:
+            await _aclose_quietly(stream)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "hedge_delay": self.hedge_delay,
+            "order": [p.name for p in self.ordered()],
+            "providers": {name: stats.snapshot() for name, stats in self.stats.items()},
+        }
+
+
+async def _aclose_quietly(stream: Any) -> None:
+    try:
+        await stream.aclose()
+    except Exception:
+        pass
+
+
+_PROVIDER_TYPES = {"groq": GroqProvider, "ollama": OllamaProvider}
+
+provider_router = ProviderRouter(
+    providers=[_PROVIDER_TYPES[name]() for name in CHAT_PROVIDERS if name in _PROVIDER_TYPES],
+    fallback=FallbackProvider(),
+)
+register_collector("chat_providers", provider_router.snapshot)
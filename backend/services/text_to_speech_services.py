@@ -6,10 +6,10 @@ import asyncio
 import logging
 from typing import BinaryIO, Any
 from groq import Groq
-from concurrent.futures import ThreadPoolExecutor
+from backend.utils.executors import executors
 
 logger = logging.getLogger("tts_services")
-executor = ThreadPoolExecutor()
+executor = executors.get("io")
 
 # Note: Groq API client is lazily loaded in main.py, but we define the type here
 GroqClient = Any
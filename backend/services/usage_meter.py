@@ -0,0 +1,225 @@
+# backend/services/usage_meter.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from backend.config import (
+    USAGE_QUOTA_ENABLED,
+    USAGE_BUCKET_TOKENS,
+    USAGE_REFILL_TOKENS_PER_MINUTE,
+    USAGE_MAX_TRACKED_USERS,
+    USAGE_WINDOW_SECONDS,
+    USAGE_FLUSH_INTERVAL,
+    USAGE_MAX_PENDING_ROWS,
+)
+from backend.models.usage import UsageRecord
+from backend.utils.database import AsyncSessionLocal
+from backend.utils.metrics import register_collector
+
+logger = logging.getLogger("backend.usage_meter")
+
+
+class QuotaExceeded(HTTPException):
+    """429 with Retry-After, raised before a provider call when the user's bucket is empty."""
+    def __init__(self, retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Usage quota exceeded; retry later.",
+            headers={"Retry-After": str(max(1, round(retry_after)))},
+        )
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    `capacity` tokens refilled at `rate` per second. Actual usage is charged
+    after the call, so the balance may go negative; a user in debt is refused
+    until the refill brings them back.
+    """
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_consume(self, cost: float) -> float:
+        """Takes `cost` and returns 0, or returns the seconds until it could be taken."""
+        self._refill()
+        # A request larger than the whole bucket is allowed when the bucket is full
+        needed = min(cost, self.capacity)
+        if self.tokens < needed or self.tokens <= 0:
+            return (max(needed, 1) - self.tokens) / self.rate if self.rate > 0 else float("inf")
+        self.tokens -= cost
+        return 0.0
+
+    def charge(self, cost: float) -> None:
+        self._refill()
+        self.tokens -= cost
+
+
+class UsageMeter:
+    """
+    Per-user token accounting for provider calls (chat, TTS, ASR).
+
+    check() runs before a provider call and enforces an in-memory token
+    bucket per user; record() adds the call's actual usage to counters keyed
+    by (user, route, window). A background task writes the counters to the
+    database in one batch every `flush_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = USAGE_QUOTA_ENABLED,
+        bucket_tokens: int = USAGE_BUCKET_TOKENS,
+        refill_per_minute: float = USAGE_REFILL_TOKENS_PER_MINUTE,
+        max_users: int = USAGE_MAX_TRACKED_USERS,
+        window_seconds: int = USAGE_WINDOW_SECONDS,
+        flush_interval: float = USAGE_FLUSH_INTERVAL,
+        max_pending_rows: int = USAGE_MAX_PENDING_ROWS,
+    ):
+        self.enabled = enabled
+        self.bucket_tokens = bucket_tokens
+        self.refill_per_second = refill_per_minute / 60.0
+        self.max_users = max_users
+        self.window_seconds = window_seconds
+        self.flush_interval = flush_interval
+        self.max_pending_rows = max_pending_rows
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        # (user_key, route, window_start) -> [requests, prompt_tokens, completion_tokens]
+        self._pending: Dict[Tuple[str, str, int], List[int]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self.rejected = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.flush_errors = 0
+        self.rows_dropped = 0
+        self.totals = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    # ---------------------- QUOTA ----------------------
+    def _bucket(self, user_key: str) -> TokenBucket:
+        bucket = self._buckets.get(user_key)
+        if bucket is None:
+            bucket = self._buckets[user_key] = TokenBucket(self.bucket_tokens, self.refill_per_second)
+            # Forget the least recently seen users (idle long enough, their bucket is full anyway)
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_key)
+        return bucket
+
+    def check(self, user_key: str, route: str, prompt_tokens: int = 0) -> None:
+        """Charges the known prompt cost up front; raises QuotaExceeded if the user is over quota."""
+        if not self.enabled:
+            return
+        retry_after = self._bucket(user_key).try_consume(prompt_tokens)
+        if retry_after:
+            self.rejected += 1
+            logger.info(f"Quota exceeded for {user_key} on {route}; retry in {retry_after:.0f}s.")
+            raise QuotaExceeded(retry_after)
+
+    def refund(self, user_key: str, tokens: int) -> None:
+        """Gives back tokens charged by check() for a call that was not made."""
+        if self.enabled and tokens:
+            self._bucket(user_key).charge(-tokens)
+
+    def record(self, user_key: str, route: str, prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        """Counts a finished call. The prompt was charged by check(); the completion is charged now."""
+        if self.enabled and completion_tokens:
+            self._bucket(user_key).charge(completion_tokens)
+        window = int(time.time()) // self.window_seconds * self.window_seconds
+        counters = self._pending.get((user_key, route, window))
+        if counters is None:
+            if len(self._pending) >= self.max_pending_rows:
+                self.rows_dropped += 1
+                return
+            counters = self._pending[(user_key, route, window)] = [0, 0, 0]
+        counters[0] += 1
+        counters[1] += prompt_tokens
+        counters[2] += completion_tokens
+        self.totals["requests"] += 1
+        self.totals["prompt_tokens"] += prompt_tokens
+        self.totals["completion_tokens"] += completion_tokens
+
+    # ---------------------- FLUSHING ----------------------
+    def start(self) -> None:
+        if self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush_loop())
+
+    async def stop(self) -> None:
+        """Stops the flush loop and writes whatever is still pending (called on shutdown)."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        rows = [
+            UsageRecord(
+                user_key=user_key,
+                route=route,
+                window_start=datetime.fromtimestamp(window, tz=timezone.utc),
+                requests=requests,
+                prompt_tokens=prompt,
+                completion_tokens=completion,
+                total_tokens=prompt + completion,
+            )
+            for (user_key, route, window), (requests, prompt, completion) in pending.items()
+        ]
+        try:
+            async with AsyncSessionLocal() as db:
+                db.add_all(rows)
+                await db.commit()
+            self.flushes += 1
+            self.rows_written += len(rows)
+        except Exception as e:
+            self.flush_errors += 1
+            logger.error(f"Failed to flush {len(rows)} usage rows: {e}")
+            # Merge back so the next flush retries them
+            for key, counters in pending.items():
+                current = self._pending.get(key)
+                if current is not None:
+                    for i, value in enumerate(counters):
+                        current[i] += value
+                elif len(self._pending) < self.max_pending_rows:
+                    self._pending[key] = counters
+                else:
+                    self.rows_dropped += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "tracked_users": len(self._buckets),
+            "rejected": self.rejected,
+            "pending_rows": len(self._pending),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "flush_errors": self.flush_errors,
+            "rows_dropped": self.rows_dropped,
+            **self.totals,
+        }
+
+
+usage_meter = UsageMeter()
+register_collector("usage", usage_meter.snapshot)
@@ -0,0 +1,216 @@
+# backend/utils/admission.py
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional
+
+from fastapi import HTTPException, status
+
+from backend.config import (
+    ADMISSION_CAPACITY,
+    ADMISSION_QUEUE_SIZE,
+    ADMISSION_CHAT_STREAM_LIMIT,
+    ADMISSION_CHAT_STREAM_MAX_WAIT,
+    ADMISSION_CHAT_LIMIT,
+    ADMISSION_CHAT_MAX_WAIT,
+    ADMISSION_BATCH_LIMIT,
+    ADMISSION_BATCH_MAX_WAIT,
+    ADMISSION_TTS_LIMIT,
+    ADMISSION_TTS_MAX_WAIT,
+    ADMISSION_ASR_LIMIT,
+    ADMISSION_ASR_MAX_WAIT,
+)
+from backend.utils.metrics import register_collector
+
+logger = logging.getLogger("backend.admission")
+
+# Lower value = served first
+PRIORITY_INTERACTIVE, PRIORITY_STANDARD, PRIORITY_BATCH = 0, 1, 2
+
+
+class RoutePolicy(NamedTuple):
+    limit: int        # Concurrent slots this route may hold
+    priority: int
+    max_wait: float   # Queueing deadline in seconds
+
+
+class AdmissionRejected(HTTPException):
+    """Raised instead of queueing past the deadline; FastAPI turns it into a 429/503 with Retry-After."""
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(status_code=status_code, detail=detail, headers={"Retry-After": str(max(1, round(retry_after)))})
+        self.retry_after = retry_after
+
+
+class Slot:
+    """A granted admission. release() is idempotent so it can be wired to several exit paths."""
+
+    def __init__(self, controller: "AdmissionController", route: str, waited: float):
+        self.controller = controller
+        self.route = route
+        self.waited = waited
+        self.acquired_at = time.monotonic()
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "route", "future", "enqueued")
+
+    def __init__(self, priority: int, seq: int, route: str, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.route = route
+        self.future = future
+        self.enqueued = time.monotonic()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    """
+    Bounds concurrent upstream LLM calls. Each route has its own concurrency
+    limit inside a shared capacity; requests over the limit wait in a bounded
+    queue served by priority (then FIFO). A request that cannot be admitted
+    before its route's deadline is refused up front instead of timing out
+    later at the provider.
+    """
+
+    def __init__(self, name: str, capacity: int, max_queue: int, routes: Dict[str, RoutePolicy]):
+        self.name = name
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.routes = routes
+        self._in_use = 0
+        self._active: Dict[str, int] = {route: 0 for route in routes}
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        # EWMA of how long a slot is held, used to estimate queue wait and Retry-After
+        self._hold_ewma: Optional[float] = None
+        self._waits: Deque[float] = deque(maxlen=500)
+        self.admitted = 0
+        self.queued = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "deadline": 0, "timeout": 0}
+
+    # ---------------------- ACQUIRE ----------------------
+    def _has_capacity(self, route: str) -> bool:
+        return self._in_use < self.capacity and self._active[route] < self.routes[route].limit
+
+    def _grant(self, route: str) -> None:
+        self._in_use += 1
+        self._active[route] += 1
+        self.admitted += 1
+
+    def _estimate_wait(self, priority: int) -> float:
+        if self._hold_ewma is None:
+            return 0.0
+        ahead = sum(1 for w in self._waiters if w.priority <= priority)
+        return self._hold_ewma * (ahead + 1) / self.capacity
+
+    def _retry_after(self) -> float:
+        hold = self._hold_ewma or 1.0
+        return hold * (len(self._waiters) + 1) / self.capacity
+
+    async def acquire(self, route: str) -> Slot:
+        policy = self.routes[route]
+        # Fast path. Waiters are dispatched whenever a slot frees up, so any still queued
+        # are blocked by a limit this request would also hit; it cannot overtake them.
+        if self._has_capacity(route):
+            self._grant(route)
+            self._waits.append(0.0)
+            return Slot(self, route, 0.0)
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected["queue_full"] += 1
+            raise AdmissionRejected(status.HTTP_429_TOO_MANY_REQUESTS, "Too many queued requests; retry later.", self._retry_after())
+        estimate = self._estimate_wait(policy.priority)
+        if estimate > policy.max_wait:
+            self.rejected["deadline"] += 1
+            raise AdmissionRejected(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                f"Server busy; estimated wait {estimate:.1f}s exceeds {policy.max_wait:.0f}s.",
+                estimate,
+            )
+
+        waiter = _Waiter(policy.priority, next(self._seq), route, asyncio.get_event_loop().create_future())
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait({waiter.future}, timeout=policy.max_wait)
+        except asyncio.CancelledError:
+            # Client went away while queued; hand back a slot granted in the meantime
+            self._abandon(waiter)
+            raise
+        if not waiter.future.done():
+            self._abandon(waiter)
+            self.rejected["timeout"] += 1
+            raise AdmissionRejected(status.HTTP_503_SERVICE_UNAVAILABLE, "Server busy; request timed out in queue.", self._retry_after())
+        waited = time.monotonic() - waiter.enqueued
+        self._waits.append(waited)
+        return Slot(self, route, waited)
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        if waiter.future.done():
+            Slot(self, waiter.route, 0.0).release()
+        else:
+            waiter.future.cancel()
+            self._waiters.remove(waiter)
+
+    # ---------------------- RELEASE ----------------------
+    def _release(self, slot: Slot) -> None:
+        self._in_use -= 1
+        self._active[slot.route] -= 1
+        held = time.monotonic() - slot.acquired_at
+        self._hold_ewma = held if self._hold_ewma is None else 0.8 * self._hold_ewma + 0.2 * held
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        # Best waiter first; skip ones whose route is at its own limit so they don't block others
+        for waiter in sorted(self._waiters):
+            if self._in_use >= self.capacity:
+                break
+            if self._active[waiter.route] < self.routes[waiter.route].limit:
+                self._waiters.remove(waiter)
+                self._grant(waiter.route)
+                waiter.future.set_result(None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        depth = {route: 0 for route in self.routes}
+        for waiter in self._waiters:
+            depth[waiter.route] += 1
+        return {
+            "capacity": self.capacity,
+            "in_use": self._in_use,
+            "active": dict(self._active),
+            "queue_depth": len(self._waiters),
+            "queue_depth_by_route": depth,
+            "wait_avg": round(sum(waits) / len(waits), 4) if waits else 0.0,
+            "wait_p95": round(waits[int(0.95 * (len(waits) - 1))], 4) if waits else 0.0,
+            "hold_ewma": round(self._hold_ewma or 0.0, 3),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+        }
+
+
+# Shared by every route that calls the Groq-backed upstreams: chat LLMs, TTS and ASR
+llm_admission = AdmissionController(
+    "llm",
+    capacity=ADMISSION_CAPACITY,
+    max_queue=ADMISSION_QUEUE_SIZE,
+    routes={
+        "chat_stream": RoutePolicy(ADMISSION_CHAT_STREAM_LIMIT, PRIORITY_INTERACTIVE, ADMISSION_CHAT_STREAM_MAX_WAIT),
+        "chat": RoutePolicy(ADMISSION_CHAT_LIMIT, PRIORITY_STANDARD, ADMISSION_CHAT_MAX_WAIT),
+        "batch": RoutePolicy(ADMISSION_BATCH_LIMIT, PRIORITY_BATCH, ADMISSION_BATCH_MAX_WAIT),
+        "tts": RoutePolicy(ADMISSION_TTS_LIMIT, PRIORITY_STANDARD, ADMISSION_TTS_MAX_WAIT),
+        "asr": RoutePolicy(ADMISSION_ASR_LIMIT, PRIORITY_INTERACTIVE, ADMISSION_ASR_MAX_WAIT),
+    },
+)
+register_collector("admission", llm_admission.snapshot)
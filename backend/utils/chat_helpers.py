@@ -1,31 +1,27 @@
 # backend/utils/chat_helpers.py
 import asyncio
-import json
 import logging
 import time
 import os
-from concurrent.futures import ThreadPoolExecutor
-from typing import List, Any
+from typing import List, Any, Callable, Optional
 
 # --- Import necessary components ---
-from backend.utils.clients import get_groq_client # To access the Groq client
+from backend.utils.executors import executors
+from backend.utils.context_builder import TokenCounter
+from backend.utils.disconnect import stream_cancellations
+from backend.utils.postprocess import StreamPipeline, default_stages, postprocess_text
 
 # --- Configuration (Consider moving to a config file or main settings) ---
-MAX_HISTORY = int(os.getenv("MAX_HISTORY", 10))
 TIMEOUT_GROQ = int(os.getenv("TIMEOUT_GROQ", 20))
+GROQ_CHAT_MODEL = os.getenv("GROQ_CHAT_MODEL", "llama-3.1-8b-instant")
 
 # --- Logger ---
 logger = logging.getLogger("backend.chat_helpers")
 
-# --- Thread Executor (Can be shared, initialized here or passed in) ---
-# If you initialize it in main.py, you might need to pass it to functions here.
-# For simplicity, let's assume it's okay to initialize one here if needed,
-# or better yet, import the one from main.py if structure allows without circular imports.
-# Let's assume an executor is available/passed if needed by sync functions called async.
-# We'll use asyncio.to_thread for potentially blocking sync calls within async functions if needed.
-# However, Groq's stream itself might be iterable async or sync, needs careful handling.
-# The original main.py used run_in_executor for the sync Groq client. Let's keep that pattern.
-executor = ThreadPoolExecutor()
+# --- Thread Executor ---
+# Used for blocking Groq calls. Streaming prefers the AsyncGroq client; with the
+# sync client each stream's reads are pumped on this pool (see utils/streaming.py).
+executor = executors.get("io")
 
 
 # --- Helper Functions (Moved from main.py) ---
@@ -67,68 +63,76 @@ def get_emotion_aware_system_prompt(emotion: str) -> str:
 
 
 def enhance_response_with_emotion(response: str, emotion: str) -> str:
-    """ Adds emotion-aware Markdown elements to the AI response """
-    emotion = (emotion or "neutral").lower()
-    # Add detailed enhancement logic back here based on emotion...
-    if "stressed" in emotion or "anxious" in emotion or "fearful" in emotion:
-        response += "\n\n💡 **Tip**: Don't let anxiety take over. Debugging is a skill of patience. You got this!"
-    elif "sad" in emotion:
-        response += "\n\n💫 **Keep Going**: Small wins add up. Celebrate the next time a single line of code works!"
-    elif "confused" in emotion:
-        response += "\n\n🤔 **Need Clarity?**: Just ask me to re-explain the last concept using a different example."
-    elif "happy" in emotion:
-        response += " 🎉"
-    return response
-
-
-async def generate_groq_stream(client, messages, emotion: str):
-    """ Generate streaming response from Groq """
-    def sync_groq_call(): # Inner function for executor
-        # Ensure the client object passed is the initialized Groq client
-        return client.chat.completions.create(
-            model="llama-3.1-8b-instant", messages=messages, temperature=0.7,
-            stream=True, timeout=TIMEOUT_GROQ
-        )
+    """ Adds emotion-aware Markdown elements to the AI response (see utils/postprocess.py) """
+    return postprocess_text(response, emotion)
+
+
+async def generate_provider_stream(
+    router,
+    messages,
+    emotion: str,
+    on_complete: Optional[Callable[[str, Any], None]] = None,
+    on_finish: Optional[Callable[[int], None]] = None,
+):
+    """
+    Generate a streaming response from whichever provider `router`
+    (services.llm_providers.ProviderRouter) picks, as the same chat events.
+    `on_complete` receives the raw text and provider of cacheable (non-fallback) replies.
+    Cancelling the consumer cancels the upstream call; tokens generated up to
+    that point are recorded in the stream_cancellation metrics. `on_finish`
+    receives the completion tokens streamed, however the stream ended.
+    """
+    tokens = TokenCounter()
     try:
-        # Run the synchronous API call in the executor
-        stream = await asyncio.get_event_loop().run_in_executor(
-            executor,
-            sync_groq_call
-        )
-
-        full_response = ""
-        # Iterate through the synchronous stream iterator carefully
-        for chunk in stream:
-            if chunk.choices[0].delta.content is not None:
-                content = chunk.choices[0].delta.content
-                full_response += content
-                # Yield each chunk formatted as Server-Sent Event (SSE)
-                yield f"data: {json.dumps({'content': content, 'done': False})}\n\n"
-            # Give asyncio a chance to breathe within the sync iteration
-            await asyncio.sleep(0.001)
-
-        # Enhance the final combined response
-        enhanced_response = enhance_response_with_emotion(full_response, emotion)
-        # Find the enhancement part added
-        final_chunk_content = enhanced_response[len(full_response):]
-
-        # Send the enhancement as a separate content chunk if it exists
+        provider, deltas = await router.open_stream(messages, emotion)
+        pipeline = StreamPipeline(default_stages(emotion) if provider.enhance else ())
+        async for content in deltas:
+            tokens.add(content)
+            content = pipeline.feed(content)
+            if content:
+                yield {'content': content, 'done': False}
+        stream_cancellations.record_completed(tokens.total())
+
+        if provider.cacheable and on_complete:
+            on_complete(pipeline.text(), provider)
+
+        final_chunk_content = pipeline.finish()
         if final_chunk_content:
-            yield f"data: {json.dumps({'content': final_chunk_content, 'done': False})}\n\n"
-            await asyncio.sleep(0.001) # Small sleep after last content
+            yield {'content': final_chunk_content, 'done': False}
 
-        # Send the final 'done' signal with metadata
-        yield f"data: {json.dumps({'content': '', 'done': True, 'provider': 'groq', 'emotion_used': emotion})}\n\n"
+        yield {'content': '', 'done': True, 'provider': provider.label(emotion), 'emotion_used': emotion}
 
+    except asyncio.CancelledError:
+        stream_cancellations.record_cancelled(tokens.total())
+        raise
     except Exception as e:
-        error_msg = f"Error in Groq stream generation: {str(e)}"
-        logger.error(error_msg, exc_info=True) # Log full traceback
-        # Send an error signal back to the client
-        yield f"data: {json.dumps({'content': error_msg, 'done': True, 'error': True})}\n\n"
+        error_msg = f"Error in chat stream generation: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        yield {'content': error_msg, 'done': True, 'error': True}
+    finally:
+        if on_finish is not None:
+            on_finish(tokens.total())
+
+
+async def replay_cached_stream(text: str, emotion: str, provider: str, words_per_chunk: int = 8):
+    """ Replay a cached completion as the same chat events as generate_provider_stream """
+    pipeline = StreamPipeline(default_stages(emotion))
+    words = text.split(" ")
+    for i in range(0, len(words), words_per_chunk):
+        part = " ".join(words[i:i + words_per_chunk])
+        if i + words_per_chunk < len(words):
+            part += " "
+        yield {'content': pipeline.feed(part), 'done': False}
 
+    final_chunk_content = pipeline.finish()
+    if final_chunk_content:
+        yield {'content': final_chunk_content, 'done': False}
 
-async def generate_fallback_stream(message: str, emotion: str):
-    """ Generate streaming fallback response """
+    yield {'content': '', 'done': True, 'provider': provider, 'emotion_used': emotion, 'cached': True}
+
+
+def get_fallback_parts(emotion: str):
+    """ Returns (parts, provider) for the canned streaming fallback reply """
     emotion = (emotion or "neutral").lower()
     responses = []
     provider = "fallback-neutral"
@@ -179,10 +183,30 @@ async def generate_fallback_stream(message: str, emotion: str):
         ]
         provider = "fallback-neutral"
 
-    # Stream each part with delays to simulate typing
-    for part in responses:
-        yield f"data: {json.dumps({'content': part, 'done': False})}\n\n"
-        await asyncio.sleep(0.05) # Small delay for natural typing effect
+    return responses, provider
+
+
+def get_fallback_reply(emotion: str):
+    """ Returns (reply, provider) for the canned non-streaming fallback reply """
+    emotion = (emotion or "neutral").lower()
+
+    if "stressed" in emotion or "anxious" in emotion or "fearful" in emotion:
+        reply = "I sense some stress... Let's take this step-by-step. What specific part are you working on right now? Remember to breathe!"
+        provider = "fallback-stressed"
+    elif "happy" in emotion or "surprised" in emotion:
+        reply = "Great! I love that positive energy. Tell me what you want to build next — let's channel that excitement! 🎉"
+        provider = "fallback-happy"
+    elif "confused" in emotion:
+        reply = "No worries... Let's break it down together. Where did you get stuck? 🤔"
+        provider = "fallback-confused"
+    elif "sad" in emotion:
+        reply = "Feeling down? Remember every developer faces challenges. Let's work through this together. What's troubling you? 💫"
+        provider = "fallback-sad"
+    elif "angry" in emotion or "disgusted" in emotion:
+        reply = "Frustrating! Let's approach this calmly. What specific issue is causing the most trouble?"
+        provider = "fallback-angry"
+    else:
+        reply = "Thanks for reaching out! I'm here to help with your coding questions. What would you like to work on today? 😊"
+        provider = "fallback-neutral"
 
-    # Send the final 'done' signal
-    yield f"data: {json.dumps({'content': '', 'done': True, 'provider': provider, 'emotion_used': emotion})}\n\n"
+    return reply, provider
@@ -0,0 +1,197 @@
+# backend/utils/circuit_breaker.py
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+from backend.config import (
+    BREAKER_WINDOW,
+    BREAKER_MIN_CALLS,
+    BREAKER_FAILURE_RATE,
+    BREAKER_SLOW_CALL_SECONDS,
+    BREAKER_SLOW_CALL_RATE,
+    BREAKER_OPEN_SECONDS,
+    ADAPTIVE_TIMEOUT_MIN,
+    ADAPTIVE_TIMEOUT_FACTOR,
+)
+from backend.utils.metrics import register_collector
+
+logger = logging.getLogger("backend.circuit_breaker")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the upstream's breaker is open."""
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open; retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed -> open when, over the last `window` calls (at least `min_calls`),
+    the failure rate or the slow-call rate crosses its threshold. After
+    `open_seconds` one trial call is let through (half-open); its outcome
+    closes or re-opens the circuit.
+
+    `timeout()` adapts to the upstream: p99 of recent successful latencies
+    times `timeout_factor`, clamped to [timeout_min, timeout_max].
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout_max: float,
+        window: int = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        failure_rate_threshold: float = BREAKER_FAILURE_RATE,
+        slow_call_seconds: float = BREAKER_SLOW_CALL_SECONDS,
+        slow_call_rate_threshold: float = BREAKER_SLOW_CALL_RATE,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+        timeout_min: float = ADAPTIVE_TIMEOUT_MIN,
+        timeout_factor: float = ADAPTIVE_TIMEOUT_FACTOR,
+    ):
+        self.name = name
+        self.timeout_max = timeout_max
+        self.timeout_min = min(timeout_min, timeout_max)
+        self.timeout_factor = timeout_factor
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        # (ok, slow) outcome of each recent call
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window)
+        self._latencies: Deque[float] = deque(maxlen=100)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self.rejected = 0
+        self.times_opened = 0
+
+    # ---------------------- STATE ----------------------
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """True if a call may go upstream now. Half-open admits a single trial call."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        # A trial whose outcome was never recorded (e.g. cancelled) expires after timeout_max
+        trial_expired = time.monotonic() - self._trial_started > self.timeout_max
+        if state == HALF_OPEN and (not self._trial_in_flight or trial_expired):
+            self._trial_in_flight = True
+            self._trial_started = time.monotonic()
+            return True
+        self.rejected += 1
+        return False
+
+    def check(self) -> None:
+        """Like allow(), but raises CircuitOpenError instead of returning False."""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def retry_after(self) -> float:
+        if self._state != OPEN:
+            return 1.0
+        return max(1.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def _open(self, reason: str) -> None:
+        if self._state != OPEN:
+            self.times_opened += 1
+            logger.warning(f"Circuit '{self.name}' opened: {reason}")
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    # ---------------------- OUTCOMES ----------------------
+    def record_success(self, latency: float) -> None:
+        slow = latency >= self.slow_call_seconds
+        self._latencies.append(latency)
+        self._outcomes.append((True, slow))
+        if self._state == HALF_OPEN:
+            if slow:
+                self._open(f"trial call slow ({latency:.1f}s)")
+            else:
+                logger.info(f"Circuit '{self.name}' closed after successful trial call.")
+                self._state = CLOSED
+                self._outcomes.clear()
+            return
+        self._evaluate()
+
+    def record_failure(self) -> None:
+        self._outcomes.append((False, False))
+        if self._state == HALF_OPEN:
+            self._open("trial call failed")
+            return
+        self._evaluate()
+
+    def release(self) -> None:
+        """Ends a call that says nothing about the upstream's health (e.g. a local misconfiguration)."""
+        if self._state == HALF_OPEN:
+            self._trial_in_flight = False  # The next caller gets the trial instead of waiting it out
+
+    def _evaluate(self) -> None:
+        calls = len(self._outcomes)
+        if self._state != CLOSED or calls < self.min_calls:
+            return
+        failure_rate = sum(1 for ok, _ in self._outcomes if not ok) / calls
+        slow_rate = sum(1 for _, slow in self._outcomes if slow) / calls
+        if failure_rate >= self.failure_rate_threshold:
+            self._open(f"failure rate {failure_rate:.0%} over last {calls} calls")
+        elif slow_rate >= self.slow_call_rate_threshold:
+            self._open(f"slow-call rate {slow_rate:.0%} over last {calls} calls")
+
+    # ---------------------- ADAPTIVE TIMEOUT ----------------------
+    def p99(self) -> float:
+        if not self._latencies:
+            return 0.0
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+
+    def timeout(self) -> float:
+        if len(self._latencies) < self.min_calls:
+            return self.timeout_max
+        return max(self.timeout_min, min(self.timeout_max, self.p99() * self.timeout_factor))
+
+    def snapshot(self) -> Dict[str, Any]:
+        calls = len(self._outcomes)
+        failures = sum(1 for ok, _ in self._outcomes if not ok)
+        return {
+            "state": self.state,
+            "recent_calls": calls,
+            "failure_rate": round(failures / calls, 3) if calls else 0.0,
+            "latency_p99": round(self.p99(), 3),
+            "timeout": round(self.timeout(), 2),
+            "retry_after": round(self.retry_after(), 1) if self._state == OPEN else 0,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class BreakerRegistry:
+    """One breaker per upstream endpoint, e.g. 'groq.chat' or 'huggingface.asr'."""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str, timeout_max: float = 20.0) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name, timeout_max=timeout_max)
+        return breaker
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: b.snapshot() for name, b in self._breakers.items()}
+
+
+breakers = BreakerRegistry()
+register_collector("circuit_breakers", breakers.snapshot)
@@ -11,6 +11,7 @@ logger = logging.getLogger("backend.clients")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
 groq_client = None
+async_groq_client = None
 
 def get_groq_client():
     """
@@ -36,6 +37,28 @@ def get_groq_client():
 
     return groq_client
 
+
+def get_async_groq_client():
+    """
+    Initializes and returns the AsyncGroq client instance.
+    Used for streaming so network reads are awaited instead of blocking a thread.
+    """
+    global async_groq_client
+    if not async_groq_client and GROQ_API_KEY:
+        try:
+            from groq import AsyncGroq
+            logger.info("Initializing AsyncGroq client...")
+            async_groq_client = AsyncGroq(api_key=GROQ_API_KEY)
+            logger.info("AsyncGroq client initialized successfully.")
+        except ImportError:
+            logger.error("Groq library not installed. Cannot initialize async client.")
+            async_groq_client = None
+        except Exception as e:
+            logger.error(f"AsyncGroq client initialization failed: {e}")
+            async_groq_client = None
+
+    return async_groq_client
+
 # Optional: Initialize Ollama client here too if needed elsewhere
 # try:
 #     import ollama
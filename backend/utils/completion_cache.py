@@ -0,0 +1,90 @@
+# backend/utils/completion_cache.py
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from backend.config import CHAT_CACHE_ENABLED, CHAT_CACHE_MAX_ENTRIES, CHAT_CACHE_TTL
+from backend.utils.metrics import register_collector
+
+logger = logging.getLogger("backend.completion_cache")
+
+
+def make_cache_key(model: str, system_prompt: str, history: List[Dict[str, Any]], message: str) -> str:
+    """Hash of everything that determines the upstream prompt."""
+    normalized_history = [
+        [m.get("role"), (m.get("content") or "").strip()] for m in history
+    ]
+    payload = json.dumps(
+        [model, system_prompt, normalized_history, message.strip()],
+        ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CachedCompletion(NamedTuple):
+    text: str
+    provider: str  # Name of the provider that generated it
+
+
+class CompletionCache:
+    """Size-bounded LRU cache of raw completion texts with a per-entry TTL."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 600.0, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled and max_entries > 0
+        self._entries: "OrderedDict[str, Tuple[float, CachedCompletion]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[CachedCompletion]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, completion = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return completion
+
+    def set(self, key: str, text: str, provider: str) -> None:
+        if not self.enabled or not text:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, CachedCompletion(text, provider))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+completion_cache = CompletionCache(CHAT_CACHE_MAX_ENTRIES, CHAT_CACHE_TTL, CHAT_CACHE_ENABLED)
+register_collector("completion_cache", completion_cache.snapshot)
@@ -0,0 +1,205 @@
+# backend/utils/context_builder.py
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple
+
+from backend.config import CHAT_TOKEN_BUDGET, CHAT_MAX_MESSAGE_TOKENS
+from backend.utils.metrics import register_collector
+
+logger = logging.getLogger("backend.context_builder")
+
+# Rough BPE-style pre-tokenization: word pieces, single punctuation marks, newlines
+_PIECE_RE = re.compile(r"\w+|[^\w\s]|\n")
+# Chat APIs add a few tokens of framing per message (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Below this many spare tokens it is not worth truncating an older message into the budget
+MIN_PARTIAL_MESSAGE_TOKENS = 32
+TRUNCATION_MARKER = "\n…[truncated]…\n"
+
+
+def _piece_tokens(piece: str) -> int:
+    # Common short words are one token; long identifiers split roughly every 4 chars
+    return 1 if len(piece) <= 4 else (len(piece) + 3) // 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the LLM token count of `text` without a model-specific tokenizer."""
+    if not text:
+        return 0
+    return sum(_piece_tokens(piece) for piece in _PIECE_RE.findall(text))
+
+
+class TokenCounter:
+    """
+    Incremental estimate for streamed text. A word split across two chunks is
+    held back until it is complete, so the total matches estimate_tokens(full_text).
+    """
+
+    def __init__(self):
+        self.tokens = 0
+        self._tail = ""
+
+    def add(self, chunk: str) -> int:
+        text = self._tail + chunk
+        # Keep a trailing word fragment for the next chunk
+        match = re.search(r"\w+$", text)
+        cut = match.start() if match else len(text)
+        self._tail = text[cut:]
+        self.tokens += estimate_tokens(text[:cut])
+        return self.tokens
+
+    def total(self) -> int:
+        return self.tokens + estimate_tokens(self._tail)
+
+
+class _TokenCountCache:
+    """
+    LRU of per-message token counts keyed by a 16-byte digest of the content,
+    so the cache never pins the (possibly very long) message strings themselves.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._counts: "OrderedDict[bytes, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, content: str) -> int:
+        key = hashlib.blake2b(content.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        tokens = self._counts.get(key)
+        if tokens is not None:
+            self.hits += 1
+            self._counts.move_to_end(key)
+            return tokens
+        self.misses += 1
+        tokens = self._counts[key] = estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+        if len(self._counts) > self.maxsize:
+            self._counts.popitem(last=False)
+        return tokens
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._counts)}
+
+
+_token_counts = _TokenCountCache(maxsize=8192)
+
+
+def count_message_tokens(content: str) -> int:
+    """Cached per-message count; history is resent every turn, so most lookups hit."""
+    return _token_counts.count(content)
+
+
+def _cut_middle(content: str, keep_chars: int) -> str:
+    head = keep_chars * 2 // 5
+    tail = keep_chars - head
+    return content[:head] + TRUNCATION_MARKER + content[len(content) - tail:]
+
+
+def truncate_to_tokens(content: str, max_tokens: int) -> str:
+    """Cuts the middle of an oversized message, keeping its head and (more of) its tail."""
+    tokens = estimate_tokens(content)
+    if tokens <= max_tokens:
+        return content
+    keep_chars = max(0, int(len(content) * max_tokens / tokens) - len(TRUNCATION_MARKER))
+    truncated = _cut_middle(content, keep_chars)
+    # Tokens are not spread evenly over the characters (and the marker costs some): shrink until it fits
+    used = estimate_tokens(truncated)
+    while used > max_tokens and keep_chars > 0:
+        keep_chars = min(keep_chars - 1, keep_chars * max_tokens // used)
+        truncated = _cut_middle(content, keep_chars)
+        used = estimate_tokens(truncated)
+    return truncated
+
+
+class ChatContext(NamedTuple):
+    messages: List[Dict[str, str]]   # Final payload: system + history + user
+    history: List[Dict[str, str]]    # The history slice actually sent
+    prompt_tokens: int
+    dropped_messages: int
+    truncated_messages: int
+
+
+class _ContextStats:
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens_total = 0
+        self.prompt_tokens_max = 0
+        self.dropped_messages = 0
+        self.truncated_messages = 0
+
+    def record(self, context: ChatContext) -> None:
+        self.requests += 1
+        self.prompt_tokens_total += context.prompt_tokens
+        self.prompt_tokens_max = max(self.prompt_tokens_max, context.prompt_tokens)
+        self.dropped_messages += context.dropped_messages
+        self.truncated_messages += context.truncated_messages
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "budget": CHAT_TOKEN_BUDGET,
+            "requests": self.requests,
+            "prompt_tokens_avg": round(self.prompt_tokens_total / self.requests, 1) if self.requests else 0.0,
+            "prompt_tokens_max": self.prompt_tokens_max,
+            "dropped_messages": self.dropped_messages,
+            "truncated_messages": self.truncated_messages,
+            "token_count_cache": _token_counts.snapshot(),
+        }
+
+
+context_stats = _ContextStats()
+register_collector("chat_context", context_stats.snapshot)
+
+
+def build_chat_context(
+    system_prompt: str,
+    history: List[Dict[str, str]],
+    message: str,
+    budget: int = CHAT_TOKEN_BUDGET,
+    max_message_tokens: int = CHAT_MAX_MESSAGE_TOKENS,
+) -> ChatContext:
+    """
+    Builds the prompt within a token budget. The system prompt and the new
+    message are always included; history is added from newest to oldest
+    until the budget is spent, with oversized messages truncated.
+    """
+    truncated = 0
+    if count_message_tokens(message) > max_message_tokens:
+        message = truncate_to_tokens(message, max_message_tokens - MESSAGE_OVERHEAD_TOKENS)
+        truncated += 1
+    used = count_message_tokens(system_prompt) + count_message_tokens(message)
+
+    selected: List[Dict[str, str]] = []
+    for item in reversed(history):
+        content = item["content"]
+        tokens = count_message_tokens(content)
+        if tokens > max_message_tokens:
+            content = truncate_to_tokens(content, max_message_tokens - MESSAGE_OVERHEAD_TOKENS)
+            tokens = count_message_tokens(content)
+            truncated += 1
+        remaining = budget - used
+        if tokens > remaining:
+            # Squeeze in a shortened copy of this message if there is real room left, then stop
+            if remaining - MESSAGE_OVERHEAD_TOKENS >= MIN_PARTIAL_MESSAGE_TOKENS:
+                content = truncate_to_tokens(content, remaining - MESSAGE_OVERHEAD_TOKENS)
+                selected.append({"role": item["role"], "content": content})
+                used += count_message_tokens(content)
+                truncated += 1
+            break
+        selected.append({"role": item["role"], "content": content})
+        used += tokens
+
+    selected.reverse()
+    messages = [{"role": "system", "content": system_prompt}] + selected + [
+        {"role": "user", "content": message}
+    ]
+    context = ChatContext(
+        messages=messages,
+        history=selected,
+        prompt_tokens=used,
+        dropped_messages=len(history) - len(selected),
+        truncated_messages=truncated,
+    )
+    context_stats.record(context)
+    return context
@@ -0,0 +1,86 @@
+# backend/utils/disconnect.py
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from fastapi import Request
+
+from backend.config import CHAT_DISCONNECT_POLL_INTERVAL
+from backend.utils.metrics import register_collector
+
+logger = logging.getLogger("backend.disconnect")
+
+
+class DisconnectWatch:
+    """
+    Polls `request.is_disconnected()` while a streaming response is being sent,
+    so a client that goes away is noticed even when nothing is being written
+    (e.g. while waiting for the first token). `on_disconnect` runs once.
+    """
+
+    def __init__(
+        self,
+        request: Request,
+        on_disconnect: Optional[Callable[[], None]] = None,
+        interval: float = CHAT_DISCONNECT_POLL_INTERVAL,
+    ):
+        self.request = request
+        self.on_disconnect = on_disconnect
+        self.interval = interval
+        self.disconnected = False
+
+    async def _poll(self) -> None:
+        while not self.disconnected:
+            await asyncio.sleep(self.interval)
+            if await self.request.is_disconnected():
+                self.disconnected = True
+                logger.info(f"Client disconnected from {self.request.url.path}.")
+                if self.on_disconnect is not None:
+                    self.on_disconnect()
+
+    async def wrap(self, frames: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Yields `frames` while watching the connection; closes them when either side stops."""
+        poller = asyncio.ensure_future(self._poll())
+        try:
+            async for frame in frames:
+                yield frame
+        finally:
+            poller.cancel()
+            await frames.aclose()
+
+
+class _CancellationStats:
+    """Streams whose upstream generation was cancelled because nobody was listening."""
+
+    def __init__(self):
+        self.completed = 0
+        self.completed_tokens = 0
+        self.cancelled = 0
+        self.cancelled_tokens = 0
+        self.tokens_saved = 0
+
+    def avg_completion_tokens(self) -> float:
+        return self.completed_tokens / self.completed if self.completed else 0.0
+
+    def record_completed(self, tokens: int) -> None:
+        self.completed += 1
+        self.completed_tokens += tokens
+
+    def record_cancelled(self, tokens: int) -> None:
+        # Saved tokens are estimated from the average length of completed replies
+        self.cancelled += 1
+        self.cancelled_tokens += tokens
+        self.tokens_saved += max(0, round(self.avg_completion_tokens()) - tokens)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "tokens_generated_before_cancel": self.cancelled_tokens,
+            "tokens_saved_estimate": self.tokens_saved,
+            "avg_completion_tokens": round(self.avg_completion_tokens(), 1),
+        }
+
+
+stream_cancellations = _CancellationStats()
+register_collector("stream_cancellation", stream_cancellations.snapshot)
@@ -0,0 +1,138 @@
+# backend/utils/executors.py
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List
+
+from backend.config import (
+    EXECUTOR_IO_WORKERS,
+    EXECUTOR_VISION_WORKERS,
+    EXECUTOR_HASHING_WORKERS,
+    EXECUTOR_SHUTDOWN_TIMEOUT,
+)
+from backend.utils.metrics import register_collector
+
+logger = logging.getLogger("backend.executors")
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class InstrumentedThreadPool(ThreadPoolExecutor):
+    """
+    A bounded ThreadPoolExecutor that tracks queued and running tasks, how long
+    tasks wait for a worker, and how long they run. Drop-in wherever an
+    executor is accepted (loop.run_in_executor, utils.streaming).
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        super().__init__(max_workers=max_workers, thread_name_prefix=name)
+        self.name = name
+        self.max_workers = max_workers
+        self._stats_lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self._waits: Deque[float] = deque(maxlen=500)
+        self._runs: Deque[float] = deque(maxlen=500)
+
+    def submit(self, fn: Callable, /, *args: Any, **kwargs: Any) -> Future:
+        submitted = time.monotonic()
+
+        def run():
+            started = time.monotonic()
+            with self._stats_lock:
+                self.queued -= 1
+                self.active += 1
+                self._waits.append(started - submitted)
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._stats_lock:
+                    self.active -= 1
+                    self.completed += 1
+                    self.failed += not ok
+                    self._runs.append(time.monotonic() - started)
+
+        with self._stats_lock:
+            self.queued += 1
+        try:
+            return super().submit(run)
+        except RuntimeError:
+            # Pool already shut down
+            with self._stats_lock:
+                self.queued -= 1
+            raise
+
+    def busy(self) -> int:
+        return self.queued + self.active
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            waits, runs = list(self._waits), list(self._runs)
+            return {
+                "max_workers": self.max_workers,
+                "threads": len(self._threads),
+                "active": self.active,
+                "queued": self.queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "wait_p50": round(_percentile(waits, 0.5), 4),
+                "wait_p95": round(_percentile(waits, 0.95), 4),
+                "run_p50": round(_percentile(runs, 0.5), 4),
+                "run_p95": round(_percentile(runs, 0.95), 4),
+            }
+
+
+class ExecutorRegistry:
+    """
+    Named, size-limited thread pools shared by the whole app:
+      io      - blocking provider SDK calls and sync stream pumps
+      vision  - CPU-bound face detection
+      hashing - bcrypt password / secret-key hashing
+    """
+
+    def __init__(self, sizes: Dict[str, int]):
+        self._pools: Dict[str, InstrumentedThreadPool] = {
+            name: InstrumentedThreadPool(name, workers) for name, workers in sizes.items()
+        }
+
+    def get(self, name: str) -> InstrumentedThreadPool:
+        return self._pools[name]
+
+    async def run(self, name: str, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Runs a blocking call on the named pool without blocking the event loop."""
+        return await asyncio.get_event_loop().run_in_executor(self._pools[name], functools.partial(fn, *args, **kwargs))
+
+    async def shutdown(self, timeout: float = EXECUTOR_SHUTDOWN_TIMEOUT) -> None:
+        """Waits up to `timeout` for queued and running work, then stops the pools."""
+        deadline = time.monotonic() + timeout
+        while any(pool.busy() for pool in self._pools.values()) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for name, pool in self._pools.items():
+            if pool.busy():
+                logger.warning(f"Executor '{name}' still busy at shutdown ({pool.active} running, {pool.queued} queued); cancelling queued work.")
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: pool.snapshot() for name, pool in self._pools.items()}
+
+
+executors = ExecutorRegistry({
+    "io": EXECUTOR_IO_WORKERS,
+    "vision": EXECUTOR_VISION_WORKERS,
+    "hashing": EXECUTOR_HASHING_WORKERS,
+})
+register_collector("executors", executors.snapshot)
@@ -0,0 +1,141 @@
+# backend/utils/http_pools.py
+import logging
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+from backend.config import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_POOL_TIMEOUT,
+    HTTP2_ENABLED,
+)
+from backend.utils.metrics import register_collector
+
+logger = logging.getLogger("backend.http_pools")
+
+# Outbound providers that get their own keep-alive pool, with their default read timeout
+PROVIDERS: Dict[str, Dict[str, Any]] = {
+    "huggingface": {"timeout": 60.0},
+}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (httpx needs it for http2=True)
+        return True
+    except ImportError:
+        return False
+
+
+class ProviderPool:
+    """One pooled httpx.AsyncClient for a provider, plus connection reuse counters."""
+
+    def __init__(self, name: str, timeout: float = 30.0):
+        self.name = name
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        )
+        self.http2 = HTTP2_ENABLED and _http2_available()
+        if HTTP2_ENABLED and not self.http2:
+            logger.warning(f"HTTP2_ENABLED is set but 'h2' is not installed; {name} pool uses HTTP/1.1.")
+        self.requests = 0
+        self.connections_opened = 0
+        self.errors = 0
+        self.client: Optional[httpx.AsyncClient] = None
+
+    def open(self) -> httpx.AsyncClient:
+        if self.client is None or self.client.is_closed:
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, pool=HTTP_POOL_TIMEOUT),
+                limits=self.limits,
+                http2=self.http2,
+                event_hooks={"request": [self._on_request], "response": [self._on_response]},
+            )
+            logger.info(f"HTTP pool '{self.name}' opened (http2={self.http2}, max_connections={self.limits.max_connections}).")
+        return self.client
+
+    async def aclose(self) -> None:
+        if self.client is not None and not self.client.is_closed:
+            await self.client.aclose()
+            logger.info(f"HTTP pool '{self.name}' closed.")
+        self.client = None
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        self.requests += 1
+        # httpcore reports connection lifecycle events through the "trace" extension
+        request.extensions["trace"] = self._trace
+
+    async def _on_response(self, response: httpx.Response) -> None:
+        if response.status_code >= 500:
+            self.errors += 1
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        open_connections = idle_connections = 0
+        # The connection list lives on httpcore's pool; read it defensively
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        for connection in getattr(pool, "connections", []) or []:
+            open_connections += 1
+            if connection.is_idle():
+                idle_connections += 1
+        reused = max(0, self.requests - self.connections_opened)
+        return {
+            "open": self.client is not None and not self.client.is_closed,
+            "http2": self.http2,
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "reuse_ratio": round(reused / self.requests, 3) if self.requests else 0.0,
+            "errors_5xx": self.errors,
+            "connections": {
+                "open": open_connections,
+                "idle": idle_connections,
+                "active": open_connections - idle_connections,
+                "max": self.limits.max_connections,
+                "max_keepalive": self.limits.max_keepalive_connections,
+            },
+        }
+
+
+class HTTPPoolRegistry:
+    """Creates provider pools in the app lifespan and closes them on shutdown."""
+
+    def __init__(self, providers: Dict[str, Dict[str, Any]]):
+        self.pools: Dict[str, ProviderPool] = {
+            name: ProviderPool(name, **options) for name, options in providers.items()
+        }
+
+    async def startup(self) -> None:
+        for pool in self.pools.values():
+            pool.open()
+
+    async def aclose(self) -> None:
+        for pool in self.pools.values():
+            await pool.aclose()
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Returns the provider's shared client (opened lazily if used outside the lifespan)."""
+        if name not in self.pools:
+            raise KeyError(f"Unknown HTTP provider pool: {name}")
+        return self.pools[name].open()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: pool.snapshot() for name, pool in self.pools.items()}
+
+
+http_pools = HTTPPoolRegistry(PROVIDERS)
+register_collector("http_pools", http_pools.snapshot)
+
+
+def provider_http_client(name: str) -> Callable[[], httpx.AsyncClient]:
+    """FastAPI dependency factory: `client = Depends(provider_http_client("huggingface"))`."""
+    def dependency() -> httpx.AsyncClient:
+        return http_pools.get(name)
+    return dependency
@@ -0,0 +1,25 @@
+# backend/utils/metrics.py
+import logging
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger("backend.metrics")
+
+# name -> zero-arg callable returning a JSON-serializable snapshot
+_collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_collector(name: str, collector: Callable[[], Dict[str, Any]]) -> None:
+    """Registers a snapshot function exposed under `name` on /api/metrics."""
+    _collectors[name] = collector
+
+
+def collect_metrics() -> Dict[str, Any]:
+    """Returns a snapshot from every registered collector."""
+    snapshot: Dict[str, Any] = {}
+    for name, collector in list(_collectors.items()):
+        try:
+            snapshot[name] = collector()
+        except Exception as e:
+            logger.error(f"Metrics collector '{name}' failed: {e}")
+            snapshot[name] = {"error": str(e)}
+    return snapshot
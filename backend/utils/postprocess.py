@@ -0,0 +1,146 @@
+# backend/utils/postprocess.py
+import re
+from typing import Iterable, List, Optional
+
+# A Markdown code fence: a run of three or more backticks
+_FENCE_RE = re.compile(r"`{3,}")
+
+
+def emotion_footer(emotion: str) -> str:
+    """The emotion-aware Markdown appended to a reply ('' for emotions without one)."""
+    emotion = (emotion or "neutral").lower()
+    if "stressed" in emotion or "anxious" in emotion or "fearful" in emotion:
+        return "\n\n💡 **Tip**: Don't let anxiety take over. Debugging is a skill of patience. You got this!"
+    elif "sad" in emotion:
+        return "\n\n💫 **Keep Going**: Small wins add up. Celebrate the next time a single line of code works!"
+    elif "confused" in emotion:
+        return "\n\n🤔 **Need Clarity?**: Just ask me to re-explain the last concept using a different example."
+    elif "happy" in emotion:
+        return " 🎉"
+    return ""
+
+
+class TextAccumulator:
+    """
+    Append-only text built from streamed chunks. Appending is O(1); the
+    joined string is only built when text() is called, and then cached.
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._length = 0
+
+    def append(self, chunk: str) -> None:
+        if chunk:
+            self._parts.append(chunk)
+            self._length += len(chunk)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def text(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+
+class StreamStage:
+    """
+    One incremental post-processing step. feed() sees each chunk and returns
+    what to emit in its place; finish() returns text to append at the end.
+    Stages keep O(1) state per chunk; one that really needs the whole reply
+    can call `text.text()` in finish().
+    """
+
+    def feed(self, chunk: str) -> str:
+        return chunk
+
+    def finish(self, text: TextAccumulator) -> str:
+        return ""
+
+
+class CodeFenceBalancer(StreamStage):
+    """Closes a ``` code block left open at the end of the reply (e.g. a cut-off answer)."""
+
+    def __init__(self):
+        self.open = False
+        self._ticks = 0     # Backticks at the end of the text so far (a fence may span chunks)
+        self._last = ""     # Last character seen
+
+    def feed(self, chunk: str) -> str:
+        if not chunk:
+            return chunk
+        stripped = chunk.rstrip("`")
+        trailing = len(chunk) - len(stripped)
+        if not stripped:
+            self._ticks += trailing
+        else:
+            leading = len(stripped) - len(stripped.lstrip("`"))
+            if self._ticks + leading >= 3:
+                self.open = not self.open
+            # Fences fully inside this chunk (the leading run was handled above)
+            for _ in _FENCE_RE.finditer(stripped, leading):
+                self.open = not self.open
+            self._ticks = trailing
+        self._last = chunk[-1]
+        return chunk
+
+    def finish(self, text: TextAccumulator) -> str:
+        if self._ticks >= 3:
+            self.open = not self.open
+            self._ticks = 0
+        if not self.open:
+            return ""
+        self.open = False
+        return "```" if self._last == "\n" else "\n```"
+
+
+class EmotionFooterStage(StreamStage):
+    """Appends the emotion footer once the reply is complete."""
+
+    def __init__(self, emotion: str):
+        self.footer = emotion_footer(emotion)
+
+    def finish(self, text: TextAccumulator) -> str:
+        return self.footer
+
+
+def default_stages(emotion: str) -> List[StreamStage]:
+    # Fences are closed first so the footer lands outside any code block
+    return [CodeFenceBalancer(), EmotionFooterStage(emotion)]
+
+
+class StreamPipeline:
+    """
+    Runs chunks through a chain of stages. `text()` is the raw input (what
+    gets cached); the emitted output is the processed chunks plus finish().
+    """
+
+    def __init__(self, stages: Optional[Iterable[StreamStage]] = None):
+        self.stages = list(stages or [])
+        self.raw = TextAccumulator()
+
+    def feed(self, chunk: str) -> str:
+        self.raw.append(chunk)
+        for stage in self.stages:
+            chunk = stage.feed(chunk)
+        return chunk
+
+    def finish(self) -> str:
+        """The trailing text; what one stage appends still flows through the stages after it."""
+        tail = []
+        for i, stage in enumerate(self.stages):
+            extra = stage.finish(self.raw)
+            for later in self.stages[i + 1:]:
+                extra = later.feed(extra)
+            tail.append(extra)
+        return "".join(tail)
+
+    def text(self) -> str:
+        return self.raw.text()
+
+
+def postprocess_text(text: str, emotion: str) -> str:
+    """Applies the streaming stages to a complete reply, so JSON replies match streamed ones."""
+    pipeline = StreamPipeline(default_stages(emotion))
+    return pipeline.feed(text) + pipeline.finish()
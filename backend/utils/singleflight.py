@@ -0,0 +1,295 @@
+# backend/utils/singleflight.py
+import asyncio
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from backend.config import (
+    CHAT_ABANDON_GRACE,
+    CHAT_RESUME_TTL,
+    CHAT_RESUME_MAX_BYTES,
+    CHAT_RESUME_MAX_STREAM_BYTES,
+)
+from backend.utils.metrics import register_collector
+
+logger = logging.getLogger("backend.singleflight")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for `key` is running,
+    later callers await the same task instead of starting another one.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def running(self, key: str) -> bool:
+        """Whether a call for `key` is in flight (a call made now would share it)."""
+        return key in self._calls
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Returns (result, shared). `shared` is True if this caller joined an existing call."""
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            # Run detached so one caller disconnecting does not cancel it for the others
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task), shared
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "coalesced": self.followers}
+
+
+class StreamFlight:
+    """
+    One upstream stream fanned out to any number of subscribers.
+    Items are kept for the life of the flight, so late subscribers replay
+    from the start and then follow live.
+
+    `source_factory` receives a `set_result` callback the source may call with
+    its final value (e.g. the full completion text); every callback added with
+    `add_result_callback` gets that value, including ones added later.
+
+    When the last subscriber leaves before the upstream finishes, the flight
+    keeps running for `abandon_grace` seconds, so a client reconnecting with
+    its `generation` id can resume it; if nobody has subscribed again by then,
+    it is abandoned and the upstream cancelled.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        source_factory: Callable[[Callable[[Any], None]], AsyncIterator[Any]],
+        abandon_grace: float = CHAT_ABANDON_GRACE,
+    ):
+        self.key = key
+        self.generation = secrets.token_urlsafe(9)
+        self.items: List[Any] = []
+        self.size_bytes = 0
+        self.finished_at: Optional[float] = None
+        self.done = False
+        self.abandoned = False
+        self.cancelled = False
+        self.result: Any = None
+        self.has_result = False
+        self.subscribers = 0
+        # Callers (usage keys) that joined this flight; only they may resume it by generation id
+        self.owners: Set[str] = set()
+        self.abandon_grace = abandon_grace
+        self._abandon_timer: Optional[asyncio.TimerHandle] = None
+        self._result_callbacks: List[Callable[[Any], None]] = []
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(source_factory(self._set_result)))
+
+    def _set_result(self, result: Any) -> None:
+        self.result, self.has_result = result, True
+        for callback in self._result_callbacks:
+            self._run_callback(callback)
+        self._result_callbacks.clear()
+
+    def add_result_callback(self, callback: Callable[[Any], None]) -> None:
+        if self.has_result:
+            self._run_callback(callback)
+        elif not self.done:
+            self._result_callbacks.append(callback)
+
+    def _run_callback(self, callback: Callable[[Any], None]) -> None:
+        try:
+            callback(self.result)
+        except Exception as e:
+            logger.error(f"Result callback for flight {self.key[:12]} failed: {e}", exc_info=True)
+
+    def _notify(self) -> None:
+        # Swap in a fresh event so waiters wake once per change
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def wake(self) -> None:
+        """Wakes waiting subscribers so they re-check their `stop` condition."""
+        self._notify()
+
+    @property
+    def idle(self) -> bool:
+        """No subscribers since the last one left; cancelled once the grace period runs out."""
+        return self._abandon_timer is not None
+
+    @property
+    def joinable(self) -> bool:
+        """Still producing items a new subscriber can follow."""
+        return not self.done and not self.cancelled
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        self.task.cancel()
+
+    def _abandon_if_idle(self) -> None:
+        self._abandon_timer = None
+        if self.subscribers > 0 or self.done:
+            return
+        logger.info(f"No subscribers left for flight {self.key[:12]}; cancelling upstream.")
+        self.abandoned = True
+        self.cancel()
+
+    async def _pump(self, source: AsyncIterator[Any]) -> None:
+        try:
+            async for item in source:
+                self.items.append(item)
+                if isinstance(item, (str, bytes)):
+                    self.size_bytes += len(item)
+                self._notify()
+        except Exception as e:
+            logger.error(f"Upstream stream for flight {self.key[:12]} failed: {e}", exc_info=True)
+        finally:
+            self.done = True
+            self.finished_at = time.monotonic()
+            self._result_callbacks.clear()
+            self._notify()
+
+    async def subscribe(self, start: int = 0, stop: Optional[Callable[[], bool]] = None) -> AsyncIterator[Any]:
+        """
+        Yields items from index `start`, waiting for new ones until the upstream
+        finishes or `stop()` is true (checked whenever the flight wakes).
+        """
+        self.subscribers += 1
+        if self._abandon_timer is not None:
+            self._abandon_timer.cancel()
+            self._abandon_timer = None
+        try:
+            index = start
+            while True:
+                while index < len(self.items):
+                    yield self.items[index]
+                    index += 1
+                if self.done or (stop is not None and stop()):
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done and self._abandon_timer is None:
+                self._abandon_timer = asyncio.get_event_loop().call_later(self.abandon_grace, self._abandon_if_idle)
+
+
+class StreamFlightGroup:
+    """
+    Registry of in-flight StreamFlights keyed by request identity, plus a
+    replay buffer by generation id: finished flights stay resumable for
+    `retain_ttl` seconds. Every buffer, running ones included, counts toward
+    `retain_max_bytes`; over it, the oldest finished buffers go first, then
+    running flights nobody is subscribed to (cancelled).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        retain_ttl: float = CHAT_RESUME_TTL,
+        retain_max_bytes: int = CHAT_RESUME_MAX_BYTES,
+        retain_max_stream_bytes: int = CHAT_RESUME_MAX_STREAM_BYTES,
+    ):
+        self.name = name
+        self.retain_ttl = retain_ttl
+        self.retain_max_bytes = retain_max_bytes
+        self.retain_max_stream_bytes = retain_max_stream_bytes
+        self._flights: Dict[str, StreamFlight] = {}
+        self._generations: "OrderedDict[str, StreamFlight]" = OrderedDict()
+        self.leaders = 0
+        self.followers = 0
+        self.abandoned = 0
+        self.resumed = 0
+        self.evicted = 0
+
+    def get(self, key: str) -> Optional[StreamFlight]:
+        return self._flights.get(key)
+
+    def join(
+        self,
+        key: str,
+        source_factory: Callable[[Callable[[Any], None]], AsyncIterator[Any]],
+        owner: str = "anonymous",
+    ) -> Tuple[StreamFlight, bool]:
+        """Returns (flight, leader). Starts the upstream only if no flight for `key` is running."""
+        flight = self._flights.get(key)
+        if flight is not None and flight.joinable:
+            self.followers += 1
+            flight.owners.add(owner)
+            return flight, False
+        self.leaders += 1
+        flight = StreamFlight(key, source_factory)
+        flight.owners.add(owner)
+        self._flights[key] = flight
+        self._generations[flight.generation] = flight
+        flight.task.add_done_callback(lambda _: self._discard(key, flight))
+        self._evict()
+        return flight, True
+
+    def resume(self, generation: str, owner: str = "anonymous") -> Optional[StreamFlight]:
+        """The flight (running or finished) for `generation`, if it is still buffered and `owner` joined it."""
+        self._evict()
+        flight = self._generations.get(generation)
+        if flight is None or owner not in flight.owners:
+            return None
+        self.resumed += 1
+        return flight
+
+    def _discard(self, key: str, flight: StreamFlight) -> None:
+        if flight.cancelled:
+            self.abandoned += 1
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # A cut-off stream cannot be resumed meaningfully, and oversized ones are not kept
+        if flight.cancelled or flight.size_bytes > self.retain_max_stream_bytes:
+            self._generations.pop(flight.generation, None)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for generation, flight in list(self._generations.items()):
+            if flight.done and now - flight.finished_at > self.retain_ttl:
+                del self._generations[generation]
+                self.evicted += 1
+        # Over the byte cap: drop the oldest finished buffers, then cancel unwatched running flights
+        total = self.buffered_bytes()
+        for evictable in (lambda f: f.done, lambda f: f.idle):
+            for generation, flight in list(self._generations.items()):
+                if total <= self.retain_max_bytes:
+                    return
+                if evictable(flight):
+                    del self._generations[generation]
+                    total -= flight.size_bytes
+                    self.evicted += 1
+                    if not flight.done:
+                        flight.cancel()
+
+    def buffered_bytes(self) -> int:
+        return sum(f.size_bytes for f in self._generations.values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._flights),
+            "subscribers": sum(f.subscribers for f in self._flights.values()),
+            "leaders": self.leaders,
+            "coalesced": self.followers,
+            "abandoned": self.abandoned,
+            "resumable": len(self._generations),
+            "buffered_bytes": self.buffered_bytes(),
+            "resumed": self.resumed,
+            "evicted": self.evicted,
+        }
+
+
+# Shared groups for /api/chat (JSON replies and SSE streams)
+chat_flights = SingleFlight("chat")
+chat_stream_flights = StreamFlightGroup("chat_stream")
+register_collector("singleflight", lambda: {
+    "chat": chat_flights.snapshot(),
+    "chat_stream": chat_stream_flights.snapshot(),
+})
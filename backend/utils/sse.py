@@ -0,0 +1,181 @@
+# backend/utils/sse.py
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+from backend.config import SSE_COALESCE_WINDOW, SSE_MAX_FRAME_BYTES, SSE_HEARTBEAT_SECONDS
+from backend.utils.metrics import register_collector
+
+logger = logging.getLogger("backend.sse")
+
+try:
+    import orjson
+
+    def _dumps(event: Dict[str, Any]) -> str:
+        return orjson.dumps(event).decode()
+except ImportError:
+    def _dumps(event: Dict[str, Any]) -> str:
+        return json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+
+# Stop proxies (nginx) from buffering the stream and caches from storing it
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+HEARTBEAT_FRAME = ": ping\n\n"
+
+
+def encode_event(event: Dict[str, Any]) -> str:
+    return f"data: {_dumps(event)}\n\n"
+
+
+async def stamp_event_ids(frames: AsyncIterator[str], generation: str, start: int = 0) -> AsyncIterator[str]:
+    """
+    Adds an `id: <generation>:<index>` line to each data frame, where index is
+    the frame's position in the generation (comments count too but get no id).
+    A client reconnecting with that id as Last-Event-ID resumes at index + 1.
+    """
+    index = start
+    try:
+        async for frame in frames:
+            yield f"id: {generation}:{index}\n{frame}" if frame.startswith("data:") else frame
+            index += 1
+    finally:
+        await frames.aclose()
+
+
+def parse_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """'<generation>:<index>' -> (generation, index of the next frame), or None if malformed."""
+    generation, _, index = (value or "").strip().rpartition(":")
+    if not generation or not index.isdigit():
+        return None
+    return generation, int(index) + 1
+
+
+def _is_delta(event: Dict[str, Any]) -> bool:
+    # Plain {"content", "done": False} chunks can be merged; anything carrying metadata cannot
+    return event.get("done") is False and len(event) == 2
+
+
+class _SSEStats:
+    def __init__(self):
+        self.streams = 0
+        self.events_in = 0
+        self.frames_out = 0
+        self.heartbeats = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "streams": self.streams,
+            "events_in": self.events_in,
+            "frames_out": self.frames_out,
+            "events_per_frame": round(self.events_in / self.frames_out, 2) if self.frames_out else 0.0,
+            "heartbeats": self.heartbeats,
+        }
+
+
+sse_stats = _SSEStats()
+register_collector("sse", sse_stats.snapshot)
+
+
+async def coalesce_events(
+    events: AsyncIterator[Dict[str, Any]],
+    window: float = SSE_COALESCE_WINDOW,
+    max_bytes: int = SSE_MAX_FRAME_BYTES,
+    heartbeat: Optional[float] = SSE_HEARTBEAT_SECONDS,
+) -> AsyncIterator[str]:
+    """
+    Turns a stream of chat event dicts into encoded SSE frames. Content deltas
+    arriving within `window` seconds of each other (up to `max_bytes`) are
+    merged into one event, so the client sees the same event format with far
+    fewer writes. Non-delta events (done, errors) are sent as-is, in order.
+    A `: ping` comment goes out after `heartbeat` idle seconds.
+
+    A producer task drains `events` into a buffer; this generator waits on a
+    single future that the producer or a timer resolves, so gathering a
+    frame costs one timer rather than a wakeup per delta.
+    """
+    loop = asyncio.get_event_loop()
+    buffer: Deque[Dict[str, Any]] = deque()
+    finished = False
+    error: Optional[BaseException] = None
+    waiter: Optional[asyncio.Future] = None
+    room: Optional[int] = None  # Space left in the frame being gathered, None when idle
+
+    def wake(value: bool) -> None:
+        if waiter is not None and not waiter.done():
+            waiter.set_result(value)
+
+    async def wait(timeout: Optional[float]) -> bool:
+        """True if the producer signalled, False on timeout."""
+        nonlocal waiter
+        waiter = loop.create_future()
+        timer = loop.call_later(timeout, wake, False) if timeout is not None else None
+        try:
+            return await waiter
+        finally:
+            waiter = None
+            if timer is not None:
+                timer.cancel()
+
+    async def produce() -> None:
+        nonlocal finished, error, room
+        try:
+            async for event in events:
+                buffer.append(event)
+                # While a frame is being gathered, only wake the consumer once it is full
+                # or something other than a delta arrives; otherwise the window timer does.
+                if room is not None and _is_delta(event):
+                    room -= len(event["content"])
+                    if room > 0:
+                        continue
+                wake(True)
+        except Exception as e:
+            error = e
+        finally:
+            finished = True
+            wake(True)
+
+    sse_stats.streams += 1
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            if not buffer:
+                if finished:
+                    break
+                if not await wait(heartbeat):
+                    sse_stats.heartbeats += 1
+                    yield HEARTBEAT_FRAME
+                continue
+
+            event = buffer.popleft()
+            sse_stats.events_in += 1
+            if not _is_delta(event):
+                sse_stats.frames_out += 1
+                yield encode_event(event)
+                continue
+
+            parts = [event["content"]]
+            size = len(event["content"])
+            deadline = loop.time() + window
+            while size < max_bytes:
+                while buffer and _is_delta(buffer[0]) and size < max_bytes:
+                    content = buffer.popleft()["content"]
+                    sse_stats.events_in += 1
+                    parts.append(content)
+                    size += len(content)
+                # Flush early if a non-delta is next or the upstream is done
+                remaining = deadline - loop.time()
+                if buffer or finished or remaining <= 0:
+                    break
+                room = max_bytes - size
+                try:
+                    await wait(remaining)
+                finally:
+                    room = None
+            sse_stats.frames_out += 1
+            yield encode_event({"content": "".join(parts), "done": False})
+
+        if error is not None:
+            raise error
+    finally:
+        producer.cancel()
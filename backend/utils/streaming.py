@@ -0,0 +1,138 @@
+# backend/utils/streaming.py
+import asyncio
+import concurrent.futures
+import inspect
+import logging
+import threading
+from typing import Any, AsyncIterator, Callable, Iterable, List, Optional
+
+logger = logging.getLogger("backend.streaming")
+
+# Marker objects passed from the pump thread to the event loop
+_DONE = object()
+
+
+class _PumpError:
+    """Wraps an exception raised inside the pump thread."""
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+async def iterate_in_executor(
+    factory: Callable[[], Iterable[Any]],
+    executor: Optional[concurrent.futures.Executor] = None,
+    maxsize: int = 64,
+) -> AsyncIterator[Any]:
+    """
+    Consume a blocking iterator without blocking the event loop.
+
+    `factory` is called in the executor and every `next()` on the returned
+    iterator happens there too. Items are handed back through an asyncio.Queue
+    and at most `maxsize` may be in flight, so a slow consumer applies
+    backpressure to the thread instead of buffering the whole stream.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    # Credits bound how far the thread may run ahead of the consumer
+    credits = threading.Semaphore(max(1, maxsize))
+    stop = threading.Event()
+
+    def put(item: Any) -> bool:
+        while not credits.acquire(timeout=0.5):
+            if stop.is_set():
+                return False
+        if stop.is_set():
+            return False
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:  # Event loop already closed
+            return False
+        return True
+
+    def pump():
+        iterator = None
+        try:
+            iterator = factory()
+            for item in iterator:
+                if stop.is_set() or not put(item):
+                    break
+        except BaseException as e:
+            put(_PumpError(e))
+        finally:
+            # Release the upstream connection (e.g. Groq's Stream) as soon as we stop reading
+            close = getattr(iterator, "close", None)
+            if stop.is_set() and callable(close):
+                try:
+                    close()
+                except Exception as close_error:
+                    logger.debug(f"Error closing upstream iterator: {close_error}")
+            if not stop.is_set():
+                try:
+                    loop.call_soon_threadsafe(queue.put_nowait, _DONE)
+                except RuntimeError:
+                    pass
+
+    loop.run_in_executor(executor, pump)
+    try:
+        while True:
+            item = await queue.get()
+            credits.release()
+            if item is _DONE:
+                break
+            if isinstance(item, _PumpError):
+                raise item.error
+            yield item
+    finally:
+        # Tells the pump to stop reading and close the upstream iterator
+        stop.set()
+
+
+def is_async_client(client: Any) -> bool:
+    """True if `client.chat.completions.create` is a coroutine function (e.g. AsyncGroq)."""
+    try:
+        return inspect.iscoroutinefunction(client.chat.completions.create)
+    except AttributeError:
+        return False
+
+
+def _chunk_content(chunk: Any) -> Optional[str]:
+    choices: List[Any] = getattr(chunk, "choices", None) or []
+    if not choices:
+        return None
+    return choices[0].delta.content
+
+
+async def stream_completion(
+    client: Any,
+    executor: Optional[concurrent.futures.Executor] = None,
+    **create_kwargs: Any,
+) -> AsyncIterator[str]:
+    """
+    Yield content deltas of a streamed chat completion.
+
+    Async clients (AsyncGroq) are iterated natively. Sync clients are pumped
+    through `iterate_in_executor`, so network reads never run on the loop.
+    """
+    create_kwargs["stream"] = True
+    if is_async_client(client):
+        stream = await client.chat.completions.create(**create_kwargs)
+        try:
+            async for chunk in stream:
+                content = _chunk_content(chunk)
+                if content is not None:
+                    yield content
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+        return
+
+    def open_stream():
+        return client.chat.completions.create(**create_kwargs)
+
+    async for chunk in iterate_in_executor(open_stream, executor):
+        content = _chunk_content(chunk)
+        if content is not None:
+            yield content
@@ -0,0 +1,78 @@
+# experiments/bench_emotion_stream.py
+"""
+How many browser cameras one worker can serve over /api/ws/emotion.
+Runs N services.emotion_stream.EmotionStream pipelines in-process (no
+sockets), each fed JPEG frames at --client-fps, all sharing the vision pool
+exactly as the endpoint does.
+
+    python -m experiments.bench_emotion_stream --image face.jpg
+    python -m experiments.bench_emotion_stream --image face.jpg --clients 1 10 50 --client-fps 15
+
+Reports results/sec across all clients, the share of frames dropped as
+stale, and median / p95 latency from frame arrival to result.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import cv2
+
+from backend.services.emotion_stream import EmotionStream
+
+
+def load_jpeg(path: str, width: int) -> bytes:
+    image = cv2.imread(path)
+    if image is None:
+        raise SystemExit(f"Cannot read {path}")
+    image = cv2.resize(image, (width, int(width * image.shape[0] / image.shape[1])))
+    _, buffer = cv2.imencode(".jpg", image, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+    return buffer.tobytes()
+
+
+async def client(jpeg: bytes, args, latencies):
+    async def send(result):
+        if result["type"] == "emotion":
+            latencies.append(result["latency_ms"])
+
+    stream = EmotionStream(send, args.gamma)
+    worker = asyncio.ensure_future(stream.run())
+    deadline = time.monotonic() + args.seconds
+    while time.monotonic() < deadline:
+        stream.submit(jpeg)
+        await asyncio.sleep(1 / args.client_fps)
+    worker.cancel()
+    await asyncio.gather(worker, return_exceptions=True)
+    return stream.received, stream.dropped
+
+
+async def run(clients, jpeg, args):
+    latencies = []
+    results = await asyncio.gather(*[client(jpeg, args, latencies) for _ in range(clients)])
+    received = sum(r for r, _ in results)
+    dropped = sum(d for _, d in results)
+    return latencies, received, dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", required=True, help="Face photo sent as every frame")
+    parser.add_argument("--width", type=int, default=640, help="Frame width the client sends")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--client-fps", type=float, default=10.0)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--gamma", type=float, default=1.2)
+    args = parser.parse_args()
+
+    jpeg = load_jpeg(args.image, args.width)
+    print(f"{len(jpeg)} byte frames at {args.client_fps:g} fps per client")
+    print(f"{'clients':>7} {'results/s':>10} {'dropped':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for clients in args.clients:
+        latencies, received, dropped = asyncio.run(run(clients, jpeg, args))
+        p50 = statistics.median(latencies) if latencies else 0.0
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else p50
+        print(f"{clients:>7} {len(latencies) / args.seconds:>10.1f} {dropped / max(received, 1):>8.0%} {p50:>8.1f} {p95:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# experiments/bench_face_backends.py
+"""
+Face analysis throughput with the thread backend (vision thread pool) vs the
+process backend (services.face_workers.FaceProcessPool, frames handed over
+through shared memory), for 1, 4 and 16 concurrent streams.
+
+    python -m experiments.bench_face_backends
+    python -m experiments.bench_face_backends --image face.jpg --workers 4 --streams 1 4 16
+
+Each stream analyzes frames back to back. Both backends get --workers
+workers. Alongside frames/sec, a ticker measures event-loop lag (how late a
+5 ms sleep wakes up): that is what GIL contention costs every other request
+served by the same worker.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from backend.services.face_workers import FaceProcessPool, _analyze
+
+
+def load_frame(args) -> np.ndarray:
+    if args.image:
+        image = cv2.imread(args.image)
+        if image is None:
+            raise SystemExit(f"Cannot read {args.image}")
+        return cv2.resize(image, (640, int(640 * image.shape[0] / image.shape[1])))
+    return np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+
+
+async def loop_lag(stop: asyncio.Event, lags):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lags.append(1000 * (time.perf_counter() - started - 0.005))
+
+
+async def run(mode, streams, frame, args):
+    loop = asyncio.get_running_loop()
+    if mode == "thread":
+        pool = ThreadPoolExecutor(args.workers)
+
+        async def analyze():
+            return await loop.run_in_executor(pool, _analyze, frame, args.gamma, False)
+    else:
+        pool = FaceProcessPool(workers=args.workers, slot_bytes=frame.nbytes)
+        await pool.start()
+
+        async def analyze():
+            return await pool.analyze(frame, args.gamma)
+
+        await asyncio.gather(*[analyze() for _ in range(args.workers)])  # Warm up the workers
+
+    done = [0]
+    deadline = time.monotonic() + args.seconds
+
+    async def stream():
+        while time.monotonic() < deadline:
+            await analyze()
+            done[0] += 1
+
+    stop, lags = asyncio.Event(), []
+    ticker = asyncio.ensure_future(loop_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*[stream() for _ in range(streams)])
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    if mode == "thread":
+        pool.shutdown()
+    else:
+        await pool.stop()
+    p95 = statistics.quantiles(lags, n=20)[-1] if len(lags) > 1 else 0.0
+    return done[0] / elapsed, statistics.median(lags) if lags else 0.0, p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="Face photo (default: 640x480 noise)")
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--gamma", type=float, default=1.2)
+    args = parser.parse_args()
+
+    frame = load_frame(args)
+    print(f"{frame.shape[1]}x{frame.shape[0]} frames, {args.workers} workers per backend")
+    print(f"{'backend':<8} {'streams':>7} {'frames/s':>9} {'lag p50 ms':>11} {'lag p95 ms':>11}")
+    for streams in args.streams:
+        for mode in ("thread", "process"):
+            fps, lag50, lag95 = asyncio.run(run(mode, streams, frame, args))
+            print(f"{mode:<8} {streams:>7} {fps:>9.1f} {lag50:>11.2f} {lag95:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# experiments/bench_face_tracking.py
+"""
+Face pipeline throughput: full Haar detection on every frame (today's path)
+vs detect-then-track (services.face_services.FaceTracker).
+
+Frames are loaded into memory first, so only processing is timed. Use a
+recorded clip, a webcam, or one face photo moved around synthetically:
+
+    python -m experiments.bench_face_tracking --image face.jpg
+    python -m experiments.bench_face_tracking --video clip.mp4 --frames 300
+    python -m experiments.bench_face_tracking --camera 0 --redetect-every 15
+
+Modes:
+  detect - detect_emotions_from_array on every frame
+  track  - FaceTracker.process: full scan every N frames or on track loss, template matching between
+
+Reports frames/sec, CPU% (process CPU time / wall time; >100% means several
+cores busy in OpenCV), and how often each mode found the same number of
+faces as the detect path.
+"""
+import argparse
+import math
+import time
+
+import cv2
+import numpy as np
+
+from backend.services.face_services import FaceTracker, detect_emotions_from_array
+
+
+def load_frames(args):
+    if args.image:
+        face = cv2.imread(args.image)
+        if face is None:
+            raise SystemExit(f"Cannot read {args.image}")
+        face = cv2.resize(face, (200, int(200 * face.shape[0] / face.shape[1])))
+        frames = []
+        for i in range(args.frames):
+            canvas = np.full((480, 640, 3), 90, dtype=np.uint8)
+            # Drift slowly around the frame, like someone shifting in their chair
+            x = int(220 + 120 * math.sin(i / 25))
+            y = int(120 + 60 * math.cos(i / 40))
+            h, w = face.shape[:2]
+            canvas[y:y + h, x:x + w] = face[: 480 - y, : 640 - x]
+            frames.append(canvas)
+        return frames
+    cap = cv2.VideoCapture(args.video if args.video else args.camera)
+    frames = []
+    while len(frames) < args.frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise SystemExit("No frames read from the video source")
+    return frames
+
+
+def run(mode, frames, args):
+    tracker = FaceTracker(redetect_every=args.redetect_every) if mode == "track" else None
+    counts = []
+    cpu, wall = time.process_time(), time.perf_counter()
+    for frame in frames:
+        faces = tracker.process(frame, args.gamma) if tracker else detect_emotions_from_array(frame, args.gamma)
+        counts.append(len(faces))
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return len(frames) / wall, 100 * cpu / wall, counts, tracker.stats if tracker else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--image", help="Face photo, moved around on a synthetic background")
+    source.add_argument("--video", help="Video file")
+    source.add_argument("--camera", type=int, help="Webcam index")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--redetect-every", type=int, default=10)
+    parser.add_argument("--gamma", type=float, default=1.2)
+    args = parser.parse_args()
+
+    frames = load_frames(args)
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}")
+    print(f"{'mode':<7} {'fps':>8} {'cpu%':>7} {'agree':>7}  detail")
+    baseline = None
+    for mode in ("detect", "track"):
+        fps, cpu, counts, stats = run(mode, frames, args)
+        baseline = baseline or counts
+        agree = sum(a == b for a, b in zip(counts, baseline)) / len(counts)
+        print(f"{mode:<7} {fps:>8.1f} {cpu:>7.0f} {agree:>7.0%}  {stats or ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# experiments/bench_sse_coalescing.py
+"""
+Compare per-delta SSE writes with utils.sse.coalesce_events for chat streams
+from a fast fake provider. Each frame is written to /dev/null with one
+os.write(), like a socket send, so "writes" counts syscalls.
+
+    python -m experiments.bench_sse_coalescing
+    python -m experiments.bench_sse_coalescing --streams 50 --tokens 500 --inter-token 0.002
+
+Modes:
+  source    - just iterate the fake provider (CPU floor, no frames written)
+  per-event - old format: json.dumps + one write per token delta
+  coalesced - deltas merged per time window / byte cap, encoded once per frame
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from backend.utils.sse import coalesce_events
+
+
+async def fake_events(tokens: int, inter_token: float):
+    """Chat events as generate_provider_stream yields them."""
+    for i in range(tokens):
+        if i:
+            await asyncio.sleep(inter_token)
+        yield {"content": f"tok{i} ", "done": False}
+    yield {"content": "", "done": True, "provider": "groq", "emotion_used": "neutral"}
+
+
+async def per_event_frames(events):
+    async for event in events:
+        yield f"data: {json.dumps(event)}\n\n"
+
+
+async def one_stream(mode, fd, args):
+    events = fake_events(args.tokens, args.inter_token)
+    if mode == "source":
+        async for _ in events:
+            pass
+        return 0, 0, 0.0
+    frames = per_event_frames(events) if mode == "per-event" else coalesce_events(events, window=args.window, heartbeat=None)
+    writes = 0
+    sent = 0
+    start = time.perf_counter()
+    ttft = None
+    async for frame in frames:
+        data = frame.encode()
+        os.write(fd, data)
+        writes += 1
+        sent += len(data)
+        if ttft is None:
+            ttft = time.perf_counter() - start
+    return writes, sent, ttft
+
+
+async def run(mode, args):
+    fd = os.open(os.devnull, os.O_WRONLY)
+    try:
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        results = await asyncio.gather(*(one_stream(mode, fd, args) for _ in range(args.streams)))
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+    finally:
+        os.close(fd)
+    return {
+        "writes": sum(r[0] for r in results) / args.streams,
+        "bytes": sum(r[1] for r in results) / args.streams,
+        "ttft": max(r[2] for r in results),
+        "cpu_ms": cpu * 1000 / args.streams,
+        "wall": wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=50)
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--inter-token", type=float, default=0.002, help="Fake provider delay between deltas (s)")
+    parser.add_argument("--window", type=float, default=0.03, help="Coalescing window (s)")
+    args = parser.parse_args()
+
+    print(f"{args.streams} concurrent streams x {args.tokens} deltas, {args.inter_token * 1000:.0f}ms apart")
+    print(f"{'mode':<11}{'writes/stream':>14}{'bytes/stream':>14}{'cpu ms/stream':>15}{'ttft max':>10}{'wall':>8}")
+    for mode in ("source", "per-event", "coalesced"):
+        r = asyncio.run(run(mode, args))
+        print(f"{mode:<11}{r['writes']:>14.0f}{r['bytes']:>14.0f}{r['cpu_ms']:>15.2f}{r['ttft']:>10.3f}{r['wall']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# experiments/bench_stream_concurrency.py
+"""
+Benchmark time-to-first-token (TTFT) and per-stream latency of chat streaming
+as concurrency grows, against a local fake provider (no network, no API key).
+
+    python -m experiments.bench_stream_concurrency
+    python -m experiments.bench_stream_concurrency --levels 1 10 50 100 200 --tokens 50
+
+Modes:
+  legacy - old generate_groq_stream: create() in an executor, `for chunk in stream` on the loop
+  bridge - sync client pumped through utils.streaming.iterate_in_executor
+  async  - async client iterated natively by utils.streaming.stream_completion
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from backend.utils.streaming import stream_completion
+
+
+def _chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class FakeSyncClient:
+    """Mimics groq.Groq: every read blocks the calling thread, like a socket read."""
+    def __init__(self, ttft: float, inter_token: float, tokens: int):
+        def create(**kwargs):
+            def gen():
+                time.sleep(ttft)
+                for i in range(tokens):
+                    if i:
+                        time.sleep(inter_token)
+                    yield _chunk(f"tok{i} ")
+            return gen()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+
+class _FakeAsyncCompletions:
+    def __init__(self, ttft: float, inter_token: float, tokens: int):
+        self.ttft, self.inter_token, self.tokens = ttft, inter_token, tokens
+
+    async def create(self, **kwargs):
+        async def gen():
+            await asyncio.sleep(self.ttft)
+            for i in range(self.tokens):
+                if i:
+                    await asyncio.sleep(self.inter_token)
+                yield _chunk(f"tok{i} ")
+        return gen()
+
+
+class FakeAsyncClient:
+    """Mimics groq.AsyncGroq."""
+    def __init__(self, ttft: float, inter_token: float, tokens: int):
+        self.chat = SimpleNamespace(completions=_FakeAsyncCompletions(ttft, inter_token, tokens))
+
+
+async def legacy_stream(client, executor):
+    stream = await asyncio.get_event_loop().run_in_executor(executor, lambda: client.chat.completions.create(stream=True))
+    for chunk in stream:
+        yield chunk.choices[0].delta.content
+        await asyncio.sleep(0.001)
+
+
+async def one_stream(mode, client, executor):
+    start = time.perf_counter()
+    ttft = None
+    source = legacy_stream(client, executor) if mode == "legacy" else stream_completion(client, executor)
+    async for _ in source:
+        if ttft is None:
+            ttft = time.perf_counter() - start
+    return ttft, time.perf_counter() - start
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run_level(mode, concurrency, args):
+    if mode == "async":
+        client = FakeAsyncClient(args.ttft, args.inter_token, args.tokens)
+    else:
+        client = FakeSyncClient(args.ttft, args.inter_token, args.tokens)
+    executor = ThreadPoolExecutor(max_workers=max(concurrency, 4))
+    try:
+        results = await asyncio.gather(*(one_stream(mode, client, executor) for _ in range(concurrency)))
+    finally:
+        executor.shutdown(wait=False)
+    ttfts = [r[0] for r in results]
+    totals = [r[1] for r in results]
+    return {
+        "ttft_p50": statistics.median(ttfts), "ttft_p95": pct(ttfts, 0.95),
+        "total_p50": statistics.median(totals), "total_p95": pct(totals, 0.95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 10, 50, 100, 200])
+    parser.add_argument("--modes", nargs="+", default=["legacy", "bridge", "async"])
+    parser.add_argument("--tokens", type=int, default=40)
+    parser.add_argument("--ttft", type=float, default=0.2, help="Fake provider time to first token (s)")
+    parser.add_argument("--inter-token", type=float, default=0.01, help="Fake provider delay between tokens (s)")
+    args = parser.parse_args()
+
+    ideal = args.ttft + args.inter_token * (args.tokens - 1)
+    print(f"Fake provider: ttft={args.ttft}s, {args.tokens} tokens, ideal stream time={ideal:.2f}s")
+    print(f"{'mode':<8}{'streams':>8}{'ttft p50':>10}{'ttft p95':>10}{'total p50':>11}{'total p95':>11}")
+    for mode in args.modes:
+        for level in args.levels:
+            r = asyncio.run(run_level(mode, level, args))
+            print(f"{mode:<8}{level:>8}{r['ttft_p50']:>10.3f}{r['ttft_p95']:>10.3f}{r['total_p50']:>11.3f}{r['total_p95']:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
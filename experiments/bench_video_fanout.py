@@ -0,0 +1,116 @@
+# experiments/bench_video_fanout.py
+"""
+Cost of serving N /api/video_feed viewers from one synthetic 640x480 camera.
+No webcam needed: a fake device publishes noise frames at --camera-fps.
+
+    python -m experiments.bench_video_fanout
+    python -m experiments.bench_video_fanout --viewers 1 10 25 --seconds 5
+
+Modes:
+  per-viewer - old behaviour: every viewer copies, annotates and encodes each frame itself
+  broadcast  - services.frame_broadcaster: one overlay and one encode per frame, shared
+
+Reports CPU seconds used by the process per wall second, and encodes done.
+"""
+import argparse
+import asyncio
+import time
+
+import cv2
+import numpy as np
+
+from backend.services.camera_capture import Frame
+from backend.services.frame_broadcaster import FrameBroadcaster, encode_jpeg
+
+
+class FakeCamera:
+    """Same consumer interface as services.camera_capture.CaptureDevice."""
+
+    def __init__(self, fps: float):
+        self.fps = fps
+        self.running = True
+        self._frame = None
+        self._changed = asyncio.Event()
+        self._images = [np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(8)]
+
+    async def acquire(self) -> bool:
+        return True
+
+    def release(self) -> None:
+        pass
+
+    async def produce(self):
+        seq = 0
+        while True:
+            await asyncio.sleep(1 / self.fps)
+            seq += 1
+            self._frame = Frame(seq, self._images[seq % len(self._images)], time.time())
+            changed, self._changed = self._changed, asyncio.Event()
+            changed.set()
+
+    async def next_frame(self, after_seq: int = 0, timeout: float = 1.0):
+        while self._frame is None or self._frame.seq <= after_seq:
+            await self._changed.wait()
+        return self._frame
+
+
+def annotate(image):
+    frame = image.copy()
+    cv2.putText(frame, "Status: ACTIVE", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    cv2.rectangle(frame, (10, 440), (200, 470), (0, 255, 0), -1)
+    return frame
+
+
+async def per_viewer(camera, seconds, counter):
+    last_seq = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = await camera.next_frame(last_seq)
+        last_seq = frame.seq
+        _, buffer = cv2.imencode(".jpg", annotate(frame.image))
+        buffer.tobytes()
+        counter[0] += 1
+
+
+async def broadcast_viewer(broadcaster, seconds):
+    deadline = time.monotonic() + seconds
+    frames = broadcaster.subscribe()
+    async for _ in frames:
+        if time.monotonic() >= deadline:
+            break
+    await frames.aclose()
+
+
+async def run(mode, viewers, args):
+    camera = FakeCamera(args.camera_fps)
+    producer = asyncio.ensure_future(camera.produce())
+    broadcaster = FrameBroadcaster(camera, annotate, encode_jpeg, max_fps=args.camera_fps)
+    counter = [0]
+    cpu, wall = time.process_time(), time.perf_counter()
+    if mode == "per-viewer":
+        await asyncio.gather(*[per_viewer(camera, args.seconds, counter) for _ in range(viewers)])
+        encodes = counter[0]
+    else:
+        await asyncio.gather(*[broadcast_viewer(broadcaster, args.seconds) for _ in range(viewers)])
+        encodes = broadcaster.encodes
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    producer.cancel()
+    return cpu / wall, encodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--viewers", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--camera-fps", type=float, default=30.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':<11} {'viewers':>7} {'cpu/wall':>9} {'encodes':>8}")
+    for viewers in args.viewers:
+        for mode in ("per-viewer", "broadcast"):
+            load, encodes = asyncio.run(run(mode, viewers, args))
+            print(f"{mode:<11} {viewers:>7} {load:>9.2f} {encodes:>8}")
+
+
+if __name__ == "__main__":
+    main()
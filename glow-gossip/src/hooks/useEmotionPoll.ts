@@ -1,33 +1,54 @@
 import { useEffect, useState } from "react";
-import { api } from "@/services/api";  // Ensure api has a getEmotionStatus() endpoint
+import { API_BASE_URL, fetchStreamTicket } from "@/services/api";
 
-export function useEmotionPoll(enabled: boolean, interval = 1500) {
+const RECONNECT_DELAY_MS = 2000;
+
+// Server push from /api/emotion/stream: one event per significant change instead of polling
+export function useEmotionPoll(enabled: boolean) {
   const [emotion, setEmotion] = useState("neutral");
 
   useEffect(() => {
     if (!enabled) return;
 
-    let isCancelled = false;
-    const fetchEmotion = async () => {
-      try {
-        const res = await api.getEmotionStatus(); // Should return { emotion: "happy" }
-        if (!isCancelled && res?.emotion) {
-          setEmotion(res.emotion);
-          localStorage.setItem("latest_emotion", res.emotion); // Optional
+    let source: EventSource | null = null;
+    let retry: ReturnType<typeof setTimeout> | undefined;
+    let cancelled = false;
+
+    const connect = async () => {
+      // EventSource cannot send headers, so the URL carries a single-use ticket, never the JWT
+      const ticket = await fetchStreamTicket();
+      if (cancelled) return;
+      const url = `${API_BASE_URL}/emotion/stream${ticket ? `?ticket=${encodeURIComponent(ticket)}` : ""}`;
+      source = new EventSource(url);
+
+      source.onmessage = (event) => {
+        try {
+          const data = JSON.parse(event.data); // { dominant_emotion, score, active, stale }
+          if (data?.dominant_emotion) {
+            setEmotion(data.dominant_emotion);
+            localStorage.setItem("latest_emotion", data.dominant_emotion); // Optional
+          }
+        } catch (err) {
+          console.error("Failed to parse emotion event:", err);
         }
-      } catch (err) {
-        console.error("Failed to fetch emotion:", err);
-      }
+      };
+
+      // The browser's own reconnect reuses the URL, whose ticket is spent (401 closes
+      // the source), so reconnect with a fresh ticket instead
+      source.onerror = () => {
+        source?.close();
+        if (!cancelled) retry = setTimeout(connect, RECONNECT_DELAY_MS);
+      };
     };
 
-    fetchEmotion();
-    const intervalId = setInterval(fetchEmotion, interval);
+    connect();
 
     return () => {
-      isCancelled = true;
-      clearInterval(intervalId);
+      cancelled = true;
+      clearTimeout(retry);
+      source?.close();
     };
-  }, [enabled, interval]);
+  }, [enabled]);
 
   return emotion;
 }
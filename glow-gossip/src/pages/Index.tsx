@@ -15,7 +15,7 @@ import { toast } from 'sonner';
 import { useEmotionPoll } from "@/hooks/useEmotionPoll";
 
 // ✅ Import the ChatMessagePart type for the helper function
-import { api, streamChatMessage, ChatMessagePart } from '@/services/api';
+import { api, streamChatMessage, resetChatSession, ChatMessagePart } from '@/services/api';
 import { getLatestEmotion, setEmotion } from '@/services/emotionStorage';
 
 type EmotionState = 'neutral' | 'happy' | 'sad' | 'angry' | 'surprised' | 'fearful' | 'disgusted';
@@ -261,7 +261,7 @@ const Index = () => {
        }
    };
    const handleLogout = () => { logout(); navigate('/login'); };
-   const clearHistory = () => { setMessages([]); localStorage.removeItem(STORAGE_KEY); toast.success('Chat history cleared'); };
+   const clearHistory = () => { setMessages([]); localStorage.removeItem(STORAGE_KEY); resetChatSession(); toast.success('Chat history cleared'); };
 
 
   // --- JSX Return ---
@@ -151,13 +151,10 @@ class ApiService {
 
   // --- Chat Endpoints (Use /api prefix) ---
   async sendChatMessage(data: ChatRequest): Promise<ApiResponse<ChatResponse>> {
-    // Note: sendChatMessage should also send history, updating interface and call
-     const historyToSend = data.history.map(m => ({ role: m.role, content: m.content }));
-    const response = await fetch(`${API_BASE_URL}/chat`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json', ...this.getAuthHeader() },
-        body: JSON.stringify({ ...data, history: historyToSend, stream: false })
-     });
+    // Goes through the server-side session like streamChatMessage; history is only sent to (re)seed it
+    const historyToSend = data.history.map(m => ({ role: m.role, content: m.content }));
+    const headers = { 'Content-Type': 'application/json', ...this.getAuthHeader() };
+    const response = await postChat(headers, data.message, data.emotion, historyToSend, false);
     return this.handleResponse<ChatResponse>(response);
   }
 
@@ -187,8 +184,93 @@ class ApiService {
 } // End of ApiService class
 
 
+// Splits one SSE event block ("id: ...\ndata: ...") into its id and data fields
+const parseSSEEvent = (block: string): { id?: string; data?: string } => {
+  const event: { id?: string; data?: string } = {};
+  for (const line of block.split("\n")) {
+    if (line.startsWith("data:")) event.data = (event.data ? event.data + "\n" : "") + line.slice(5).trim();
+    else if (line.startsWith("id:")) event.id = line.slice(3).trim();
+  }
+  return event;
+};
+
+const MAX_RESUME_ATTEMPTS = 3;
+
+// --- Server-side chat session ---
+// Each turn sends only the new message plus the session id; the server keeps
+// the history. The local history is sent once, to seed a new session, and
+// again whenever the server answers 404 (session expired or evicted).
+const CHAT_SESSION_KEY = "chat_session_id";
+
+export const resetChatSession = () => localStorage.removeItem(CHAT_SESSION_KEY);
+
+const createChatSession = async (headers: HeadersInit, history: ChatMessagePart[]): Promise<string | null> => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/chat/sessions`, {
+      method: "POST",
+      headers,
+      body: JSON.stringify({ history }),
+    });
+    if (!response.ok) return null;
+    const { session_id } = await response.json();
+    if (session_id) localStorage.setItem(CHAT_SESSION_KEY, session_id);
+    return session_id ?? null;
+  } catch (err) {
+    console.error("Failed to create chat session:", err);
+    return null;
+  }
+};
+
+// POST /api/chat through the session. `history` is the full local history, ending
+// with `message`; without a session (creation failed) it is sent as before.
+const postChat = async (
+  headers: HeadersInit,
+  message: string,
+  emotion: string,
+  history: ChatMessagePart[],
+  stream: boolean
+): Promise<Response> => {
+  const last = history[history.length - 1];
+  const earlier = last && last.role === "user" && last.content === message ? history.slice(0, -1) : history;
+
+  const send = async (): Promise<{ response: Response; sessionId: string | null }> => {
+    const sessionId = localStorage.getItem(CHAT_SESSION_KEY) ?? (await createChatSession(headers, earlier));
+    const body = sessionId ? { message, emotion, session_id: sessionId, stream } : { message, emotion, history, stream };
+    const response = await fetch(`${API_BASE_URL}/chat`, { method: "POST", headers, body: JSON.stringify(body) });
+    return { response, sessionId };
+  };
+
+  const first = await send();
+  if (first.response.status !== 404 || !first.sessionId) return first.response;
+  // The server lost the session: replace it with one seeded from the local history
+  resetChatSession();
+  return (await send()).response;
+};
+
+// Single-use, short-lived ticket for URLs that cannot carry an Authorization
+// header (EventSource, WebSocket); the JWT itself never goes in a URL.
+// Resolves to null when logged out or if the ticket cannot be issued.
+export const fetchStreamTicket = async (): Promise<string | null> => {
+  const token = localStorage.getItem("jwt_token");
+  if (!token) return null;
+  try {
+    const response = await fetch(`${API_BASE_URL}/auth/ticket`, {
+      method: "POST",
+      headers: { Authorization: `Bearer ${token}` },
+    });
+    if (!response.ok) return null;
+    const data = await response.json();
+    return data?.ticket ?? null;
+  } catch (err) {
+    console.error("Failed to fetch stream ticket:", err);
+    return null;
+  }
+};
+
 // --- Updated streamChatMessage() ---
-// Uses unified /api/chat endpoint with stream: true
+// Uses unified /api/chat endpoint with stream: true. If the connection drops
+// mid-answer, it reconnects to /api/chat/resume with Last-Event-ID instead of
+// resending the prompt.
 export const streamChatMessage = async (
   message: string,
   emotion: string = "neutral",
@@ -198,11 +280,7 @@ export const streamChatMessage = async (
   const headers: HeadersInit = { "Content-Type": "application/json" };
   if (token) headers["Authorization"] = `Bearer ${token}`;
 
-  const response = await fetch(`${API_BASE_URL}/chat`, {
-    method: "POST",
-    headers,
-    body: JSON.stringify({ message, emotion, history, stream: true }),
-  });
+  const response = await postChat(headers, message, emotion, history, true);
 
   if (!response.ok || !response.body) {
     const errorText = await response.text();
@@ -218,21 +296,50 @@ export const streamChatMessage = async (
     })();
   }
 
-  const reader = response.body.getReader();
+  let reader = response.body.getReader();
   const decoder = new TextDecoder();
+  let lastEventId: string | null = null;
+
+  // Reopens the stream after the last event received; null if it cannot be resumed
+  const resume = async (): Promise<ReadableStreamDefaultReader<Uint8Array> | null> => {
+    if (!lastEventId) return null;
+    try {
+      const resumeHeaders = new Headers(headers);
+      resumeHeaders.set("Last-Event-ID", lastEventId);
+      const resumed = await fetch(`${API_BASE_URL}/chat/resume`, { headers: resumeHeaders });
+      return resumed.ok && resumed.body ? resumed.body.getReader() : null;
+    } catch {
+      return null;
+    }
+  };
 
   return {
     async *[Symbol.asyncIterator]() {
       let buffer = "";
+      let resumeAttempts = 0;
 
       try {
         while (true) {
-          const { done, value } = await reader.read();
+          let result: ReadableStreamReadResult<Uint8Array>;
+          try {
+            result = await reader.read();
+          } catch (readError) {
+            // Connection dropped mid-answer: continue from the last event received
+            const resumed = resumeAttempts < MAX_RESUME_ATTEMPTS ? await resume() : null;
+            if (!resumed) throw readError;
+            console.warn(`SSE connection dropped; resuming after event ${lastEventId}.`);
+            resumeAttempts++;
+            reader = resumed;
+            buffer = "";
+            continue;
+          }
+          const { done, value } = result;
           if (done) {
             // Handle any final buffered data
-            if (buffer.startsWith("data: ")) {
+            const { data } = parseSSEEvent(buffer);
+            if (data) {
               try {
-                const lastChunk = JSON.parse(buffer.slice(6));
+                const lastChunk = JSON.parse(data);
                 yield lastChunk;
               } catch (e) {
                 console.error("Error parsing final SSE chunk:", e, buffer);
@@ -249,9 +356,8 @@ export const streamChatMessage = async (
           buffer = parts.pop() || ""; // Keep last incomplete piece
 
           for (const part of parts) {
-            if (!part.startsWith("data:")) continue;
-
-            const data = part.slice(5).trim();
+            const { id, data } = parseSSEEvent(part);
+            if (id) lastEventId = id;
             if (!data || data === "[DONE]") continue;
 
             try {
@@ -0,0 +1,124 @@
+# tests/test_admission.py
+import asyncio
+
+import pytest
+
+from backend.utils.admission import (
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_STANDARD,
+    AdmissionController,
+    AdmissionRejected,
+    RoutePolicy,
+)
+
+
+def make_controller(capacity=1, max_queue=10, batch_limit=10, max_wait=5.0) -> AdmissionController:
+    return AdmissionController("test", capacity=capacity, max_queue=max_queue, routes={
+        "chat_stream": RoutePolicy(10, PRIORITY_INTERACTIVE, max_wait),
+        "chat": RoutePolicy(10, PRIORITY_STANDARD, max_wait),
+        "batch": RoutePolicy(batch_limit, PRIORITY_BATCH, max_wait),
+    })
+
+
+async def admit_in_order(controller, routes):
+    """Queues one request per route (in that order) and returns the order they are admitted in."""
+    admitted = []
+
+    async def request(name, route):
+        slot = await controller.acquire(route)
+        admitted.append(name)
+        await asyncio.sleep(0)
+        slot.release()
+
+    tasks = []
+    for name, route in routes:
+        tasks.append(asyncio.ensure_future(request(name, route)))
+        await asyncio.sleep(0)
+    return tasks, admitted
+
+
+def test_waiters_are_served_by_priority_then_fifo():
+    async def scenario():
+        controller = make_controller(capacity=1)
+        holder = await controller.acquire("batch")
+        tasks, admitted = await admit_in_order(controller, [
+            ("batch", "batch"), ("chat-1", "chat"), ("stream", "chat_stream"), ("chat-2", "chat"),
+        ])
+        assert controller.snapshot()["queue_depth"] == 4
+        holder.release()
+        await asyncio.gather(*tasks)
+        return controller, admitted
+
+    controller, admitted = asyncio.run(scenario())
+    assert admitted == ["stream", "chat-1", "chat-2", "batch"]
+    assert controller.snapshot()["in_use"] == 0
+
+
+def test_waiter_at_its_route_limit_does_not_block_others():
+    async def scenario():
+        controller = make_controller(capacity=2, batch_limit=1)
+        batch = await controller.acquire("batch")
+        chat = await controller.acquire("chat")
+        tasks, admitted = await admit_in_order(controller, [("batch-2", "batch"), ("chat-2", "chat")])
+        chat.release()  # Frees a shared slot, but batch is still at its limit
+        await asyncio.sleep(0.01)
+        first = list(admitted)
+        batch.release()
+        await asyncio.gather(*tasks)
+        return first, admitted
+
+    first, admitted = asyncio.run(scenario())
+    assert first == ["chat-2"]
+    assert admitted == ["chat-2", "batch-2"]
+
+
+def test_full_queue_is_rejected_with_429():
+    async def scenario():
+        controller = make_controller(capacity=1, max_queue=1)
+        holder = await controller.acquire("chat")
+        queued = asyncio.ensure_future(controller.acquire("chat"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.acquire("chat_stream")
+        holder.release()
+        (await queued).release()
+        return controller, excinfo.value
+
+    controller, rejected = asyncio.run(scenario())
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert controller.rejected["queue_full"] == 1
+
+
+def test_queue_deadline_rejects_with_503():
+    async def scenario():
+        controller = make_controller(capacity=1, max_wait=0.05)
+        holder = await controller.acquire("chat")
+        with pytest.raises(AdmissionRejected) as excinfo:
+            await controller.acquire("chat")
+        holder.release()
+        return controller, excinfo.value
+
+    controller, rejected = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert controller.rejected["timeout"] == 1
+    assert controller.snapshot()["queue_depth"] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        controller = make_controller(capacity=1)
+        holder = await controller.acquire("chat")
+        waiter = asyncio.ensure_future(controller.acquire("chat"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        depth = controller.snapshot()["queue_depth"]
+        holder.release()
+        holder.release()  # Idempotent
+        return controller, depth
+
+    controller, depth = asyncio.run(scenario())
+    assert depth == 0
+    assert controller.snapshot()["in_use"] == 0
@@ -0,0 +1,52 @@
+# tests/test_auth_tickets.py
+import logging
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from backend.deps import stream_key
+from backend.services import auth_service
+from backend.services.auth_service import create_access_token, create_ticket, decode_access_token, redeem_ticket
+
+
+def test_ticket_is_accepted_once():
+    ticket = create_ticket("42")
+    payload = redeem_ticket(ticket)
+    assert payload["sub"] == "42"
+    assert redeem_ticket(ticket) is None
+
+
+def test_expired_ticket_is_refused():
+    expired = jwt.encode(
+        {"sub": "42", "typ": "ticket", "jti": "x", "exp": 1}, auth_service.JWT_SECRET, algorithm=auth_service.JWT_ALGORITHM,
+    )
+    assert redeem_ticket(expired) is None
+
+
+def test_tickets_and_access_tokens_are_not_interchangeable():
+    assert decode_access_token(create_ticket("42")) is None
+    assert redeem_ticket(create_access_token("42")) is None
+
+
+def test_access_log_drops_query_strings():
+    from backend.main import StripQueryString
+
+    record = logging.LogRecord(
+        "uvicorn.access", logging.INFO, __file__, 1, '%s - "%s %s HTTP/%s" %d',
+        ("127.0.0.1:5000", "GET", "/api/ws?ticket=secret", "1.1", 101), None,
+    )
+    assert StripQueryString().filter(record)
+    assert "secret" not in record.getMessage()
+    assert "/api/ws" in record.getMessage()
+
+
+def test_stream_key_redeems_tickets_and_refuses_spent_ones():
+    request = SimpleNamespace(client=SimpleNamespace(host="10.0.0.1"))
+    ticket = create_ticket("42")
+    assert stream_key(request, ticket=ticket, authorization=None) == "user:42"
+    with pytest.raises(HTTPException) as excinfo:
+        stream_key(request, ticket=ticket, authorization=None)
+    assert excinfo.value.status_code == 401
+    assert stream_key(request, ticket=None, authorization=None) == "ip:10.0.0.1"
@@ -0,0 +1,121 @@
+# tests/test_camera_capture.py
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from backend.services import camera_capture
+from backend.services.camera_capture import CaptureDevice
+
+
+class FakeCapture:
+    """Stands in for cv2.VideoCapture: a frame every few milliseconds, or failures on demand."""
+
+    instances = []
+
+    def __init__(self, index):
+        self.index = index
+        self.opened = FakeCapture.can_open
+        self.fail_reads = FakeCapture.fail_reads
+        self.released = threading.Event()
+        FakeCapture.instances.append(self)
+
+    def set(self, prop, value):
+        pass
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        time.sleep(0.002)
+        if self.fail_reads:
+            return False, None
+        return True, np.zeros((2, 2, 3), dtype=np.uint8)
+
+    def release(self):
+        self.released.set()
+
+
+@pytest.fixture(autouse=True)
+def fake_cv2(monkeypatch):
+    FakeCapture.instances = []
+    FakeCapture.can_open = True
+    FakeCapture.fail_reads = False
+    monkeypatch.setattr(camera_capture, "cv2", SimpleNamespace(
+        VideoCapture=FakeCapture, CAP_PROP_FRAME_WIDTH=3, CAP_PROP_FRAME_HEIGHT=4,
+    ))
+    monkeypatch.setattr(camera_capture, "CAMERA_MAX_READ_FAILURES", 3)
+    return FakeCapture
+
+
+async def stopped(device: CaptureDevice) -> None:
+    thread = device._thread
+    await asyncio.get_running_loop().run_in_executor(None, thread.join, 5)
+    assert not thread.is_alive()
+
+
+def test_consumers_share_one_capture_and_the_last_release_stops_it():
+    async def scenario():
+        device = CaptureDevice()
+        assert await device.acquire()
+        assert await device.acquire()
+        first = await device.next_frame()
+        newer = await device.next_frame(after_seq=first.seq)
+        assert newer.seq > first.seq
+        device.release()
+        assert device.running  # One consumer left
+        device.release()
+        await stopped(device)
+        assert await device.next_frame(after_seq=device.seq, timeout=0.05) is None
+
+    asyncio.run(scenario())
+    assert len(FakeCapture.instances) == 1
+    assert FakeCapture.instances[0].released.is_set()
+
+
+def test_camera_that_cannot_be_opened_is_refused(fake_cv2):
+    fake_cv2.can_open = False
+
+    async def scenario():
+        device = CaptureDevice()
+        assert not await device.acquire()
+        assert device.users == 0
+        await stopped(device)
+
+    asyncio.run(scenario())
+
+
+def test_capture_stops_after_repeated_read_failures(fake_cv2):
+    fake_cv2.fail_reads = True
+
+    async def scenario():
+        device = CaptureDevice()
+        assert await device.acquire()
+        await stopped(device)
+        assert device.read_failures == 3
+        assert not device.running
+        assert await device.next_frame(timeout=0.5) is None  # Returns at once instead of waiting out the timeout
+
+    asyncio.run(scenario())
+
+
+def test_acquires_during_shutdown_restart_a_single_capture():
+    async def scenario():
+        device = CaptureDevice()
+        assert await device.acquire()
+        await device.next_frame()
+        device.release()  # Shutting down; the thread may still be alive
+        results = await asyncio.gather(device.acquire(), device.acquire())
+        assert results == [True, True]
+        assert device.users == 2
+        live = [c for c in FakeCapture.instances if not c.released.is_set()]
+        assert len(live) == 1
+        device.release()
+        device.release()
+        await stopped(device)
+
+    asyncio.run(scenario())
+    assert len(FakeCapture.instances) == 2
@@ -0,0 +1,87 @@
+# tests/test_chat_batch.py
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from backend.routers import chat
+
+
+class StubTurn:
+    def __init__(self, message: str):
+        self.message = message
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """The chat router with turns stubbed out: message "sleep:<s>" takes s seconds, "fail:<code>" raises."""
+    running = {"now": 0, "max": 0}
+
+    async def prepare_turn(item, user_key="anonymous"):
+        return StubTurn(item.message)
+
+    async def complete_turn(turn, admission_route="chat"):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        try:
+            kind, _, arg = turn.message.partition(":")
+            if kind == "sleep":
+                await asyncio.sleep(float(arg))
+            elif kind == "fail":
+                raise HTTPException(status_code=int(arg), detail="refused")
+            elif kind == "crash":
+                raise RuntimeError("provider blew up")
+            return {"reply": f"re {turn.message}", "route": admission_route}
+        finally:
+            running["now"] -= 1
+
+    monkeypatch.setattr(chat, "prepare_turn", prepare_turn)
+    monkeypatch.setattr(chat, "complete_turn", complete_turn)
+    app = FastAPI()
+    app.include_router(chat.router)
+    test_client = TestClient(app)
+    test_client.running = running
+    return test_client
+
+
+def post_batch(client, messages, **options):
+    response = client.post("/api/chat/batch", json={"items": [{"message": m} for m in messages], **options})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_results_stream_back_in_completion_order(client):
+    results = post_batch(client, ["sleep:0.2", "sleep:0", "sleep:0.1"], concurrency=3)
+    assert [r["index"] for r in results] == [1, 2, 0]
+    assert all(r["ok"] and r["route"] == "batch" for r in results)
+    assert results[0]["reply"] == "re sleep:0"
+
+
+def test_concurrency_is_bounded(client):
+    results = post_batch(client, ["sleep:0.02"] * 6, concurrency=2)
+    assert len(results) == 6
+    assert client.running["max"] == 2
+
+
+def test_concurrency_is_capped_by_the_server(client, monkeypatch):
+    monkeypatch.setattr(chat, "CHAT_BATCH_CONCURRENCY", 3)
+    post_batch(client, ["sleep:0.02"] * 6, concurrency=50)
+    assert client.running["max"] == 3
+
+
+def test_item_failures_and_timeouts_do_not_affect_the_others(client):
+    results = post_batch(client, ["sleep:5", "fail:429", "crash", "ok"], concurrency=4, item_timeout=0.1)
+    by_index = {r["index"]: r for r in results}
+    assert by_index[0]["ok"] is False and by_index[0]["status"] == 504
+    assert by_index[1] == {"index": 1, "ok": False, "status": 429, "error": "refused"}
+    assert by_index[2]["status"] == 500
+    assert by_index[3]["ok"] is True
+
+
+def test_empty_and_oversized_batches_are_refused(client, monkeypatch):
+    assert client.post("/api/chat/batch", json={"items": []}).status_code == 400
+    monkeypatch.setattr(chat, "CHAT_BATCH_MAX_ITEMS", 2)
+    assert client.post("/api/chat/batch", json={"items": [{"message": "a"}] * 3}).status_code == 413
@@ -0,0 +1,150 @@
+# tests/test_circuit_breaker.py
+import pytest
+
+from backend.utils import circuit_breaker
+from backend.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", fake)
+    return fake
+
+
+def make_breaker(**overrides) -> CircuitBreaker:
+    settings = dict(
+        timeout_max=20.0, window=10, min_calls=4, failure_rate_threshold=0.5,
+        slow_call_seconds=5.0, slow_call_rate_threshold=0.8, open_seconds=30.0,
+        timeout_min=1.0, timeout_factor=2.0,
+    )
+    settings.update(overrides)
+    return CircuitBreaker("test", **settings)
+
+
+def trip(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+
+
+def test_stays_closed_below_min_calls(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_opens_on_failure_rate_and_rejects(clock):
+    breaker = make_breaker()
+    breaker.record_success(0.1)
+    breaker.record_success(0.1)
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()  # 2 of 4 failed
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 1
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.check()
+    assert excinfo.value.retry_after == pytest.approx(30.0)
+
+
+def test_opens_on_slow_call_rate(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record_success(6.0)
+    assert breaker.state == OPEN
+
+
+def test_half_open_admits_a_single_trial(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 29.0
+    assert not breaker.allow()
+    clock.now += 1.0
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # Only one trial in flight
+
+
+def test_successful_trial_closes(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 30.0
+    assert breaker.allow()
+    breaker.record_success(0.2)
+    assert breaker.state == CLOSED
+    # The failures that opened it are forgotten
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.parametrize("outcome", ["failure", "slow"])
+def test_failed_or_slow_trial_reopens(clock, outcome):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 30.0
+    assert breaker.allow()
+    if outcome == "failure":
+        breaker.record_failure()
+    else:
+        breaker.record_success(6.0)
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+    assert not breaker.allow()
+    assert breaker.retry_after() == pytest.approx(30.0)
+
+
+def test_unrecorded_trial_expires_after_timeout_max(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 30.0
+    assert breaker.allow()  # Trial taken but never recorded (e.g. cancelled)
+    clock.now += 20.0
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert breaker.allow()
+
+
+def test_adaptive_timeout(clock):
+    breaker = make_breaker()
+    assert breaker.timeout() == 20.0  # Too few samples: the configured maximum
+    for latency in (0.1, 0.2, 0.3, 0.4):
+        breaker.record_success(latency)
+    assert breaker.timeout() == 1.0  # p99 x factor = 0.8, clamped up to timeout_min
+    for _ in range(4):
+        breaker.record_success(3.0)
+    assert breaker.timeout() == pytest.approx(6.0)
+    breaker.record_success(15.0)
+    assert breaker.timeout() == 20.0  # Clamped down to timeout_max
+
+
+def test_release_frees_the_trial_without_an_outcome(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 30.0
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()  # The next caller takes the trial at once
+    breaker.record_success(0.2)
+    assert breaker.state == CLOSED
+
+
+def test_release_while_closed_records_nothing(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        assert breaker.allow()
+        breaker.release()
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["recent_calls"] == 0
@@ -0,0 +1,94 @@
+# tests/test_completion_cache.py
+import pytest
+
+from backend.utils import completion_cache
+from backend.utils.completion_cache import CachedCompletion, CompletionCache, make_cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(completion_cache, "time", fake)
+    return fake
+
+
+def test_lru_evicts_least_recently_used(clock):
+    cache = CompletionCache(max_entries=2, ttl=60.0)
+    cache.set("a", "A", "groq")
+    cache.set("b", "B", "groq")
+    assert cache.get("a") == ("A", "groq")  # "b" is now the least recently used
+    cache.set("c", "C", "groq")
+    assert cache.get("b") is None
+    assert cache.get("a") == ("A", "groq")
+    assert cache.get("c") == ("C", "groq")
+    assert cache.evictions == 1
+
+
+def test_overwrite_refreshes_recency(clock):
+    cache = CompletionCache(max_entries=2, ttl=60.0)
+    cache.set("a", "A", "groq")
+    cache.set("b", "B", "groq")
+    cache.set("a", "A2", "groq")
+    cache.set("c", "C", "groq")
+    assert cache.get("a") == ("A2", "groq")
+    assert cache.get("b") is None
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = CompletionCache(max_entries=4, ttl=60.0)
+    cache.set("a", "A", "groq")
+    clock.now += 30.0
+    cache.set("b", "B", "groq")
+    clock.now += 30.0
+    assert cache.get("a") == ("A", "groq")  # Exactly at its expiry time
+    clock.now += 0.1
+    assert cache.get("a") is None
+    assert cache.get("b") == ("B", "groq")  # Each entry has its own deadline
+    assert cache.expirations == 1
+    snapshot = cache.snapshot()
+    assert snapshot["entries"] == 1
+    assert (snapshot["hits"], snapshot["misses"]) == (2, 1)
+
+
+def test_hit_does_not_extend_ttl(clock):
+    cache = CompletionCache(max_entries=4, ttl=60.0)
+    cache.set("a", "A", "groq")
+    clock.now += 50.0
+    assert cache.get("a") == ("A", "groq")
+    clock.now += 11.0
+    assert cache.get("a") is None
+
+
+def test_entries_keep_the_provider_that_generated_them(clock):
+    cache = CompletionCache(max_entries=4, ttl=60.0)
+    cache.set("a", "A", "ollama")
+    assert cache.get("a") == CachedCompletion(text="A", provider="ollama")
+
+
+def test_disabled_and_empty_texts_are_not_stored(clock):
+    disabled = CompletionCache(max_entries=0, ttl=60.0)
+    disabled.set("a", "A", "groq")
+    assert disabled.get("a") is None
+    cache = CompletionCache(max_entries=4, ttl=60.0)
+    cache.set("a", "", "groq")
+    assert cache.get("a") is None
+
+
+def test_cache_key_ignores_surrounding_whitespace_only():
+    history = [{"role": "user", "content": "hi "}, {"role": "assistant", "content": None}]
+    key = make_cache_key("m", "sys", history, "hello")
+    same = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": ""}]
+    assert make_cache_key("m", "sys", same, " hello\n") == key
+    assert make_cache_key("m2", "sys", history, "hello") != key
+    assert make_cache_key("m", "sys2", history, "hello") != key
+    assert make_cache_key("m", "sys", history, "hello!") != key
+    swapped = [{"role": "assistant", "content": "hi"}, {"role": "user", "content": ""}]
+    assert make_cache_key("m", "sys", swapped, "hello") != key
@@ -0,0 +1,129 @@
+# tests/test_context_builder.py
+import random
+
+import pytest
+
+from backend.utils.context_builder import (
+    MESSAGE_OVERHEAD_TOKENS,
+    TRUNCATION_MARKER,
+    TokenCounter,
+    _TokenCountCache,
+    build_chat_context,
+    count_message_tokens,
+    estimate_tokens,
+    truncate_to_tokens,
+)
+
+WORDS = ["a", "the", "function", "(", ")", "\n", "getUserAccountBalance", "!!!", "ok.", "snake_case_identifier"]
+
+
+def random_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def turn(role: str, content: str):
+    return {"role": role, "content": content}
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("Hi there, you!") == 6  # "there" is over 4 chars: 2 tokens
+    assert estimate_tokens("getUserAccountBalance") == 6  # Long identifiers split every ~4 chars
+    assert estimate_tokens("a\nb") == 3
+
+
+def test_token_counter_is_independent_of_chunking():
+    rng = random.Random(7)
+    for _ in range(200):
+        text = random_text(rng, rng.randint(1, 40))
+        counter = TokenCounter()
+        i = 0
+        while i < len(text):
+            j = i + rng.randint(1, 8)
+            counter.add(text[i:j])
+            i = j
+        assert counter.total() == estimate_tokens(text)
+
+
+def test_token_count_cache_is_keyed_by_digest_and_bounded():
+    cache = _TokenCountCache(maxsize=2)
+    long_message = "word " * 10_000
+    assert cache.count(long_message) == estimate_tokens(long_message) + MESSAGE_OVERHEAD_TOKENS
+    assert cache.count(long_message) == cache.count("word " * 10_000)
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert all(isinstance(key, bytes) and len(key) == 16 for key in cache._counts)
+    cache.count("b")
+    cache.count("c")  # Evicts the least recently used entry, the long message
+    assert cache.snapshot()["size"] == 2
+    cache.count(long_message)
+    assert cache.misses == 4
+
+
+def test_truncate_to_tokens_stays_within_the_limit():
+    rng = random.Random(3)
+    for _ in range(300):
+        text = random_text(rng, rng.randint(50, 300))
+        limit = rng.randint(12, 150)
+        truncated = truncate_to_tokens(text, limit)
+        assert estimate_tokens(truncated) <= limit
+        if estimate_tokens(text) > limit:
+            head, marker, tail = truncated.partition(TRUNCATION_MARKER)
+            assert marker and text.startswith(head) and text.endswith(tail)
+        else:
+            assert truncated == text
+
+
+def test_everything_fits():
+    history = [turn("user", "hello"), turn("assistant", "hi, how can I help?")]
+    context = build_chat_context("sys", history, "explain loops", budget=1000, max_message_tokens=500)
+    assert context.messages == [turn("system", "sys")] + history + [turn("user", "explain loops")]
+    assert context.history == history
+    assert (context.dropped_messages, context.truncated_messages) == (0, 0)
+    assert context.prompt_tokens == sum(count_message_tokens(m["content"]) for m in context.messages)
+
+
+def test_oldest_history_is_dropped_first():
+    history = [turn("user", f"message number {i} " + "word " * 20) for i in range(10)]
+    per_message = count_message_tokens(history[0]["content"])
+    fixed = count_message_tokens("sys") + count_message_tokens("now")
+    budget = fixed + 3 * per_message + MESSAGE_OVERHEAD_TOKENS  # Too little room to squeeze in a fourth
+    context = build_chat_context("sys", history, "now", budget=budget, max_message_tokens=500)
+    assert context.history == history[-3:]
+    assert context.dropped_messages == 7
+    assert context.truncated_messages == 0
+    assert context.prompt_tokens <= budget
+
+
+def test_partial_message_fills_the_remaining_budget():
+    history = [turn("user", "old " * 200), turn("assistant", "recent reply")]
+    fixed = count_message_tokens("sys") + count_message_tokens("now") + count_message_tokens("recent reply")
+    budget = fixed + 60
+    context = build_chat_context("sys", history, "now", budget=budget, max_message_tokens=1000)
+    assert len(context.history) == 2
+    assert TRUNCATION_MARKER in context.history[0]["content"]
+    assert context.history[1] == history[1]
+    assert context.truncated_messages == 1
+    assert context.dropped_messages == 0
+    assert context.prompt_tokens <= budget
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_prompt_never_exceeds_the_budget(seed):
+    rng = random.Random(seed)
+    history = [turn(rng.choice(["user", "assistant"]), random_text(rng, rng.randint(1, 120))) for _ in range(12)]
+    budget = rng.randint(200, 800)
+    context = build_chat_context("You are a tutor.", history, random_text(rng, 30), budget=budget, max_message_tokens=150)
+    assert context.prompt_tokens <= budget
+    assert context.prompt_tokens == sum(count_message_tokens(m["content"]) for m in context.messages)
+    assert all(count_message_tokens(m["content"]) <= 150 for m in context.history)
+    assert context.dropped_messages == len(history) - len(context.history)
+
+
+def test_oversized_message_is_truncated_but_always_sent():
+    message = "word " * 1000
+    context = build_chat_context("sys", [turn("user", "earlier")], message, budget=200, max_message_tokens=100)
+    sent = context.messages[-1]
+    assert sent["role"] == "user"
+    assert TRUNCATION_MARKER in sent["content"]
+    assert count_message_tokens(sent["content"]) <= 100
+    assert context.truncated_messages == 1
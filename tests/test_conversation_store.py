@@ -0,0 +1,61 @@
+# tests/test_conversation_store.py
+import asyncio
+
+from backend.services.conversation_store import ConversationStore
+
+
+def make_store(max_sessions=10, max_messages=4) -> ConversationStore:
+    return ConversationStore(max_sessions=max_sessions, idle_ttl=3600, max_messages=max_messages, persist=False)
+
+
+def turn(role: str, content: str):
+    return {"role": role, "content": content}
+
+
+def test_session_is_seeded_with_the_latest_history():
+    store = make_store()
+
+    async def scenario():
+        history = [turn("user", f"q{i}") for i in range(6)]
+        session_id = await store.create("user:1", history)
+        return (await store.get(session_id, "user:1")).messages
+
+    assert asyncio.run(scenario()) == [turn("user", f"q{i}") for i in range(2, 6)]
+
+
+def test_sessions_are_private_to_their_owner():
+    store = make_store()
+
+    async def scenario():
+        session_id = await store.create("user:1")
+        return await store.get(session_id, "user:2"), await store.get(session_id, "user:1")
+
+    other, own = asyncio.run(scenario())
+    assert other is None
+    assert own is not None
+
+
+def test_turn_for_an_evicted_session_does_not_recreate_it():
+    store = make_store(max_sessions=1)
+
+    async def scenario():
+        first = await store.create("user:1", [turn("user", "earlier"), turn("assistant", "context")])
+        await store.create("user:2")  # Evicts the first session
+        store.append_turn(first, "user:1", "hello", "hi")
+        return await store.get(first, "user:1")
+
+    # Gone (404 for the client, which re-seeds) rather than back with only the last turn
+    assert asyncio.run(scenario()) is None
+    assert store.lost_turns == 1
+
+
+def test_turns_are_appended_and_capped():
+    store = make_store(max_messages=4)
+
+    async def scenario():
+        session_id = await store.create("user:1")
+        for i in range(3):
+            store.append_turn(session_id, "user:1", f"q{i}", f"a{i}")
+        return (await store.get(session_id, "user:1")).messages
+
+    assert asyncio.run(scenario()) == [turn("user", "q1"), turn("assistant", "a1"), turn("user", "q2"), turn("assistant", "a2")]
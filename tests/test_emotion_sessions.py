@@ -0,0 +1,136 @@
+# tests/test_emotion_sessions.py
+import asyncio
+
+import pytest
+
+from backend.services import emotion_sessions as sessions_module
+from backend.services.emotion_sessions import CACHE_TIMEOUT, EmotionSession, EmotionSessionRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(sessions_module, "time", fake)
+    return fake
+
+
+def face(emotion: str, score: float) -> dict:
+    return {"dominant_emotion": emotion, "score": score}
+
+
+def test_client_frames_make_the_reading_live_without_the_webcam(clock):
+    session = EmotionSession("user:1")
+    assert session.latest()["active"] is False
+    session.record_frame([face("happy", 0.4), face("sad", 0.9)])
+    assert not session.active  # Webcam detection is still off
+    assert session.latest() == {"dominant_emotion": "sad", "score": 0.9, "active": True, "stale": False}
+
+
+def test_frame_reading_goes_inactive_when_frames_stop(clock):
+    session = EmotionSession("user:1")
+    session.record_frame([face("happy", 0.8)])
+    clock.now += CACHE_TIMEOUT + 1
+    assert session.latest() == {"dominant_emotion": "neutral", "score": 0.0, "active": False, "stale": True}
+
+
+def test_first_frame_notifies_subscribers_even_without_a_change(clock):
+    changes = []
+    session = EmotionSession("user:1", on_change=changes.append)
+    session.record_frame([])  # No face: the reading stays neutral, but it is now live
+    assert changes == ["user:1"]
+    session.record_frame([])
+    assert changes == ["user:1"]
+
+
+def make_registry(**overrides) -> EmotionSessionRegistry:
+    settings = dict(max_sessions=10, idle_seconds=60, sweep_interval=60)
+    settings.update(overrides)
+    return EmotionSessionRegistry(**settings)
+
+
+def test_idle_sessions_are_evicted_and_stopped(clock):
+    registry = make_registry()
+    idle = registry.get("user:1")
+    idle.active = True
+    clock.now += 30
+    registry.get("user:2")
+    clock.now += 31  # user:1 unused for 61s, user:2 for 31s
+    registry.sweep()
+    assert registry.find("user:1") is None and registry.find("user:2") is not None
+    assert idle.stop_event.is_set() and not idle.active
+    assert registry.evicted == 1
+
+
+def test_past_max_sessions_the_least_recently_used_goes_first(clock):
+    registry = make_registry(max_sessions=2)
+    registry.get("user:1")
+    registry.get("user:2")
+    registry.find("user:1")  # user:2 is now the least recently used
+    registry.get("user:3")
+    assert registry.find("user:2") is None
+    assert registry.find("user:1") is not None and registry.find("user:3") is not None
+    assert (registry.created, registry.evicted) == (3, 1)
+
+
+def test_any_active_and_latest_without_a_session(clock):
+    registry = make_registry()
+    assert registry.latest("user:1") == {"dominant_emotion": "neutral", "score": 0.0, "active": False, "stale": True}
+    assert registry.created == 0  # Reading does not create a session
+    registry.get("user:1")
+    assert not registry.any_active()
+    registry.get("user:1").active = True
+    assert registry.any_active()
+
+
+def test_subscribers_get_significant_changes_and_keepalives(clock):
+    async def scenario():
+        registry = make_registry()
+        session = registry.get("user:1")
+        session.active = True
+        session.record([face("happy", 0.5)])
+        updates = registry.updates("user:1", keepalive=0.05)
+        assert (await updates.__anext__())["dominant_emotion"] == "happy"
+        assert await updates.__anext__() is None  # Nothing changed within the keepalive
+        session.record([face("happy", 0.55)])  # Below EMOTION_STREAM_SCORE_DELTA: nobody is woken
+        assert registry.published == 0
+        assert (await updates.__anext__())["score"] == 0.55  # Picked up after the keepalive wait instead
+        session.record([face("sad", 0.7)])
+        assert await updates.__anext__() == {"dominant_emotion": "sad", "score": 0.7, "active": True, "stale": False}
+        assert registry.published == 1
+        assert registry.snapshot()["subscribers"] == 1
+        await updates.aclose()
+        assert registry.snapshot()["subscribers"] == 0
+        assert registry._changed == {}
+
+    asyncio.run(scenario())
+
+
+def test_one_change_wakes_every_subscriber(clock):
+    async def scenario():
+        registry = make_registry()
+        session = registry.get("user:1")
+        session.active = True
+        session.record([face("happy", 0.5)])
+        subscribers = [registry.updates("user:1", keepalive=5) for _ in range(3)]
+        await asyncio.gather(*(s.__anext__() for s in subscribers))
+        waiting = asyncio.gather(*(s.__anext__() for s in subscribers))
+        await asyncio.sleep(0)
+        session.record([face("angry", 0.9)])
+        readings = await asyncio.wait_for(waiting, 1)
+        assert [r["dominant_emotion"] for r in readings] == ["angry"] * 3
+        assert registry.published == 1
+        for subscriber in subscribers:
+            await subscriber.aclose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,129 @@
+# tests/test_emotion_stream.py
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+
+from backend.services import emotion_stream
+from backend.services.emotion_sessions import EmotionSessionRegistry
+from backend.services.emotion_stream import EmotionStream
+
+JPEG = cv2.imencode(".jpg", np.full((48, 64, 3), 128, dtype=np.uint8))[1].tobytes()
+
+
+class FakeAnalysis:
+    """Stands in for track/detect_emotions: one face per frame, optionally held until released."""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.started = asyncio.Event()
+        self.fail = False
+        self.calls = 0
+
+    async def __call__(self, *args, **kwargs):
+        self.calls += 1
+        self.started.set()
+        await self.gate.wait()
+        if self.fail:
+            raise RuntimeError("worker crashed")
+        return [{"box": (1, 2, 3, 4), "dominant_emotion": "happy", "score": 0.8}]
+
+
+@pytest.fixture
+def analysis(monkeypatch):
+    fake = FakeAnalysis()
+    monkeypatch.setattr(emotion_stream, "track_emotions", fake)
+    monkeypatch.setattr(emotion_stream, "detect_emotions", fake)
+    return fake
+
+
+class Sink:
+    """Collects what the stream sends; `results(n)` waits until n messages arrived."""
+
+    def __init__(self):
+        self.sent = []
+        self._received = asyncio.Event()
+
+    async def send(self, result):
+        self.sent.append(result)
+        self._received.set()
+
+    async def results(self, count):
+        while len(self.sent) < count:
+            self._received.clear()
+            await asyncio.wait_for(self._received.wait(), 5)
+        return self.sent
+
+
+def run_stream(scenario, **options):
+    """Runs scenario(stream, sink) with the stream's pipeline running in the background."""
+    async def main():
+        sink = Sink()
+        stream = EmotionStream(sink.send, **options)
+        task = asyncio.ensure_future(stream.run())
+        try:
+            await scenario(stream, sink)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    asyncio.run(main())
+
+
+def test_frames_arriving_during_analysis_keep_only_the_newest(analysis):
+    async def scenario(stream, sink):
+        analysis.gate.clear()
+        stream.submit(JPEG)
+        await analysis.started.wait()  # Frame 1 is being analyzed
+        stream.submit(JPEG)
+        stream.submit(JPEG)  # Replaces frame 2 while it waits
+        analysis.gate.set()
+        sent = await sink.results(2)
+        assert [r["seq"] for r in sent] == [1, 3]
+        assert sent[1]["dropped"] == 1
+        assert sent[1]["dominant_emotion"] == "happy" and sent[1]["score"] == 0.8
+        assert analysis.calls == 2
+
+    run_stream(scenario)
+
+
+def test_bad_frames_are_reported_and_the_stream_carries_on(analysis):
+    async def scenario(stream, sink):
+        stream.submit(b"junk")
+        await sink.results(1)
+        analysis.fail = True
+        stream.submit(JPEG)
+        await sink.results(2)
+        analysis.fail = False
+        stream.submit(JPEG)
+        sent = await sink.results(3)
+        assert [(r["type"], r["seq"]) for r in sent] == [("error", 1), ("error", 2), ("emotion", 3)]
+        assert sent[0]["detail"] == "Could not decode image."
+        assert sent[1]["detail"] == "Frame analysis failed."
+
+    run_stream(scenario)
+
+
+def test_readings_update_the_users_emotion_session(analysis, monkeypatch):
+    registry = EmotionSessionRegistry(max_sessions=10, idle_seconds=3600, sweep_interval=60)
+    monkeypatch.setattr(emotion_stream, "emotion_sessions", registry)
+
+    async def scenario(stream, sink):
+        stream.submit(JPEG)
+        await sink.results(1)
+        assert registry.latest("user:1") == {"dominant_emotion": "happy", "score": 0.8, "active": True, "stale": False}
+
+    run_stream(scenario, session_key="user:1")
+
+
+def test_without_a_session_key_no_session_is_created(analysis, monkeypatch):
+    registry = EmotionSessionRegistry(max_sessions=10, idle_seconds=3600, sweep_interval=60)
+    monkeypatch.setattr(emotion_stream, "emotion_sessions", registry)
+
+    async def scenario(stream, sink):
+        stream.submit(JPEG)
+        await sink.results(1)
+        assert registry.created == 0
+
+    run_stream(scenario)
@@ -0,0 +1,88 @@
+# tests/test_executors.py
+import asyncio
+import threading
+
+import pytest
+
+from backend.utils.executors import ExecutorRegistry, InstrumentedThreadPool
+
+
+def test_pool_runs_at_most_max_workers_and_queues_the_rest():
+    pool = InstrumentedThreadPool("test", max_workers=2)
+    gate = threading.Event()
+    started = threading.Semaphore(0)
+
+    def blocked():
+        started.release()
+        gate.wait(5)
+
+    futures = [pool.submit(blocked) for _ in range(4)]
+    assert started.acquire(timeout=5) and started.acquire(timeout=5)
+    assert (pool.active, pool.queued, pool.busy()) == (2, 2, 4)
+    gate.set()
+    for future in futures:
+        future.result(timeout=5)
+    snapshot = pool.snapshot()
+    assert (snapshot["active"], snapshot["queued"], snapshot["completed"], snapshot["failed"]) == (0, 0, 4, 0)
+    assert snapshot["threads"] == 2
+    pool.shutdown()
+
+
+def test_pool_counts_failures_and_keeps_the_exception():
+    pool = InstrumentedThreadPool("test", max_workers=1)
+
+    def boom():
+        raise ValueError("bad")
+
+    with pytest.raises(ValueError):
+        pool.submit(boom).result(timeout=5)
+    assert (pool.completed, pool.failed) == (1, 1)
+    pool.shutdown()
+    with pytest.raises(RuntimeError):
+        pool.submit(boom)
+    assert pool.queued == 0
+
+
+def test_registry_run_passes_arguments_through():
+    registry = ExecutorRegistry({"io": 1})
+
+    async def scenario():
+        try:
+            return await registry.run("io", lambda a, b=0: a + b, 2, b=3)
+        finally:
+            await registry.shutdown()
+
+    assert asyncio.run(scenario()) == 5
+    assert registry.snapshot()["io"]["completed"] == 1
+
+
+def test_shutdown_drains_running_work_and_cancels_what_is_still_queued():
+    registry = ExecutorRegistry({"io": 1})
+    pool = registry.get("io")
+    gate = threading.Event()
+
+    async def scenario():
+        running = pool.submit(gate.wait, 5)
+        queued = pool.submit(lambda: "never")
+        threading.Timer(0.05, gate.set).start()
+        # Too short for the queued task to be reached after the running one
+        await registry.shutdown(timeout=0.0)
+        return running, queued
+
+    running, queued = asyncio.run(scenario())
+    assert queued.cancelled()
+    assert running.result(timeout=5) is True
+
+
+def test_shutdown_waits_for_work_that_finishes_in_time():
+    registry = ExecutorRegistry({"io": 1})
+    gate = threading.Event()
+
+    async def scenario():
+        futures = [registry.get("io").submit(gate.wait, 5), registry.get("io").submit(lambda: "done")]
+        threading.Timer(0.05, gate.set).start()
+        await registry.shutdown(timeout=5)
+        return futures
+
+    _, queued = asyncio.run(scenario())
+    assert queued.result(timeout=0) == "done"
@@ -0,0 +1,147 @@
+# tests/test_face.py
+from collections import deque
+
+import cv2
+import numpy as np
+import pytest
+
+from backend.services import face_services
+from backend.services.face_services import FRAME_HEIGHT, FRAME_WIDTH, FaceTracker
+
+FACE = (120, 80, 60, 60)
+
+
+def textured_frame(seed: int = 0) -> np.ndarray:
+    """A working-size BGR frame with smooth texture, so template matching has something to lock onto."""
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, (FRAME_HEIGHT, FRAME_WIDTH), dtype=np.uint8)
+    gray = cv2.GaussianBlur(noise, (0, 0), 3)
+    gray = cv2.normalize(gray, None, 0, 255, cv2.NORM_MINMAX)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+class FakeDetector:
+    """Replaces the Haar scan: finds FACE on full frames, and in ROIs only when `roi_hits`."""
+
+    def __init__(self):
+        self.roi_hits = True
+        self.calls = []
+
+    def __call__(self, gray):
+        full = gray.shape == (FRAME_HEIGHT, FRAME_WIDTH)
+        self.calls.append("full" if full else "roi")
+        if full:
+            return [FACE]
+        if not self.roi_hits:
+            return []
+        # ROI coordinates: the test's ROI always starts at the padded face box
+        x, y, w, h = FACE
+        rx, ry, _, _ = face_services._pad_box(FACE, 0.5)
+        return [(x - rx, y - ry, w, h)]
+
+
+@pytest.fixture
+def detector(monkeypatch):
+    fake = FakeDetector()
+    monkeypatch.setattr(face_services, "_detect_faces", fake)
+    return fake
+
+
+def make_tracker(**overrides) -> FaceTracker:
+    settings = dict(redetect_every=3, min_confidence=0.6, roi_padding=0.5, search_margin=0.5)
+    settings.update(overrides)
+    return FaceTracker(**settings)
+
+
+def test_tracks_between_detections_and_redetects_in_the_roi(detector):
+    tracker = make_tracker()
+    frame = textured_frame()
+    for _ in range(5):  # Detect, track 3 frames, re-detect
+        _, boxes = tracker.locate(frame)
+        assert boxes == [FACE]
+    assert detector.calls == ["full", "roi"]
+    assert tracker.stats == {"full_detections": 1, "roi_detections": 1, "tracked_frames": 3, "track_losses": 0}
+
+
+def test_tracked_box_follows_the_face(detector):
+    tracker = make_tracker()
+    frame = textured_frame()
+    tracker.locate(frame)
+    moved = np.roll(frame, shift=(4, -6), axis=(0, 1))  # Content moves 4px down, 6px left
+    _, boxes = tracker.locate(moved)
+    assert boxes == [(FACE[0] - 6, FACE[1] + 4, FACE[2], FACE[3])]
+    assert detector.calls == ["full"]
+
+
+def test_lost_track_redetects_immediately(detector):
+    tracker = make_tracker()
+    tracker.locate(textured_frame(seed=0))
+    _, boxes = tracker.locate(textured_frame(seed=1))  # A different scene: nothing to match
+    assert boxes == [FACE]
+    assert tracker.stats["track_losses"] == 1
+    assert tracker.stats["tracked_frames"] == 0
+    assert detector.calls == ["full", "roi"]
+
+
+def test_roi_miss_falls_back_to_a_full_scan(detector):
+    detector.roi_hits = False
+    tracker = make_tracker(redetect_every=1)
+    frame = textured_frame()
+    for _ in range(2):  # Detect, track one frame
+        tracker.locate(frame)
+    _, boxes = tracker.locate(frame)
+    assert boxes == [FACE]
+    assert detector.calls == ["full", "roi", "full"]
+    assert tracker.stats["full_detections"] == 2
+
+
+def test_process_smooths_into_the_callers_buffer(detector):
+    smoothing = deque(maxlen=5)
+    tracker = make_tracker(smoothing=smoothing)
+    faces = tracker.process(textured_frame())
+    assert [f["box"] for f in faces] == [FACE]
+    assert list(smoothing) == [faces[0]["dominant_emotion"]]
+
+
+def test_empty_frame_has_no_faces(detector):
+    tracker = make_tracker()
+    assert tracker.locate(np.zeros((0, 0, 3), dtype=np.uint8)) == (None, [])
+    assert tracker.process(None) == []
+    assert detector.calls == []
+
+
+def encoded_frame(width: int, height: int) -> bytes:
+    image = cv2.resize(textured_frame(), (width, height))
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def test_decoder_probes_the_first_frame_then_decodes_reduced():
+    decoder = face_services.FrameDecoder()
+    data = encoded_frame(1280, 960)
+    image, factor = decoder.decode(data)
+    assert image.shape[:2] == (960, 1280) and factor == 1
+    image, factor = decoder.decode(data)
+    assert image.shape[:2] == (240, 320) and factor == 4  # Still at least the working size
+
+
+def test_decoder_keeps_small_frames_full_size():
+    decoder = face_services.FrameDecoder()
+    data = encoded_frame(400, 300)
+    decoder.decode(data)
+    image, factor = decoder.decode(data)
+    assert image.shape[:2] == (300, 400) and factor == 1
+
+
+def test_undecodable_frame_is_reported_not_raised():
+    decoder = face_services.FrameDecoder()
+    assert decoder.decode(b"not an image") == (None, 1)
+    assert not decoder.probed  # The next good frame still sets the stream's resolution
+
+
+def test_batch_maps_boxes_back_to_original_coordinates(detector):
+    data = encoded_frame(1280, 960)
+    results = face_services.detect_emotions_batch([data, b"junk", data])
+    assert results[1] == {"error": "Could not decode image."}
+    # FACE is in working-size coordinates; the frames are 4x that in each direction
+    assert [face["box"] for face in results[0]["faces"]] == [(480, 320, 240, 240)]
+    assert [face["box"] for face in results[2]["faces"]] == [(480, 320, 240, 240)]
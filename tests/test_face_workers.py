@@ -0,0 +1,108 @@
+# tests/test_face_workers.py
+import asyncio
+import os
+import signal
+
+import cv2
+import numpy as np
+import pytest
+
+from backend.services import face_workers as face_workers_module
+from backend.services.face_workers import FaceProcessPool, WorkerCrashed
+
+BLANK = np.zeros((240, 320, 3), dtype=np.uint8)
+
+
+def run_pool(scenario, **options):
+    """Runs scenario(pool) against a started one-worker pool, stopping it afterwards."""
+    settings = dict(workers=1, slots=2, slot_bytes=BLANK.nbytes, task_timeout=30)
+    settings.update(options)
+
+    async def main():
+        pool = FaceProcessPool(**settings)
+        await pool.start()
+        try:
+            await scenario(pool)
+        finally:
+            await pool.stop()
+    asyncio.run(main())
+
+
+async def wait_until(condition, timeout: float = 10.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_frames_are_analyzed_in_the_worker_and_the_slot_is_returned():
+    async def scenario(pool):
+        assert await pool.analyze(BLANK) == []
+        assert await pool.analyze_boxes(cv2.cvtColor(BLANK, cv2.COLOR_BGR2GRAY), BLANK.shape, []) == []
+        snapshot = pool.snapshot()
+        assert (snapshot["tasks"], snapshot["fallbacks"], snapshot["failures"]) == (2, 0, 0)
+        assert (snapshot["idle"], snapshot["free_slots"]) == (1, 2)
+
+    run_pool(scenario)
+
+
+def test_frames_larger_than_a_slot_run_on_the_thread_pool():
+    async def scenario(pool):
+        assert await pool.analyze(np.zeros((480, 640, 3), dtype=np.uint8)) == []
+        assert (pool.tasks, pool.fallbacks) == (0, 1)
+
+    run_pool(scenario)
+
+
+def test_a_crashed_worker_fails_its_frame_and_is_restarted():
+    async def scenario(pool):
+        worker = pool._workers[0]
+        os.kill(worker.process.pid, signal.SIGSTOP)  # Holds the frame without answering
+        pending = asyncio.ensure_future(pool.analyze(BLANK))
+        await wait_until(lambda: worker.task is not None)
+        worker.process.kill()
+        with pytest.raises(WorkerCrashed):
+            await pending
+        assert (pool.restarts, pool.failures) == (1, 1)
+        assert pool._workers[0] is not worker
+        assert await pool.analyze(BLANK) == []  # The replacement takes over
+        assert pool.snapshot()["free_slots"] == 2
+
+    run_pool(scenario)
+
+
+def test_a_stuck_worker_is_killed_after_the_timeout():
+    async def scenario(pool):
+        worker = pool._workers[0]
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.analyze(BLANK)
+        assert pool.timeouts == 1
+        await wait_until(lambda: pool.restarts == 1)
+        assert not worker.process.is_alive()
+        pool.task_timeout = 30
+        assert await pool.analyze(BLANK) == []
+
+    run_pool(scenario, task_timeout=0)
+
+
+def test_stopped_pool_falls_back_to_threads():
+    async def scenario(pool):
+        await pool.stop()
+        assert not pool.running
+        assert await pool.analyze(BLANK) == []
+        assert pool.fallbacks == 1
+
+    run_pool(scenario)
+
+
+def test_detect_batch_on_worker_processes(monkeypatch):
+    monkeypatch.setattr(face_workers_module, "FACE_ANALYSIS_BACKEND", "process")
+    data = cv2.imencode(".jpg", BLANK)[1].tobytes()
+
+    async def scenario(pool):
+        monkeypatch.setattr(face_workers_module, "face_workers", pool)
+        results = await face_workers_module.detect_batch([data, b"junk", data])
+        assert results == [{"faces": []}, {"error": "Could not decode image."}, {"faces": []}]
+        assert pool.tasks == 2  # Undecodable frames never reach a worker
+
+    run_pool(scenario)
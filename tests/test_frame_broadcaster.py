@@ -0,0 +1,123 @@
+# tests/test_frame_broadcaster.py
+import asyncio
+
+import numpy as np
+
+from backend.services.camera_capture import Frame
+from backend.services.frame_broadcaster import UPGRADE_AFTER_FRAMES, FrameBroadcaster, _Viewer
+
+
+class FakeDevice:
+    """Frames are published by the test; next_frame returns the newest one past `after_seq`."""
+
+    def __init__(self):
+        self.frame = None
+        self.users = 0
+        self.running = True
+        self._changed = asyncio.Event()
+
+    async def acquire(self) -> bool:
+        self.users += 1
+        return True
+
+    def release(self) -> None:
+        self.users -= 1
+
+    def publish(self, seq: int) -> None:
+        self.frame = Frame(seq, np.full((2, 2, 3), seq, dtype=np.uint8), 0.0)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def next_frame(self, after_seq: int = 0, timeout: float = 1.0):
+        while self.frame is None or self.frame.seq <= after_seq:
+            if not self.running:
+                return None
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.frame
+
+
+def make_broadcaster(device):
+    calls = {"annotate": 0, "encode": []}
+
+    def annotate(image):
+        calls["annotate"] += 1
+        return image + 1
+
+    def encode(image, quality):
+        calls["encode"].append(quality)
+        return bytes([int(image[0, 0, 0]), quality])
+
+    broadcaster = FrameBroadcaster(device, annotate, encode=encode, quality_levels=(50, 80), max_fps=1000)
+    return broadcaster, calls
+
+
+def test_each_frame_is_drawn_and_encoded_once_for_all_viewers():
+    async def scenario():
+        device = FakeDevice()
+        broadcaster, calls = make_broadcaster(device)
+        viewers = [broadcaster.subscribe() for _ in range(3)] + [broadcaster.subscribe(quality=60)]
+        device.publish(1)
+        first = await asyncio.gather(*(v.__anext__() for v in viewers))
+        assert first == [bytes([2, 80])] * 3 + [bytes([2, 50])]
+        assert calls["annotate"] == 1
+        assert sorted(calls["encode"]) == [50, 80]
+        assert (broadcaster.encodes, broadcaster.shared_encodes) == (2, 2)
+        assert device.users == 4
+        for viewer in viewers:
+            await viewer.aclose()
+        assert device.users == 0
+        assert broadcaster.viewers == 0
+
+    asyncio.run(scenario())
+
+
+def test_slow_viewer_skips_to_the_newest_frame():
+    async def scenario():
+        device = FakeDevice()
+        broadcaster, _ = make_broadcaster(device)
+        viewer = broadcaster.subscribe()
+        device.publish(1)
+        assert await viewer.__anext__() == bytes([2, 80])
+        device.publish(2)
+        device.publish(3)
+        assert await viewer.__anext__() == bytes([4, 80])
+        assert broadcaster.frames_skipped == 1
+        await viewer.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_viewer_ends_when_capture_stops():
+    async def scenario():
+        device = FakeDevice()
+        broadcaster, _ = make_broadcaster(device)
+        device.running = False
+        assert [data async for data in broadcaster.subscribe()] == []
+        assert device.users == 0
+
+    asyncio.run(scenario())
+
+
+def test_quality_level_for_a_requested_quality():
+    broadcaster, _ = make_broadcaster(FakeDevice())
+    assert broadcaster.quality_levels == (80, 50)
+    assert [broadcaster.level_for(q) for q in (None, 100, 80, 79, 50, 10)] == [0, 0, 0, 1, 1, 1]
+
+
+def test_viewer_quality_drops_on_slow_sends_and_recovers_slowly():
+    viewer = _Viewer(max_fps=10, top_level=0)  # 0.1s frame budget
+    viewer.adapt(0.2, max_level=2)
+    viewer.adapt(0.2, max_level=2)
+    viewer.adapt(0.2, max_level=2)
+    assert viewer.level == 2
+    for _ in range(UPGRADE_AFTER_FRAMES - 1):
+        viewer.adapt(0.001, max_level=2)
+    assert viewer.level == 2
+    viewer.adapt(0.001, max_level=2)
+    assert viewer.level == 1
+    for _ in range(3 * UPGRADE_AFTER_FRAMES):
+        viewer.adapt(0.001, max_level=2)
+    assert viewer.level == 0  # Never above the quality the viewer asked for
@@ -0,0 +1,97 @@
+# tests/test_frame_uploads.py
+import base64
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.routers import emotion_face
+
+
+def jpeg(width: int = 64, height: int = 48) -> bytes:
+    image = np.full((height, width, 3), 128, dtype=np.uint8)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    calls = []
+
+    async def detect_batch(frames, gamma=1.2):
+        calls.append(len(frames))
+        return [{"error": "Could not decode image."} if f == b"junk" else {"faces": []} for f in frames]
+
+    monkeypatch.setattr(emotion_face, "detect_batch", detect_batch)
+    app = FastAPI()
+    app.include_router(emotion_face.router)
+    test_client = TestClient(app)
+    test_client.calls = calls
+    return test_client
+
+
+def test_raw_image_body(client):
+    response = client.post("/api/emotion_face/frame", content=jpeg(), headers={"content-type": "image/jpeg"})
+    assert response.status_code == 200
+    assert response.json()["dominant_emotion"] == "neutral"
+
+
+def test_json_base64_and_data_urls(client):
+    encoded = base64.b64encode(jpeg()).decode()
+    response = client.post("/api/emotion_face/frames", json={"images": [encoded, f"data:image/jpeg;base64,{encoded}"]})
+    assert response.status_code == 200
+    assert response.json()["count"] == 2
+    assert client.calls == [2]  # The whole batch is one detection call
+
+
+def test_multipart_batch_keeps_order_and_reports_bad_frames(client):
+    files = [("frames", ("a.jpg", jpeg(), "image/jpeg")), ("frames", ("b.jpg", b"junk", "image/jpeg"))]
+    response = client.post("/api/emotion_face/frames", files=files)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["index"] for r in results] == [0, 1]
+    assert "faces" in results[0] and results[1]["error"] == "Could not decode image."
+
+
+def test_single_frame_endpoint_refuses_batches(client):
+    encoded = base64.b64encode(jpeg()).decode()
+    response = client.post("/api/emotion_face/frame", json={"images": [encoded, encoded]})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("body, content_type, expected", [
+    (b"", "image/jpeg", 400),
+    (b"{}", "application/json", 400),
+    (b"[1]", "application/json", 400),
+    (b'{"image": "%%%"}', "application/json", 400),
+    (b"abc", "text/plain", 415),
+])
+def test_malformed_uploads_are_refused(client, body, content_type, expected):
+    response = client.post("/api/emotion_face/frame", content=body, headers={"content-type": content_type})
+    assert response.status_code == expected
+
+
+def test_oversized_body_is_refused_while_streaming(client, monkeypatch):
+    monkeypatch.setattr(emotion_face, "MAX_IMAGE_BODY", 1000)
+
+    def chunks():
+        for _ in range(10):
+            yield b"x" * 500  # No Content-Length: only the running cap can catch it
+
+    response = client.post("/api/emotion_face/frame", content=chunks(), headers={"content-type": "image/jpeg"})
+    assert response.status_code == 413
+    assert client.calls == []
+
+
+def test_declared_oversized_body_is_refused_up_front(client, monkeypatch):
+    monkeypatch.setattr(emotion_face, "MAX_IMAGE_BODY", 1000)
+    response = client.post("/api/emotion_face/frame", content=b"x" * 2000, headers={"content-type": "image/jpeg"})
+    assert response.status_code == 413
+
+
+def test_too_many_frames_are_refused(client, monkeypatch):
+    monkeypatch.setattr(emotion_face, "EMOTION_FRAME_MAX_BATCH", 2)
+    encoded = base64.b64encode(jpeg()).decode()
+    response = client.post("/api/emotion_face/frames", json={"images": [encoded] * 3})
+    assert response.status_code == 413
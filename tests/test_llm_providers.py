@@ -0,0 +1,149 @@
+# tests/test_llm_providers.py
+import asyncio
+
+import pytest
+
+from backend.services.llm_providers import AllProvidersFailed, ChatProvider, ProviderRouter
+from backend.utils.circuit_breaker import CircuitBreaker
+
+
+class StubProvider(ChatProvider):
+    """Streams `parts` after `first_delay` seconds, or fails instead."""
+
+    def __init__(self, name, first_delay=0.0, parts=("Hello", " world"), fail=False, fail_after_first=False, breaker=None):
+        self.name = name
+        self.first_delay = first_delay
+        self.parts = parts
+        self.fail = fail
+        self.fail_after_first = fail_after_first
+        self.breaker = self.complete_breaker = breaker
+        self.calls = 0
+        self.closed = 0
+
+    async def stream(self, messages, emotion):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.first_delay)
+            if self.fail:
+                raise ConnectionError(f"{self.name} is down")
+            for i, part in enumerate(self.parts):
+                if i == 1 and self.fail_after_first:
+                    raise ConnectionError(f"{self.name} dropped")
+                yield part
+        finally:
+            self.closed += 1
+
+
+def make_router(*providers, fallback=None, hedge_delay=0.05) -> ProviderRouter:
+    return ProviderRouter(list(providers), fallback=fallback, hedge_delay=hedge_delay, complete_hedge_delay=hedge_delay)
+
+
+async def read_stream(router: ProviderRouter):
+    provider, deltas = await router.open_stream([], "neutral")
+    return provider, "".join([d async for d in deltas])
+
+
+def test_first_provider_answers_without_hedging():
+    primary, secondary = StubProvider("primary"), StubProvider("secondary")
+    router = make_router(primary, secondary)
+    provider, text = asyncio.run(read_stream(router))
+    assert (provider, text) == (primary, "Hello world")
+    assert secondary.calls == 0
+    assert router.stats["primary"].successes == 1
+
+
+def test_hedges_after_the_first_token_deadline_and_cancels_the_loser():
+    async def scenario():
+        primary = StubProvider("primary", first_delay=1.0)
+        secondary = StubProvider("secondary", parts=("Hedged",))
+        router = make_router(primary, secondary, hedge_delay=0.05)
+        provider, text = await read_stream(router)
+        await asyncio.sleep(0.01)  # Let the loser's stream close
+        return router, primary, secondary, provider, text
+
+    router, primary, secondary, provider, text = asyncio.run(scenario())
+    assert (provider, text) == (secondary, "Hedged")
+    assert primary.calls == secondary.calls == 1
+    assert primary.closed == 1  # Loser cancelled, its upstream closed
+    assert router.stats["secondary"].hedges_started == 1
+    assert router.stats["secondary"].hedge_wins == 1
+    assert router.stats["primary"].failures == 0
+    # The loser's latency estimate rises to at least what it was seen to take
+    assert router.stats["primary"].latency >= 0.05
+
+
+def test_original_attempt_can_still_win_after_a_hedge():
+    primary = StubProvider("primary", first_delay=0.08)
+    secondary = StubProvider("secondary", first_delay=1.0)
+    router = make_router(primary, secondary, hedge_delay=0.05)
+    provider, text = asyncio.run(read_stream(router))
+    assert provider is primary
+    assert router.stats["secondary"].hedges_started == 1
+    assert router.stats["secondary"].hedge_wins == 0
+
+
+def test_failed_provider_falls_through_to_the_next():
+    primary = StubProvider("primary", fail=True)
+    secondary = StubProvider("secondary")
+    router = make_router(primary, secondary)
+    provider, text = asyncio.run(read_stream(router))
+    assert (provider, text) == (secondary, "Hello world")
+    assert router.stats["primary"].failures == 1
+    assert router.stats["primary"].error_rate > 0
+
+
+def test_fallback_only_after_every_provider_fails():
+    fallback = StubProvider("fallback", parts=("canned",))
+    router = make_router(StubProvider("primary", fail=True), StubProvider("secondary", fail=True), fallback=fallback)
+    provider, text = asyncio.run(read_stream(router))
+    assert (provider, text) == (fallback, "canned")
+    provider, reply = asyncio.run(router.complete([], "neutral"))
+    assert (provider, reply) == (fallback, "canned")
+
+
+def test_all_failing_without_fallback_raises():
+    router = make_router(StubProvider("primary", fail=True))
+    with pytest.raises(AllProvidersFailed):
+        asyncio.run(read_stream(router))
+
+
+def test_stats_reorder_providers():
+    primary, secondary = StubProvider("primary"), StubProvider("secondary")
+    router = make_router(primary, secondary)
+    assert router.ordered() == [primary, secondary]  # Configured order until measured
+    router.stats["primary"].record_success(0.5)
+    router.stats["secondary"].record_success(0.1)
+    assert router.ordered() == [secondary, primary]
+    router.stats["secondary"].record_failure()
+    router.stats["secondary"].record_failure()
+    router.stats["secondary"].record_failure()
+    assert router.ordered() == [primary, secondary]  # Recent errors outweigh speed
+
+
+def test_open_breaker_skips_the_provider():
+    breaker = CircuitBreaker("stub", timeout_max=5.0, min_calls=1, open_seconds=60.0)
+    breaker.record_failure()
+    primary = StubProvider("primary", breaker=breaker)
+    secondary = StubProvider("secondary")
+    router = make_router(primary, secondary)
+    assert router.ordered() == [secondary]
+    provider, _ = asyncio.run(read_stream(router))
+    assert provider is secondary and primary.calls == 0
+
+
+def test_stream_failing_after_the_first_token_counts_against_the_provider():
+    primary = StubProvider("primary", fail_after_first=True)
+    router = make_router(primary)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(read_stream(router))
+    assert router.stats["primary"].successes == 1  # Time to first token was fine
+    assert router.stats["primary"].failures == 1
+
+
+def test_complete_hedges_too():
+    primary = StubProvider("primary", first_delay=1.0)
+    secondary = StubProvider("secondary", parts=("whole", " reply"))
+    router = make_router(primary, secondary, hedge_delay=0.05)
+    provider, reply = asyncio.run(router.complete([], "neutral"))
+    assert (provider, reply) == (secondary, "whole reply")
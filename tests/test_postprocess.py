@@ -0,0 +1,87 @@
+# tests/test_postprocess.py
+import itertools
+import re
+
+import pytest
+
+from backend.utils.postprocess import (
+    CodeFenceBalancer,
+    StreamPipeline,
+    TextAccumulator,
+    default_stages,
+    emotion_footer,
+    postprocess_text,
+)
+
+TEXTS = [
+    "No code here.",
+    "Try this:\n```python\nprint('hi')\n```\nDone.",
+    "Cut off mid block:\n```js\nconsole.log(1)",
+    "Cut off after a newline:\n```\nx = 1\n",
+    "Inline `code` and ``double`` ticks are not fences.",
+    "Long fence:\n`````\nbody\n`````",
+    "Ends on a fence ```",
+    "``````",
+    "```a```b```",
+]
+
+
+def splits(text: str, cuts: int):
+    for points in itertools.combinations(range(1, len(text)), cuts):
+        bounds = (0,) + points + (len(text),)
+        yield [text[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+def stream(chunks, emotion="neutral") -> str:
+    pipeline = StreamPipeline(default_stages(emotion))
+    out = "".join(pipeline.feed(chunk) for chunk in chunks) + pipeline.finish()
+    assert pipeline.text() == "".join(chunks)  # The raw text is kept unprocessed
+    return out
+
+
+def fences_open(text: str) -> bool:
+    return len(re.findall(r"`{3,}", text)) % 2 == 1
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_output_is_independent_of_chunking(text):
+    expected = postprocess_text(text, "sad")
+    assert not fences_open(expected)
+    assert expected.startswith(text)
+    assert expected.endswith(emotion_footer("sad"))
+    for cuts in (1, 2):
+        for chunks in splits(text, cuts):
+            assert stream(chunks, "sad") == expected, chunks
+    assert stream(list(text), "sad") == expected
+    assert stream(["", text, ""], "sad") == expected
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_balancer_closes_only_open_fences(text):
+    closed = postprocess_text(text, "neutral")
+    if fences_open(text):
+        assert closed == text + ("```" if text.endswith("\n") else "\n```")
+    else:
+        assert closed == text
+
+
+def test_footer_lands_after_the_closing_fence():
+    assert postprocess_text("```\ncode", "happy") == "```\ncode\n``` 🎉"
+
+
+def test_balancer_state_resets_after_finish():
+    balancer = CodeFenceBalancer()
+    balancer.feed("```\nx")
+    assert balancer.finish(TextAccumulator()) == "\n```"
+    assert not balancer.open
+
+
+def test_accumulator_joins_lazily():
+    text = TextAccumulator()
+    for chunk in ("a", "", "bc", "d"):
+        text.append(chunk)
+    assert len(text) == 4
+    assert text.text() == "abcd"
+    text.append("e")
+    assert text.text() == "abcde"
+    assert TextAccumulator().text() == ""
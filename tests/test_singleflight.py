@@ -0,0 +1,192 @@
+# tests/test_singleflight.py
+import asyncio
+
+from backend.utils.singleflight import SingleFlight, StreamFlight, StreamFlightGroup
+from backend.utils.sse import parse_event_id, stamp_event_ids
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    async def scenario():
+        flights = SingleFlight("test")
+        calls = []
+        release = asyncio.Event()
+
+        async def fetch():
+            calls.append(1)
+            await release.wait()
+            return "reply"
+
+        waiters = [asyncio.ensure_future(flights.do("key", fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+        return flights, calls, results
+
+    flights, calls, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert results == [("reply", False), ("reply", True), ("reply", True)]
+    assert flights.snapshot() == {"in_flight": 0, "leaders": 1, "coalesced": 2}
+
+
+def test_leader_cancellation_does_not_cancel_followers():
+    async def scenario():
+        flights = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return "reply"
+
+        leader = asyncio.ensure_future(flights.do("key", fetch))
+        follower = asyncio.ensure_future(flights.do("key", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        release.set()
+        return await follower
+
+    assert asyncio.run(scenario()) == ("reply", True)
+
+
+def test_stream_followers_replay_from_the_start():
+    async def scenario():
+        group = StreamFlightGroup("test")
+        started = []
+        step = asyncio.Event()
+
+        def source(set_result):
+            async def gen():
+                started.append(1)
+                yield "a"
+                await step.wait()
+                yield "b"
+                set_result("ab")
+            return gen()
+
+        leader_flight, leader = group.join("key", source)
+        leader_items = []
+
+        async def consume(flight, into):
+            async for item in flight.subscribe():
+                into.append(item)
+
+        first = asyncio.ensure_future(consume(leader_flight, leader_items))
+        await asyncio.sleep(0.01)
+        late_flight, late_leader = group.join("key", source)
+        late_items = []
+        second = asyncio.ensure_future(consume(late_flight, late_items))
+        await asyncio.sleep(0)
+        step.set()
+        await asyncio.gather(first, second)
+        results = []
+        late_flight.add_result_callback(results.append)
+        return started, leader, late_leader, leader_items, late_items, results, group
+
+    started, leader, late_leader, leader_items, late_items, results, group = asyncio.run(scenario())
+    assert started == [1]
+    assert (leader, late_leader) == (True, False)
+    assert leader_items == late_items == ["a", "b"]
+    assert results == ["ab"]
+    assert group.get("key") is None  # Finished flights leave the registry
+
+
+def test_resume_replays_from_the_frame_after_last_event_id():
+    async def scenario():
+        group = StreamFlightGroup("test")
+        frames = [f"data: {i}\n\n" for i in range(6)]
+
+        def source(set_result):
+            async def gen():
+                for frame in frames:
+                    yield frame
+            return gen()
+
+        flight, _ = group.join("key", source, owner="user:1")
+        seen = []
+        # First connection drops after three frames
+        async for frame in stamp_event_ids(flight.subscribe(), flight.generation):
+            seen.append(frame)
+            if len(seen) == 3:
+                break
+        last_id = seen[-1].split("\n", 1)[0][len("id: "):]
+        generation, start = parse_event_id(last_id)
+        resumed = group.resume(generation, "user:1")
+        rest = [f async for f in stamp_event_ids(resumed.subscribe(start), generation, start)]
+        return flight, resumed, seen, rest
+
+    flight, resumed, seen, rest = asyncio.run(scenario())
+    assert resumed is flight
+    assert [f.split("\n", 1)[1] for f in seen + rest] == [f"data: {i}\n\n" for i in range(6)]
+    assert [f.split("\n", 1)[0] for f in rest] == [f"id: {flight.generation}:{i}" for i in (3, 4, 5)]
+
+
+def test_idle_flight_stays_resumable_during_the_grace_period():
+    async def scenario():
+        step = asyncio.Event()
+
+        def source(set_result):
+            async def gen():
+                yield "a"
+                await step.wait()
+                yield "b"
+            return gen()
+
+        flight = StreamFlight("key", source, abandon_grace=0.05)
+        items = flight.subscribe()
+        await items.__anext__()
+        await items.aclose()  # Client disconnects
+        await asyncio.sleep(0.02)
+        state = (flight.idle, flight.cancelled)
+        # A reconnect within the grace period picks the stream up where it left off
+        step.set()
+        resumed = [item async for item in flight.subscribe(1)]
+        return state, resumed, flight
+
+    state, resumed, flight = asyncio.run(scenario())
+    assert state == (True, False)
+    assert resumed == ["b"]
+    assert flight.done and not flight.cancelled and not flight.abandoned
+
+
+def test_unresumed_flight_is_cancelled_and_forgotten():
+    async def scenario():
+        group = StreamFlightGroup("test")
+
+        def source(set_result):
+            async def gen():
+                yield "a"
+                await asyncio.Event().wait()
+            return gen()
+
+        flight, _ = group.join("key", source)
+        flight.abandon_grace = 0.01
+        items = flight.subscribe()
+        await items.__anext__()
+        await items.aclose()
+        await asyncio.sleep(0.03)
+        return group, flight
+
+    group, flight = asyncio.run(scenario())
+    assert flight.abandoned and flight.cancelled and flight.done and not flight.joinable
+    assert group.resume(flight.generation) is None
+    assert group.snapshot()["abandoned"] == 1
+
+
+def test_only_callers_that_joined_can_resume():
+    async def scenario():
+        group = StreamFlightGroup("test")
+
+        def source(set_result):
+            async def gen():
+                yield "a"
+            return gen()
+
+        flight, _ = group.join("key", source, owner="user:1")
+        group.join("key", source, owner="user:2")  # Coalesced follower
+        await flight.task
+        return group, flight
+
+    group, flight = asyncio.run(scenario())
+    assert group.resume(flight.generation, "user:1") is flight
+    assert group.resume(flight.generation, "user:2") is flight
+    assert group.resume(flight.generation, "user:3") is None
+    assert group.snapshot()["resumed"] == 2
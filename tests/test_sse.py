@@ -0,0 +1,112 @@
+# tests/test_sse.py
+import asyncio
+import json
+
+import pytest
+
+from backend.utils.sse import HEARTBEAT_FRAME, coalesce_events, parse_event_id, stamp_event_ids
+
+TEXT = "Hello there! Here is some streamed text, split in different ways. " * 3
+
+
+def decode(frame: str):
+    assert frame.startswith("data: ") and frame.endswith("\n\n")
+    return json.loads(frame[len("data: "):])
+
+
+def chunked(text: str, size: int):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+async def produce(chunks, delay=0.0, tail=({"content": "", "done": True},)):
+    for chunk in chunks:
+        yield {"content": chunk, "done": False}
+        if delay:
+            await asyncio.sleep(delay)
+    for event in tail:
+        yield event
+
+
+async def collect(events, **kwargs):
+    kwargs.setdefault("heartbeat", None)
+    return [frame async for frame in coalesce_events(events, **kwargs)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64, len(TEXT)])
+@pytest.mark.parametrize("window", [0.0, 0.02])
+def test_output_is_independent_of_chunking(size, window):
+    frames = asyncio.run(collect(produce(chunked(TEXT, size)), window=window, max_bytes=32))
+    events = [decode(f) for f in frames]
+    assert events[-1] == {"content": "", "done": True}
+    deltas = events[:-1]
+    assert all(e["done"] is False and set(e) == {"content", "done"} for e in deltas)
+    assert "".join(e["content"] for e in deltas) == TEXT
+    # A frame stops growing once it reaches max_bytes; one chunk can overshoot it
+    assert all(len(e["content"]) < 32 + size for e in deltas)
+
+
+def test_deltas_within_the_window_are_merged():
+    frames = asyncio.run(collect(produce(chunked(TEXT, 4)), window=0.5, max_bytes=10_000))
+    assert [decode(f) for f in frames] == [{"content": TEXT, "done": False}, {"content": "", "done": True}]
+
+
+def test_metadata_events_are_not_merged_and_keep_their_order():
+    async def events():
+        yield {"content": "a", "done": False}
+        yield {"content": "b", "done": False}
+        yield {"content": "", "done": False, "emotion": "joy"}
+        yield {"content": "c", "done": False}
+        yield {"content": "", "done": True}
+
+    frames = asyncio.run(collect(events(), window=0.5, max_bytes=10_000))
+    assert [decode(f) for f in frames] == [
+        {"content": "ab", "done": False},
+        {"content": "", "done": False, "emotion": "joy"},
+        {"content": "c", "done": False},
+        {"content": "", "done": True},
+    ]
+
+
+def test_heartbeat_while_idle():
+    async def events():
+        await asyncio.sleep(0.08)
+        yield {"content": "", "done": True}
+
+    frames = asyncio.run(collect(events(), window=0.0, heartbeat=0.03))
+    assert frames[0] == HEARTBEAT_FRAME
+    assert decode(frames[-1]) == {"content": "", "done": True}
+
+
+def test_upstream_error_is_raised_after_buffered_frames():
+    async def events():
+        yield {"content": "partial", "done": False}
+        raise RuntimeError("upstream failed")
+
+    async def scenario():
+        frames = []
+        with pytest.raises(RuntimeError):
+            async for frame in coalesce_events(events(), window=0.0, heartbeat=None):
+                frames.append(frame)
+        return frames
+
+    assert [decode(f) for f in asyncio.run(scenario())] == [{"content": "partial", "done": False}]
+
+
+async def frames_of(items):
+    for item in items:
+        yield item
+
+
+def test_event_ids_count_comments_but_only_stamp_data_frames():
+    async def scenario():
+        frames = ["data: a\n\n", HEARTBEAT_FRAME, "data: b\n\n"]
+        return [f async for f in stamp_event_ids(frames_of(frames), "gen", start=5)]
+
+    assert asyncio.run(scenario()) == ["id: gen:5\ndata: a\n\n", HEARTBEAT_FRAME, "id: gen:7\ndata: b\n\n"]
+
+
+def test_parse_event_id_points_past_the_last_frame_seen():
+    assert parse_event_id("gen:7") == ("gen", 8)
+    assert parse_event_id(" a:b:0 ") == ("a:b", 1)
+    for malformed in (None, "", "gen", ":3", "gen:", "gen:-1", "gen:x"):
+        assert parse_event_id(malformed) is None
@@ -0,0 +1,230 @@
+# tests/test_usage_meter.py
+import asyncio
+
+import pytest
+
+from backend.services import usage_meter as usage_meter_module
+from backend.services.usage_meter import QuotaExceeded, UsageMeter
+from backend.utils.chat_helpers import generate_provider_stream
+from backend.utils.context_builder import estimate_tokens
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0  # On a window boundary for 100 s windows
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+class MemoryStore:
+    """Stands in for AsyncSessionLocal: keeps committed rows in a list."""
+
+    def __init__(self):
+        self.rows = []
+        self.commits = 0
+        self.fail = False
+
+    def __call__(self):
+        return _MemorySession(self)
+
+
+class _MemorySession:
+    def __init__(self, store: MemoryStore):
+        self.store = store
+        self.added = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def add_all(self, rows):
+        self.added.extend(rows)
+
+    async def commit(self):
+        if self.store.fail:
+            raise ConnectionError("database unavailable")
+        self.store.rows.extend(self.added)
+        self.store.commits += 1
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(usage_meter_module, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def store(monkeypatch):
+    memory = MemoryStore()
+    monkeypatch.setattr(usage_meter_module, "AsyncSessionLocal", memory)
+    return memory
+
+
+def make_meter(**overrides) -> UsageMeter:
+    settings = dict(enabled=True, bucket_tokens=100, refill_per_minute=60, max_users=10, window_seconds=100, max_pending_rows=10)
+    settings.update(overrides)
+    return UsageMeter(**settings)
+
+
+def test_bucket_rejects_until_refilled(clock):
+    meter = make_meter()
+    meter.check("user:1", "chat", 80)
+    with pytest.raises(QuotaExceeded) as excinfo:
+        meter.check("user:1", "chat", 30)
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.retry_after == pytest.approx(10.0)  # 10 tokens short at 1 token/s
+    assert excinfo.value.headers["Retry-After"] == "10"
+    clock.now += 10
+    meter.check("user:1", "chat", 30)
+    assert meter.rejected == 1
+    meter.check("user:2", "chat", 100)  # Buckets are per user
+
+
+def test_refill_is_capped_at_the_bucket_size(clock):
+    meter = make_meter()
+    clock.now += 1000
+    meter.check("user:1", "chat", 100)
+    with pytest.raises(QuotaExceeded):
+        meter.check("user:1", "chat", 1)
+
+
+def test_completion_debt_blocks_until_repaid(clock):
+    meter = make_meter()
+    meter.check("user:1", "chat", 50)
+    meter.record("user:1", "chat", 50, completion_tokens=120)  # Balance is now -70
+    with pytest.raises(QuotaExceeded):
+        meter.check("user:1", "chat", 0)  # Even a free (coalesced) call is refused in debt
+    clock.now += 80
+    meter.check("user:1", "chat", 10)
+
+
+def test_oversized_request_is_allowed_only_with_a_full_bucket(clock):
+    meter = make_meter()
+    meter.check("user:1", "chat", 500)
+    with pytest.raises(QuotaExceeded):
+        meter.check("user:1", "chat", 500)
+
+
+def test_refund_returns_the_prompt_charge(clock):
+    meter = make_meter()
+    meter.check("user:1", "chat", 100)
+    meter.refund("user:1", 100)
+    meter.check("user:1", "chat", 100)
+
+
+def test_disabled_meter_never_refuses(clock):
+    meter = make_meter(enabled=False)
+    for _ in range(5):
+        meter.check("user:1", "chat", 1000)
+
+
+def test_records_are_summed_per_user_route_and_window(clock, store):
+    meter = make_meter()
+    meter.record("user:1", "chat", 10, 20)
+    clock.now += 50
+    meter.record("user:1", "chat", 5, 5)
+    meter.record("user:1", "tts", 7)
+    meter.record("user:2", "chat", 1, 1)
+    clock.now += 50  # Next window
+    meter.record("user:1", "chat", 3, 4)
+    asyncio.run(meter.flush())
+
+    assert store.commits == 1  # One batched write
+    rows = {(r.user_key, r.route, int(r.window_start.timestamp())): r for r in store.rows}
+    start = 1_700_000_000
+    assert set(rows) == {
+        ("user:1", "chat", start), ("user:1", "tts", start), ("user:2", "chat", start), ("user:1", "chat", start + 100),
+    }
+    first = rows[("user:1", "chat", start)]
+    assert (first.requests, first.prompt_tokens, first.completion_tokens, first.total_tokens) == (2, 15, 25, 40)
+    assert meter.snapshot()["pending_rows"] == 0
+    assert meter.totals == {"requests": 5, "prompt_tokens": 26, "completion_tokens": 30}
+
+
+def test_failed_flush_keeps_rows_for_the_next_one(clock, store):
+    meter = make_meter()
+    meter.record("user:1", "chat", 10, 20)
+    store.fail = True
+    asyncio.run(meter.flush())
+    assert meter.flush_errors == 1 and not store.rows
+    meter.record("user:1", "chat", 1, 2)  # Merged into the retried row
+    store.fail = False
+    asyncio.run(meter.flush())
+    assert len(store.rows) == 1
+    row = store.rows[0]
+    assert (row.requests, row.prompt_tokens, row.completion_tokens) == (2, 11, 22)
+    assert meter.rows_written == 1
+
+
+def test_pending_rows_are_bounded(clock, store):
+    meter = make_meter(max_pending_rows=2)
+    for user in ("user:1", "user:2", "user:3"):
+        meter.record(user, "chat", 1)
+    meter.record("user:1", "chat", 1)  # Existing rows still accumulate
+    assert meter.rows_dropped == 1
+    asyncio.run(meter.flush())
+    assert sorted((r.user_key, r.requests) for r in store.rows) == [("user:1", 2), ("user:2", 1)]
+
+
+def test_stop_flushes_what_is_pending(clock, store):
+    async def scenario():
+        meter = make_meter(flush_interval=3600)
+        meter.start()
+        meter.record("user:1", "chat", 1, 1)
+        await meter.stop()
+
+    asyncio.run(scenario())
+    assert len(store.rows) == 1
+
+
+class _StubProvider:
+    name = "stub"
+    enhance = False
+    cacheable = True
+
+    def label(self, emotion):
+        return self.name
+
+
+class _StubRouter:
+    def __init__(self, deltas, hang=False, fail=False):
+        self.deltas, self.hang, self.fail = deltas, hang, fail
+
+    async def open_stream(self, messages, emotion):
+        async def stream():
+            for delta in self.deltas:
+                yield delta
+            if self.fail:
+                raise ConnectionError("upstream dropped")
+            if self.hang:
+                await asyncio.Event().wait()
+        return _StubProvider(), stream()
+
+
+@pytest.mark.parametrize("ending", ["done", "error", "cancelled"])
+def test_streamed_tokens_are_reported_however_the_stream_ends(ending):
+    billed = []
+
+    async def scenario():
+        router = _StubRouter(["one ", "two ", "three"], hang=ending == "cancelled", fail=ending == "error")
+        events = generate_provider_stream(router, [], "neutral", on_finish=billed.append)
+
+        async def consume():
+            async for _ in events:
+                pass
+
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.01)
+        if ending == "cancelled":
+            task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert billed == [estimate_tokens("one two three")]
@@ -0,0 +1,65 @@
+# tests/test_voice.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from backend.services import asr_service
+from backend.utils.admission import PRIORITY_INTERACTIVE, AdmissionController, RoutePolicy
+from backend.utils.circuit_breaker import BreakerRegistry
+
+
+class StubGroq:
+    def __init__(self):
+        self.calls = 0
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self.create))
+
+    def create(self, file, model, timeout):
+        self.calls += 1
+        return SimpleNamespace(text="from groq")
+
+
+class StubHF:
+    def __init__(self):
+        self.calls = 0
+
+    async def post(self, url, headers, files, timeout):
+        self.calls += 1
+        return SimpleNamespace(raise_for_status=lambda: None, json=lambda: {"text": "from hf"})
+
+
+@pytest.fixture
+def asr(monkeypatch):
+    groq = StubGroq()
+    monkeypatch.setattr(asr_service, "get_groq_client", lambda: groq)
+    monkeypatch.setattr(asr_service, "HUGGINGFACE_API_KEY", "hf-key")
+    monkeypatch.setattr(asr_service, "breakers", BreakerRegistry())
+    return groq
+
+
+def admission(limit: int) -> AdmissionController:
+    return AdmissionController("test", capacity=4, max_queue=4, routes={
+        "asr": RoutePolicy(limit, PRIORITY_INTERACTIVE, 0.01),
+    })
+
+
+def test_groq_asr_holds_an_admission_slot_for_the_call(asr, monkeypatch):
+    controller = admission(limit=1)
+    monkeypatch.setattr(asr_service, "llm_admission", controller)
+    result = asyncio.run(asr_service._transcribe(b"audio", "a.wav", StubHF()))
+    assert result == {"text": "from groq", "provider": "groq"}
+    assert controller.admitted == 1
+    assert controller.snapshot()["in_use"] == 0
+
+
+def test_asr_falls_back_to_huggingface_when_not_admitted(asr, monkeypatch):
+    controller = admission(limit=0)  # Every Groq call times out in the queue
+    monkeypatch.setattr(asr_service, "llm_admission", controller)
+    hf = StubHF()
+    result = asyncio.run(asr_service._transcribe(b"audio", "a.wav", hf))
+    assert result == {"text": "from hf", "provider": "huggingface"}
+    assert asr.calls == 0
+    assert hf.calls == 1
+    assert controller.rejected["timeout"] == 1
+    # Refused before the breaker was asked, so no half-open trial was taken
+    assert asr_service.breakers.get("groq.asr").snapshot()["recent_calls"] == 0
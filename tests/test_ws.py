@@ -0,0 +1,160 @@
+# tests/test_ws.py
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from backend.routers import ws
+from backend.routers.ws import WS_CLOSE_UNAUTHORIZED, ChannelSender, Connection, ws_stats
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.client = SimpleNamespace(host="10.0.0.1")
+        self.sent = []
+
+    async def send_text(self, text: str) -> None:
+        self.sent.append(json.loads(text))
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def run_with_writer(scenario):
+    """Runs scenario(connection, websocket) with the connection's writer draining in the background."""
+    async def main():
+        websocket = FakeWebSocket()
+        connection = Connection(websocket)
+        writer = asyncio.ensure_future(connection.writer())
+        try:
+            await scenario(connection, websocket)
+        finally:
+            writer.cancel()
+            await connection.close()
+            await asyncio.gather(writer, return_exceptions=True)
+    asyncio.run(main())
+
+
+def test_credit_window_limits_what_the_writer_sends():
+    async def scenario(connection, websocket):
+        await connection.handle_text(json.dumps({"type": "flow", "channel": "tts", "window": 2}))
+        for seq in range(4):
+            await connection.send("tts", "t1", "audio", seq=seq)
+        await settle()
+        assert [m["seq"] for m in websocket.sent] == [0, 1]
+        await connection.handle_text(json.dumps({"type": "credit", "channel": "tts", "n": 1}))
+        await settle()
+        assert [m["seq"] for m in websocket.sent] == [0, 1, 2]
+        await connection.handle_text(json.dumps({"type": "flow", "channel": "tts", "window": None}))  # Credits off
+        await settle()
+        assert [m["seq"] for m in websocket.sent] == [0, 1, 2, 3]
+
+    run_with_writer(scenario)
+
+
+def test_a_starved_channel_does_not_block_the_others():
+    async def scenario(connection, websocket):
+        await connection.handle_text(json.dumps({"type": "flow", "channel": "tts", "window": 0}))
+        await connection.send("tts", "t1", "audio", seq=0)
+        await connection.send("chat", "c1", "event", n=1)
+        await settle()
+        assert [(m["channel"], m["id"]) for m in websocket.sent] == [("chat", "c1")]
+
+    run_with_writer(scenario)
+
+
+def test_writer_alternates_between_busy_channels():
+    async def scenario(connection, websocket):
+        for n in range(2):
+            await connection.send("chat", "c1", "event", n=n)
+            await connection.send("tts", "t1", "audio", seq=n)
+        await settle()
+        assert [m["channel"] for m in websocket.sent] == ["chat", "tts", "chat", "tts"]
+
+    run_with_writer(scenario)
+
+
+@pytest.mark.parametrize("value", [-1, 1.5, True, "3", float("inf")])
+def test_invalid_flow_counts_are_rejected(value):
+    async def scenario(connection, websocket):
+        await connection.handle_text(json.dumps({"type": "credit", "channel": "tts", "id": "x", "n": value}))
+        await settle()
+        assert websocket.sent[0]["type"] == "error" and websocket.sent[0]["status"] == 400
+        assert connection.channels["tts"].credit is None
+
+    run_with_writer(scenario)
+
+
+def test_error_replies_never_block_the_receive_loop():
+    async def scenario():
+        connection = Connection(FakeWebSocket())  # No writer: nothing drains the queues
+        connection.channels["chat"] = ChannelSender("chat", asyncio.Event(), size=1)
+        dropped = ws_stats.errors_dropped
+        await connection.handle_text("not json")
+        await asyncio.wait_for(connection.handle_text("still not json"), 1)
+        assert ws_stats.errors_dropped == dropped + 1
+
+    asyncio.run(scenario())
+
+
+def test_cancel_stops_a_running_request():
+    async def scenario(connection, websocket):
+        started = asyncio.Event()
+
+        async def forever():
+            started.set()
+            await asyncio.sleep(60)
+
+        connection.start("tts", "t1", forever())
+        await started.wait()
+        task = connection.tasks[("tts", "t1")]
+        await connection.handle_text(json.dumps({"type": "cancel", "channel": "tts", "id": "t1"}))
+        await settle()
+        assert task.cancelled()
+        assert ("tts", "t1") not in connection.tasks
+
+    run_with_writer(scenario)
+
+
+def test_unsupported_messages_get_an_error_on_their_channel():
+    async def scenario(connection, websocket):
+        await connection.handle_text(json.dumps({"channel": "tts", "id": 7, "type": "bogus"}))
+        await connection.handle_text(json.dumps({"channel": "nope", "id": 8}))
+        await settle()
+        assert sorted((m["channel"], m["id"], m["status"]) for m in websocket.sent) == [("chat", 8, 400), ("tts", 7, 400)]
+
+    run_with_writer(scenario)
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(ws.router)
+    return TestClient(app)
+
+
+def test_socket_without_a_ticket_is_closed_when_auth_is_required(client, monkeypatch):
+    monkeypatch.setattr(ws, "WS_REQUIRE_AUTH", True)
+    with client.websocket_connect("/api/ws") as socket:
+        with pytest.raises(WebSocketDisconnect) as excinfo:
+            socket.receive_text()
+    assert excinfo.value.code == WS_CLOSE_UNAUTHORIZED
+
+
+def test_a_ticket_that_does_not_redeem_is_refused_even_without_required_auth(client, monkeypatch):
+    monkeypatch.setattr(ws, "WS_REQUIRE_AUTH", False)
+
+    async def no_user(ticket):
+        return None
+
+    monkeypatch.setattr(ws, "_authenticate", no_user)
+    with client.websocket_connect("/api/ws?ticket=spent") as socket:
+        with pytest.raises(WebSocketDisconnect) as excinfo:
+            socket.receive_text()
+    assert excinfo.value.code == WS_CLOSE_UNAUTHORIZED